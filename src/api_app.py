@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import json
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from autogen_core.models import AssistantMessage, UserMessage
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from utils.bots.agent_pool import agent_pool
+from utils.bots.cached_tool import session_language
+from utils.bots.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+from utils.bots.sessions import ChatSession, session_manager
+from utils.bots.turn import team_events
+from utils.function_call import draw_content_wordcloud, query_top_k_match_contents
+from utils.function_call.render_cache import HANDLE_PREFIX, is_handle, resolve_handle
+from utils.function_call.retrieval import (
+    RETRIEVAL_PREFETCH,
+    retrieval_prefetcher,
+    warm_retrieval,
+)
+from utils.function_call.wordcloud import profile_for_display_width
+from utils.i18n import I18n, i18n
+from utils.tracing import tracer
+from utils.warmup import warmup
+
+# Address the API listens on when run directly
+API_HOST = os.environ.get("API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("API_PORT", 8000))
+# Most articles one GET /retrieval may return
+MAX_RETRIEVAL_K = 50
+
+
+_translators: dict[str, I18n] = {}
+
+
+def translator(lang: str) -> I18n:
+    """
+    Get the translations of a language.
+
+    The Streamlit pages share one `i18n`, sessions of the API each have their own language.
+
+    Arguments:
+        lang (str): A language code, unknown languages fall back to English
+
+    Returns:
+        I18n: The translations, shared by the sessions of the language
+    """
+    lang = i18n.match_lang(lang) or "en"
+    if lang not in _translators:
+        _translators[lang] = I18n(lang=lang, default_lang="en")
+    return _translators[lang]
+
+
+def sse(event: str, data: dict) -> str:
+    """
+    Format a server-sent event.
+
+    Arguments:
+        event (str): The event type
+        data (dict): The payload, sent as JSON
+
+    Returns:
+        str: The event in the text/event-stream format
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def image_url(handle: str) -> str:
+    """
+    Get the URL a rendered image handle is served at.
+
+    Arguments:
+        handle (str): A handle returned by `content_wordcloud`
+
+    Returns:
+        str: The path of the image on this API
+    """
+    return f"/wordcloud/{handle.strip().removeprefix(HANDLE_PREFIX)}"
+
+
+async def turn_stream(session: ChatSession, task: str) -> AsyncIterator[str]:
+    """
+    Answer a user's message as a stream of server-sent events.
+
+    Events are "text" with the answer as it is written, "tool_call" and
+    "tool_result" as the agents use tools, "image" for word clouds, and
+    finally "done", or "error" when the turn failed.
+
+    Arguments:
+        session (ChatSession): The session the message belongs to
+        task (str): The user's message
+
+    Yields:
+        str: Server-sent events
+    """
+    t = translator(session.lang)
+    # Search for the message while the agents decide whether to search at all
+    prefetch = retrieval_prefetcher.start(task) if RETRIEVAL_PREFETCH else None
+
+    async with session.lock:
+        try:
+            with (
+                tracer.span(
+                    "turn", kind="turn", chars=len(task), lang=session.lang, api=True
+                ) as turn,
+                warm_retrieval(prefetch),
+                session_language(session.lang),
+            ):
+                head_agent = session.head_agent
+
+                # Only the first turn of a conversation is answered from the
+                # semantic cache, later answers depend on the earlier turns
+                cache_vector = None
+                if (
+                    SEMANTIC_CACHE_ENABLED
+                    and not await head_agent.model_context.get_messages()
+                ):
+                    cache_vector = await asyncio.to_thread(semantic_cache.embed, task)
+
+                if cache_vector is not None and (
+                    cached := semantic_cache.lookup(cache_vector, session.lang)
+                ):
+                    turn.set(semantic_cache_hit=True)
+                    await head_agent.model_context.add_message(
+                        UserMessage(content=task, source="user")
+                    )
+                    await head_agent.model_context.add_message(
+                        AssistantMessage(content=cached.reply, source=head_agent.name)
+                    )
+                    turn.mark("first_text_s")
+                    yield sse("text", {"text": cached.answer})
+                    for handle in cached.images:
+                        yield sse("image", {"url": image_url(handle)})
+                    await session_manager.save(session)
+                    yield sse("done", {"cached": True})
+                    return
+
+                answer, reply, images, had_error = "", "", [], False
+                team = agent_pool.create_team(head_agent)
+                async for event in team_events(team, task):
+                    match event.type:
+                        case "text":
+                            turn.mark("first_text_s")
+                            answer += event.text
+                            yield sse("text", {"text": event.text})
+                        case "reply":
+                            reply = event.text
+                        case "tool_call":
+                            yield sse(
+                                "tool_call",
+                                {
+                                    "id": event.call_id,
+                                    "name": event.name,
+                                    "label": t(
+                                        "pets.chat.spinner.func_call_text"
+                                    ).format(func_call_name=event.name),
+                                },
+                            )
+                        case "tool_result":
+                            had_error = had_error or event.is_error
+                            key = (
+                                "pets.chat.badge.func_call_error"
+                                if event.is_error
+                                else "pets.chat.badge.func_call_success"
+                            )
+                            yield sse(
+                                "tool_result",
+                                {
+                                    "id": event.call_id,
+                                    "name": event.name,
+                                    "is_error": event.is_error,
+                                    "label": t(key).format(func_name=event.name),
+                                },
+                            )
+                            if (
+                                event.name == "content_wordcloud"
+                                and not event.is_error
+                                and is_handle(event.text)
+                            ):
+                                images.append(event.text)
+                                yield sse("image", {"url": image_url(event.text)})
+                        case "thinking":
+                            yield sse(
+                                "thinking",
+                                {"label": t("pets.chat.spinner.rethink_text")},
+                            )
+                        case "done":
+                            turn.set(
+                                messages=len(event.result.messages),
+                                tool_error=had_error,
+                                response_chars=len(answer),
+                            )
+                            if cache_vector is not None and reply and not had_error:
+                                semantic_cache.add(
+                                    cache_vector,
+                                    session.lang,
+                                    task,
+                                    answer,
+                                    reply,
+                                    images,
+                                )
+                            await session_manager.save(session)
+                            yield sse("done", {"cached": False})
+        except Exception as e:
+            yield sse("error", {"message": str(e)})
+
+
+async def health(request: Request) -> Response:
+    """GET /health: whether the API is warmed up, and its number of sessions."""
+    return JSONResponse(
+        {
+            "status": "ok" if warmup.ready else "warming_up",
+            "sessions": len(session_manager),
+            "warmup": warmup.status(),
+        },
+        200 if warmup.ready else 503,
+    )
+
+
+async def create_session(request: Request) -> Response:
+    """POST /sessions {"lang"}: start a conversation."""
+    body = await request.json() if await request.body() else {}
+    lang = translator(str(body.get("lang", "en"))).lang
+    session = await session_manager.create(lang)
+    return JSONResponse({"session_id": session.session_id, "lang": lang}, 201)
+
+
+async def delete_session(request: Request) -> Response:
+    """DELETE /sessions/{session_id}: end a conversation."""
+    if not await session_manager.delete(request.path_params["session_id"]):
+        return JSONResponse({"error": "unknown session"}, 404)
+    return Response(status_code=204)
+
+
+async def post_message(request: Request) -> Response:
+    """POST /sessions/{session_id}/messages {"message"}: stream the answer as server-sent events."""
+    session = await session_manager.get(request.path_params["session_id"])
+    if session is None:
+        return JSONResponse({"error": "unknown session"}, 404)
+    body = await request.json()
+    if not (message := str(body.get("message", "")).strip()):
+        return JSONResponse({"error": "message is required"}, 400)
+
+    return StreamingResponse(
+        turn_stream(session, message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def retrieval(request: Request) -> Response:
+    """GET /retrieval?query=...&k=...: search the adoption articles."""
+    if not (query := request.query_params.get("query", "").strip()):
+        return JSONResponse({"error": "query is required"}, 400)
+    try:
+        k = int(request.query_params.get("k", 15))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= MAX_RETRIEVAL_K:
+        return JSONResponse(
+            {"error": f"k must be an integer from 1 to {MAX_RETRIEVAL_K}"}, 400
+        )
+
+    results = await asyncio.to_thread(query_top_k_match_contents, query, k)
+    return JSONResponse({"results": results})
+
+
+async def wordcloud(request: Request) -> Response:
+    """
+    POST /wordcloud {"contents", "mode", "width", "dpr"}: draw a word cloud of texts,
+    sized for a display `width` CSS pixels wide at a device pixel ratio `dpr`.
+    """
+    body = await request.json()
+    contents = body.get("contents")
+    mode = body.get("mode", "accurate")
+    if (
+        not isinstance(contents, list)
+        or not contents
+        or mode not in ("fast", "accurate")
+    ):
+        return JSONResponse(
+            {"error": 'contents must be a list of texts and mode "fast" or "accurate"'},
+            400,
+        )
+    profile = None
+    if "width" in body:
+        try:
+            profile = profile_for_display_width(
+                int(body["width"]), float(body.get("dpr", 1.0))
+            )
+        except (TypeError, ValueError):
+            return JSONResponse({"error": "width and dpr must be numbers"}, 400)
+
+    result = await asyncio.to_thread(
+        draw_content_wordcloud, [str(c) for c in contents], mode, profile
+    )
+    if is_handle(result):
+        return JSONResponse({"url": image_url(result)})
+    return JSONResponse({"html": result})
+
+
+async def wordcloud_image(request: Request) -> Response:
+    """GET /wordcloud/{name}: a rendered word cloud, while it is cached."""
+    resolved = resolve_handle(HANDLE_PREFIX + request.path_params["name"])
+    if resolved is None:
+        return JSONResponse({"error": "image expired"}, 404)
+    img, mime = resolved
+    return Response(img, media_type=mime, headers={"Cache-Control": "max-age=3600"})
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette) -> AsyncIterator[None]:
+    # Load the models, article index, prompts and translations before the
+    # first request, so the first user is answered at steady-state speed
+    await asyncio.to_thread(warmup.run)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/sessions", create_session, methods=["POST"]),
+        Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+        Route("/sessions/{session_id}/messages", post_message, methods=["POST"]),
+        Route("/retrieval", retrieval),
+        Route("/wordcloud", wordcloud, methods=["POST"]),
+        Route("/wordcloud/{name}", wordcloud_image),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(
+        description="Serve the matching agents over HTTP, without Streamlit."
+    )
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,35 +1,37 @@
-import os
+import asyncio
+from functools import partial
 
 import streamlit as st
-from autogen_agentchat.agents import AssistantAgent
-from autogen_agentchat.base import TaskResult
-from autogen_agentchat.conditions import TextMessageTermination
-from autogen_agentchat.teams import RoundRobinGroupChat
-from autogen_agentchat.tools import AgentTool
-from autogen_core.models import ModelInfo
-from autogen_ext.models.openai import OpenAIChatCompletionClient
-
-from utils.bots import display_chat_history
+from autogen_core import CancellationToken
+from autogen_core.models import AssistantMessage, UserMessage
+
+from utils.bots import display_chat_history, display_wordcloud
+from utils.bots.agent_pool import agent_pool
+from utils.bots.cached_tool import session_language
 from utils.bots.ctx_mgr import CtxMgr
-from utils.function_call import (
-    content_wordcloud,
-    # mock_crawling_dcard_article_content,
-    # mock_crawling_dcard_urls,
-    query_top_k_match_contents,
+from utils.bots.memory import HISTORY_TOKEN_BUDGET
+from utils.bots.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+from utils.bots.sessions import ChatSession, session_manager
+from utils.bots.turn import team_events
+from utils.function_call.render_cache import is_handle
+from utils.function_call.retrieval import (
+    RETRIEVAL_PREFETCH,
+    RetrievalPrefetch,
+    retrieval_prefetcher,
+    warm_retrieval,
 )
 from utils.helpers import (
     error_badge,
     info_badge,
-    read_file_content,
     st_spinner,
-    str_stream,
     success_badge,
 )
 from utils.i18n import i18n
+from utils.streaming import stream_pacer
+from utils.tracing import tracer
 
 input_field_placeholder = i18n("pets.chat.input_placeholder")
 user_name = "Shihtl"
-ctx_history = CtxMgr("pets_gemini_history", [])
 # ctx_content = CtxMgr("pets_gemini", deque(maxlen=10))
 
 
@@ -52,198 +54,313 @@ def page_init() -> None:
     )
 
 
-def init_agents() -> None:
-    model_client = OpenAIChatCompletionClient(
-        model="gemini-2.5-flash",
-        model_info=ModelInfo(
-            vision=True,
-            function_calling=True,
-            json_output=True,
-            family="unknown",
-            structured_output=True,
-        ),
-        api_key=os.environ.get("GEMINI_API_KEY"),
+def ui_lang() -> str:
+    """
+    Get the language chosen in this browser session.
+
+    `i18n.lang` is shared by the whole process and holds the language of
+    whichever browser session ran last, so it is not read during a turn.
+
+    Returns:
+        str: The language code
+    """
+    selected_lang = st.session_state.get("selected_lang", "browser_default")
+    if selected_lang == "browser_default":
+        selected_lang = st.context.locale or "en"
+    return i18n.match_lang(selected_lang) or "en"
+
+
+def init_agents() -> ChatSession:
+    """
+    Get the chat session of this browser session.
+
+    The model client, prompts and tools are shared by the whole process. The
+    agents and history of the conversation are held by the session manager,
+    which keeps them in the session store and drops idle sessions from
+    memory, so only the session id is kept in st.session_state.
+
+    Returns:
+        ChatSession: The session, loaded again from the store if it was dropped
+    """
+    lang = ui_lang()
+    session = None
+    if session_id := st.session_state.get("session_id"):
+        session = asyncio.run(session_manager.get(session_id))
+    if session is None:
+        session = asyncio.run(session_manager.create(lang))
+        st.session_state.session_id = session.session_id
+    elif session.lang != lang:
+        # The language was changed in the sidebar
+        session.lang = lang
+        asyncio.run(session_manager.save(session))
+    return session
+
+
+def chat_history(session: ChatSession) -> CtxMgr:
+    """
+    Get the displayed history of a chat session.
+
+    Arguments:
+        session (ChatSession): The session
+
+    Returns:
+        CtxMgr: The history, stored in the session's state
+    """
+    return CtxMgr(
+        "pets_gemini_history",
+        [],
+        token_budget=HISTORY_TOKEN_BUDGET,
+        state=session.state,
     )
 
-    if "budget_assistant" not in st.session_state:
-        st.session_state.budget_assistant = AssistantAgent(
-            name="budget_assistant",
-            model_client=model_client,
-            system_message=read_file_content(
-                "./src/static/BudgetAdvisor_Agent_Prompt.txt"
-            ),
-            description="A budget advisor agent that provides budget suggestions based on user needs.",
-        )
-    if "careguide_assistant" not in st.session_state:
-        st.session_state.careguide_assistant = AssistantAgent(
-            name="careguide_assistant",
-            model_client=model_client,
-            system_message=read_file_content("./src/static/CareGuide_Agent_Prompt.txt"),
-            description="A care guide agent that provides care suggestions based on user needs.",
-        )
-    if "match_maker_assistant" not in st.session_state:
-        st.session_state.match_maker_assistant = AssistantAgent(
-            name="match_maker_assistant",
-            model_client=model_client,
-            system_message=read_file_content(
-                "./src/static/Matchmaker_Agent_Prompt.txt"
-            ),
-            description="A match maker agent that provides match suggestions based on user needs.",
-            tools=[query_top_k_match_contents],
-        )
 
-    if "head_assistant" not in st.session_state:
-        st.session_state.head_assistant = AssistantAgent(
-            name="head_assistant",
-            model_client=model_client,
-            tools=[
-                # mock_crawling_dcard_urls,
-                # mock_crawling_dcard_article_content,
-                content_wordcloud,
-                AgentTool(agent=st.session_state.budget_assistant),
-                AgentTool(agent=st.session_state.careguide_assistant),
-                AgentTool(agent=st.session_state.match_maker_assistant),
-            ],
-            system_message=read_file_content("./src/static/system_prompt.txt"),
-        )
-    if "assistant_team" not in st.session_state:
-        termination_condition = TextMessageTermination("head_assistant")
-        st.session_state.team = RoundRobinGroupChat(
-            [st.session_state.head_assistant],
-            termination_condition=termination_condition,
-        )
+async def autogen_response_stream(
+    task: str,
+    session: ChatSession,
+    use_semantic_cache: bool = False,
+    prefetch: RetrievalPrefetch | None = None,
+):
+    """
+    Run the team on a task and stream its response.
 
+    Text is yielded as it arrives from the model. Page updates such as spinners
+    and word clouds are yielded as callables, which `st.write_stream` runs in
+    order with the text, so they stay in sync when the text is paced.
 
-async def autogen_response_stream(task: str):
+    Arguments:
+        task (str): The user's prompt
+        session (ChatSession): The chat session, saved when the turn ends
+        use_semantic_cache (bool): Whether a cached answer to a similar first question may be served
+        prefetch (RetrievalPrefetch | None): Search results for the task, used by the retrieval tool
+
+    Yields:
+        str | Callable[[], None]: Text pieces and page updates
+    """
+    ctx_history = chat_history(session)
     full_response = ""
-    spinner_list = [
-        (
-            "gemini_response",
-            st_spinner(text=i18n("pets.chat.spinner.gemini_response"), show_time=True),
-        ),
-    ]
-
-    def record_then_yield(this_response):
+    reply = ""
+    images = []
+    had_error = False
+    spinner_list = []
+    # Spinners started or about to be started by the yielded callables
+    spinner_names = []
+
+    def record(this_response):
         nonlocal full_response
+        turn.mark("first_text_s")
         full_response += this_response
-        yield str_stream(this_response)
-
-    def add_spinner(spinner_name, spinner_text):
-        spinner = st_spinner(text=spinner_text, show_time=True)
-        spinner_list.append((spinner_name, spinner))
-        return spinner
-
-    def find_spinner_and_end(spinner_name):
-        for name, spinner in spinner_list:
-            if name == spinner_name:
-                spinner.end()
-                return True
-        return False
-
-    async for event in st.session_state.team.run_stream(task=task):
-        print(event, end="\n\n")
+        return this_response
+
+    def start_spinner(spinner_name, spinner_text):
+        spinner_names.append(spinner_name)
+
+        def start():
+            spinner = st_spinner(text=spinner_text, show_time=True)
+            spinner_list.append((spinner_name, spinner))
+
+        return start
+
+    def end_spinner(spinner_name):
+        # Only running spinners get a callable, every yielded callable ends
+        # the streamed text element
+        if spinner_name not in spinner_names:
+            return None
+        spinner_names.remove(spinner_name)
+
+        def end():
+            # Remove the ended spinner, so a tool called twice in one turn gets
+            # each of its spinners ended once
+            for i, (name, spinner) in enumerate(spinner_list):
+                if name == spinner_name:
+                    spinner.end()
+                    del spinner_list[i]
+                    return
+
+        return end
+
+    with (
+        tracer.span("turn", kind="turn", chars=len(task), lang=session.lang) as turn,
+        warm_retrieval(prefetch),
+        session_language(session.lang),
+    ):
+        yield start_spinner(
+            "gemini_response", i18n("pets.chat.spinner.gemini_response")
+        )
 
-        if isinstance(event, TaskResult):
-            ctx_history.add_context({"role": "assistant", "content": full_response})
+        # Only the first turn of a conversation is answered from the semantic
+        # cache, later answers depend on the earlier turns
+        head_assistant = session.head_agent
+        cache_vector = None
+        if (
+            use_semantic_cache
+            and SEMANTIC_CACHE_ENABLED
+            and not await head_assistant.model_context.get_messages()
+        ):
+            cache_vector = await asyncio.to_thread(semantic_cache.embed, task)
+
+        if cache_vector is not None and (
+            cached := semantic_cache.lookup(cache_vector, session.lang)
+        ):
+            print(f"Semantic cache hit: {semantic_cache.stats()}")
+            turn.set(semantic_cache_hit=True)
+            yield end_spinner("gemini_response")
+
+            # Let the head agent continue the conversation as if it had answered
+            await head_assistant.model_context.add_message(
+                UserMessage(content=task, source="user")
+            )
+            await head_assistant.model_context.add_message(
+                AssistantMessage(content=cached.reply, source=head_assistant.name)
+            )
+
+            yield record(cached.answer)
+            for handle in cached.images:
+                yield partial(display_wordcloud, handle)
+            ctx_history.add_context(
+                {"role": "assistant", "content": full_response, "images": cached.images}
+            )
+            await session_manager.save(session)
             return
 
-        if event.source == "user":
-            continue
-
-        find_spinner_and_end("gemini_response")
-        match event.type:
-            case "TextMessage":
-                find_spinner_and_end("rethink")
-                yield record_then_yield(event.content)
-            case "ThoughtEvent":
-                yield record_then_yield(event.content)
-            case "ToolCallRequestEvent":
-                for func_call in event.content:
-                    badge_str = info_badge(
-                        i18n("pets.chat.spinner.func_call_text").format(
-                            func_call_name=func_call.name
-                        )
+        # The team is bound to the event loop of its first run, and Streamlit
+        # uses a new event loop for every rerun
+        team = agent_pool.create_team(head_assistant)
+        async for event in team_events(team, task):
+            if event.type == "done":
+                turn.set(
+                    messages=len(event.result.messages),
+                    tool_error=had_error,
+                    response_chars=len(full_response),
+                )
+                ctx_history.add_context(
+                    {"role": "assistant", "content": full_response, "images": images}
+                )
+                if cache_vector is not None and reply and not had_error:
+                    semantic_cache.add(
+                        cache_vector, session.lang, task, full_response, reply, images
                     )
-                    spinner_func_call_text = i18n(
-                        "pets.chat.spinner.func_call_text"
-                    ).format(func_call_name=func_call.name)
-                    add_spinner(func_call.name, spinner_func_call_text)
-                    yield record_then_yield(badge_str)
-            case "ToolCallExecutionEvent":
-                for result in event.content:
-                    find_spinner_and_end(result.name)
-                    if result.is_error:
+                await session_manager.save(session)
+                return
+
+            if end := end_spinner("gemini_response"):
+                yield end
+            match event.type:
+                case "text":
+                    if end := end_spinner("rethink"):
+                        yield end
+                    yield record(event.text)
+                case "reply":
+                    reply = event.text
+                case "tool_call":
+                    func_call_text = i18n("pets.chat.spinner.func_call_text").format(
+                        func_call_name=event.name
+                    )
+                    # Tool calls run concurrently, so spinners are matched to
+                    # their results by call id rather than by tool name
+                    yield start_spinner(event.call_id, func_call_text)
+                    yield record(info_badge(func_call_text))
+                case "tool_result":
+                    if end := end_spinner(event.call_id):
+                        yield end
+                    if event.is_error:
+                        had_error = True
                         badge_str = error_badge(
                             i18n("pets.chat.badge.func_call_error").format(
-                                func_name=result.name
+                                func_name=event.name
                             )
                         )
-                    elif not result.is_error:
+                    else:
                         badge_str = success_badge(
                             i18n("pets.chat.badge.func_call_success").format(
-                                func_name=result.name
+                                func_name=event.name
                             )
                         )
-                    yield record_then_yield(badge_str)
-
-                    if result.name == "content_wordcloud":
-                        st.markdown(result.content, unsafe_allow_html=True)
-            case "ToolCallSummaryMessage":
-                add_spinner("rethink", i18n("pets.chat.spinner.rethink_text"))
-            case _:
-                pass
+                    yield record(badge_str)
+
+                    if event.name == "content_wordcloud" and not event.is_error:
+                        yield partial(display_wordcloud, event.text)
+                        # Only keep lightweight handles in the chat history
+                        if is_handle(event.text):
+                            images.append(event.text)
+                case "thinking":
+                    yield start_spinner(
+                        "rethink", i18n("pets.chat.spinner.rethink_text")
+                    )
 
 
-def chat_init() -> None:
+def chat_init(session: ChatSession) -> None:
     st.chat_message("assistant").write_stream(
-        autogen_response_stream(
-            f"Please introduce yourself, using lang: {i18n.lang}, using default_lang if not applicable: {i18n.default_lang}"
-            # "Please introduce yourself, using lang: english"
+        stream_pacer.stream(
+            autogen_response_stream(
+                f"Please introduce yourself, using lang: {session.lang}, using default_lang if not applicable: {i18n.default_lang}",
+                session,
+                # "Please introduce yourself, using lang: english"
+            )
         )
     )
 
-    st.session_state.team.reset()
+    # Forget the introduction, so the first question starts a fresh
+    # conversation. `team.reset()` is a coroutine bound to the team's event
+    # loop, which is closed by now, so the head agent is reset directly.
+    async def forget_introduction():
+        await session.head_agent.on_reset(CancellationToken())
+        await session_manager.save(session)
 
+    asyncio.run(forget_introduction())
 
-def chat(prompt: str):
+
+def chat(session: ChatSession, prompt: str):
     """
     Post the user's prompt, invoke response streaming, and append messages to
     session state history.
 
     Arguments:
+        session (ChatSession): The chat session
         prompt (str): Text entered by the user
     """
     user_image = "https://www.w3schools.com/howto/img_avatar.png"
 
+    # Search for the message while the agents decide whether to search at all
+    prefetch = retrieval_prefetcher.start(prompt) if RETRIEVAL_PREFETCH else None
+
     st.chat_message("user", avatar=user_image).write(prompt)
-    ctx_history.add_context({"role": "user", "content": prompt})
+    chat_history(session).add_context({"role": "user", "content": prompt})
 
-    st.chat_message("assistant").write_stream(autogen_response_stream(prompt))
+    st.chat_message("assistant").write_stream(
+        stream_pacer.stream(
+            autogen_response_stream(
+                prompt, session, use_semantic_cache=True, prefetch=prefetch
+            )
+        )
+    )
 
 
-def chat_bot():
+def chat_bot(session: ChatSession):
     """
     Render the chat interface and process user input in Streamlit.
 
     Creates a bordered container to display chat history and a chat input field.
     When the user submits a message, calls chat() inside the same container to
     render and stream the assistant's response.
+
+    Arguments:
+        session (ChatSession): The chat session
     """
+    ctx_history = chat_history(session)
     chat_container = st.container(border=True)
     with chat_container:
         if ctx_history.empty():
-            chat_init()
+            chat_init(session)
             pass
         else:
             display_chat_history(ctx_history)
 
     if prompt := st.chat_input(placeholder=input_field_placeholder, key="chat_bot"):
         with chat_container:
-            chat(prompt=prompt)
+            chat(session, prompt=prompt)
 
 
 if __name__ == "__main__":
     # XXX: warning: Task was destroyed but it is pending! ref: https://zhuanlan.zhihu.com/p/602955920
     page_init()
-    init_agents()
-    chat_bot()
+    chat_bot(init_agents())
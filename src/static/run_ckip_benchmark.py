@@ -0,0 +1,114 @@
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.function_call.wordcloud import ckip_tokenize  # noqa: E402
+
+
+def token_spans(tokens: list[str]) -> list[tuple[int, int]]:
+    """
+    Convert a segmentation into a list of (start, end) character spans.
+
+    Args:
+        tokens (list[str]): The segmented tokens of one sentence.
+
+    Returns:
+        list[tuple[int, int]]: The character span of each token.
+    """
+    spans = []
+    start = 0
+    for token in tokens:
+        spans.append((start, start + len(token)))
+        start += len(token)
+    return spans
+
+
+def segmentation_agreement(
+    ref_tokens: list[list[str]],
+    hyp_tokens: list[list[str]],
+    ref_tags: list[list[str]],
+    hyp_tags: list[list[str]],
+) -> tuple[float, float]:
+    """
+    Compare two segmentations of the same sentences.
+
+    Args:
+        ref_tokens (list[list[str]]): Tokens from the reference (fp32) models.
+        hyp_tokens (list[list[str]]): Tokens from the optimized models.
+        ref_tags (list[list[str]]): POS tags from the reference models.
+        hyp_tags (list[list[str]]): POS tags from the optimized models.
+
+    Returns:
+        tuple[float, float]: Token span F1 and the POS agreement on shared spans.
+    """
+    matched = ref_total = hyp_total = tag_matched = 0
+    for ref_sent, hyp_sent, ref_sent_tags, hyp_sent_tags in zip(
+        ref_tokens, hyp_tokens, ref_tags, hyp_tags, strict=True
+    ):
+        ref_spans = dict(zip(token_spans(ref_sent), ref_sent_tags, strict=False))
+        hyp_spans = dict(zip(token_spans(hyp_sent), hyp_sent_tags, strict=False))
+        shared = ref_spans.keys() & hyp_spans.keys()
+
+        matched += len(shared)
+        ref_total += len(ref_spans)
+        hyp_total += len(hyp_spans)
+        tag_matched += sum(ref_spans[span] == hyp_spans[span] for span in shared)
+
+    precision = matched / hyp_total if hyp_total else 1.0
+    recall = matched / ref_total if ref_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    tag_agreement = tag_matched / matched if matched else 1.0
+
+    return f1, tag_agreement
+
+
+def run_benchmark(csv_path: str, limit: int = 50) -> None:
+    """
+    Benchmark the fp32 and the CPU-optimized CKIP models on the crawled articles.
+
+    Args:
+        csv_path (str): Path of the article CSV file.
+        limit (int): The number of articles to benchmark. Default is 50.
+    """
+    df = pd.read_csv(csv_path)
+    contents = [
+        re.sub(r"[^\w\s]", "", re.sub(r"\s+", "", str(content)))
+        for content in df["content"].dropna().tolist()[:limit]
+    ]
+    print(f"Benchmarking {len(contents)} articles")
+
+    results = {}
+    for cpu_optimized in (False, True):
+        # Warm up so model loading is not part of the measurement
+        ckip_tokenize(contents[:1], cpu_optimized=cpu_optimized)
+
+        start = time.perf_counter()
+        results[cpu_optimized] = ckip_tokenize(contents, cpu_optimized=cpu_optimized)
+        elapsed = time.perf_counter() - start
+
+        mode = "int8" if cpu_optimized else "fp32"
+        print(f"[{mode}] {elapsed:.2f}s, {len(contents) / elapsed:.2f} articles/s")
+
+    (ref_tokens, ref_tags), (hyp_tokens, hyp_tags) = results[False], results[True]
+    f1, tag_agreement = segmentation_agreement(
+        ref_tokens, hyp_tokens, ref_tags, hyp_tags
+    )
+    print(f"Segmentation F1 vs fp32: {f1:.4f}")
+    print(f"POS agreement on shared tokens: {tag_agreement:.4f}")
+
+
+if __name__ == "__main__":
+    csv_file_path = (
+        sys.argv[1] if len(sys.argv) > 1 else "./src/static/article_contents.csv"
+    )
+
+    if not os.path.exists(csv_file_path):
+        print(f"Error: file not found {csv_file_path}")
+        sys.exit(1)
+
+    run_benchmark(csv_file_path)
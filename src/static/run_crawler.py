@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.function_call.crawler import (  # noqa: E402
+    ADOPTION_TAG_URL,
+    CRAWLER_CACHE_DB,
+    CRAWLER_CONCURRENCY,
+    CRAWLER_HOST_INTERVAL,
+    CrawlCache,
+    DcardCrawler,
+    merge_articles,
+)
+from utils.function_call.retrieval import ARTICLE_CSV_PATH  # noqa: E402
+
+
+async def crawl(args: argparse.Namespace) -> list[dict]:
+    async with DcardCrawler(
+        CrawlCache(args.cache), args.concurrency, args.host_interval
+    ) as crawler:
+        if args.urls:
+            with open(args.urls, encoding="utf-8") as f:
+                posts = [tuple(post) for post in json.load(f)][: args.limit]
+        else:
+            posts = await crawler.crawl_post_urls(args.list_url, args.limit)
+        print(f"Crawling {len(posts)} posts")
+
+        start = time.perf_counter()
+        articles = await crawler.crawl_articles([url for _, url in posts])
+        print(
+            f"Crawled {len(articles)} posts in {time.perf_counter() - start:.1f}s: "
+            + ", ".join(f"{n} {outcome}" for outcome, n in crawler.stats.items())
+        )
+        return articles
+
+
+async def extract(args: argparse.Namespace) -> None:
+    from utils.bots.model_client import SharedModelClient
+    from utils.function_call.extraction import (
+        EXTRACTED_PETS_PATH,
+        ExtractionCache,
+        extract_pets,
+        read_articles,
+        save_extracted_pets,
+    )
+
+    model_client = None if args.rules_only else SharedModelClient()
+    records, stats = await extract_pets(
+        read_articles(args.csv), model_client, ExtractionCache()
+    )
+    if model_client is not None:
+        await model_client.close()
+    count = save_extracted_pets(records, EXTRACTED_PETS_PATH)
+    print(
+        f"Extracted {count} pets: "
+        + ", ".join(f"{n} {source}" for source, n in stats.items())
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    articles = await crawl(args)
+    counts = merge_articles(articles, args.csv)
+    print(
+        f"Written to {args.csv}: "
+        + ", ".join(f"{n} {outcome}" for outcome, n in counts.items())
+    )
+    if args.extract:
+        await extract(args)
+    if counts["added"] or counts["updated"]:
+        print("Run run_vectorize.py to embed the new and edited posts for search")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl Dcard adoption posts into the article CSV."
+    )
+    parser.add_argument("--list-url", default=ADOPTION_TAG_URL)
+    parser.add_argument(
+        "--urls",
+        help="Crawl the posts of a JSON list of [title, url] pairs, "
+        "e.g. dcard_article_urls.json, instead of listing --list-url.",
+    )
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--csv", default=ARTICLE_CSV_PATH)
+    parser.add_argument("--cache", default=CRAWLER_CACHE_DB)
+    parser.add_argument("--concurrency", type=int, default=CRAWLER_CONCURRENCY)
+    parser.add_argument("--host-interval", type=float, default=CRAWLER_HOST_INTERVAL)
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Extract the pet records of the articles afterwards.",
+    )
+    parser.add_argument(
+        "--rules-only",
+        action="store_true",
+        help="With --extract, do not call the model for the articles the rules leave incomplete.",
+    )
+    asyncio.run(main(parser.parse_args()))
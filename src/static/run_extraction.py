@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.bots.model_client import SharedModelClient  # noqa: E402
+from utils.function_call.extraction import (  # noqa: E402
+    EXTRACTED_PETS_PATH,
+    EXTRACTION_BATCH_SIZE,
+    EXTRACTION_CACHE_DB,
+    ExtractionCache,
+    extract_pets,
+    read_articles,
+    save_extracted_pets,
+)
+from utils.function_call.retrieval import ARTICLE_CSV_PATH  # noqa: E402
+
+
+async def main(args: argparse.Namespace) -> None:
+    articles = read_articles(args.csv)
+    model_client = None if args.rules_only else SharedModelClient()
+    records, stats = await extract_pets(
+        articles, model_client, ExtractionCache(args.cache), args.batch_size
+    )
+    if model_client is not None:
+        await model_client.close()
+
+    count = save_extracted_pets(records, args.output)
+    print(
+        f"Extracted {count} pets from {len(articles)} articles: "
+        + ", ".join(f"{n} {source}" for source, n in stats.items())
+    )
+    print(f"Written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract structured pet records from the crawled adoption articles."
+    )
+    parser.add_argument("--csv", default=ARTICLE_CSV_PATH)
+    parser.add_argument("--output", default=EXTRACTED_PETS_PATH)
+    parser.add_argument("--cache", default=EXTRACTION_CACHE_DB)
+    parser.add_argument("--batch-size", type=int, default=EXTRACTION_BATCH_SIZE)
+    parser.add_argument(
+        "--rules-only",
+        action="store_true",
+        help="Do not call the model for the articles the rules leave incomplete.",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+import argparse
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from static.run_trace_report import format_table  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Modules the app should only import when a tool first needs them
+HEAVY_MODULES = (
+    "torch",
+    "transformers",
+    "ckip_transformers",
+    "wordcloud",
+    "matplotlib",
+    "sklearn",
+    "pandas",
+    "google.genai",
+)
+
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+from unittest.mock import PropertyMock, patch
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+# A test run has no browser locale
+with patch.object(
+    type(st.context), "locale", new_callable=PropertyMock, return_value="en"
+):
+    at = AppTest.from_file({script!r}, default_timeout=120).run()
+assert not at.exception, at.exception
+print(time.perf_counter() - start)
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (os.path.join(ROOT, "src"), env.get("PYTHONPATH")) if path
+    )
+    return env
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """
+    Parse the report written by `python -X importtime`.
+
+    Args:
+        output (str): The standard error of the interpreter.
+
+    Returns:
+        list[dict]: Each imported module with its own and cumulative seconds and its nesting depth.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        imports.append(
+            {
+                "module": name.strip(),
+                "self_s": int(own) / 1e6,
+                "cumulative_s": int(cumulative) / 1e6,
+                # One space follows the bar, then two per nesting level
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            }
+        )
+    return imports
+
+
+def measure_imports(module: str) -> list[dict]:
+    """
+    Import a module in a fresh interpreter and report what it imported.
+
+    Args:
+        module (str): The module, e.g. "pages.pets_autogen".
+
+    Returns:
+        list[dict]: The imports, as returned by `parse_importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def heavy_imports(
+    imports: list[dict], heavy: tuple[str, ...] = HEAVY_MODULES
+) -> list[str]:
+    """
+    List the heavy modules among the imports.
+
+    Args:
+        imports (list[dict]): The imports, as returned by `parse_importtime`.
+        heavy (tuple[str, ...]): The heavy modules. Defaults to `HEAVY_MODULES`.
+
+    Returns:
+        list[str]: The heavy modules that were imported.
+    """
+    modules = {entry["module"] for entry in imports}
+    return [name for name in heavy if name in modules]
+
+
+def slowest_imports(imports: list[dict], top: int = 15, depth: int = 1) -> list[dict]:
+    """
+    List the imports that took longest, down to a nesting depth.
+
+    Args:
+        imports (list[dict]): The imports, as returned by `parse_importtime`.
+        top (int): The number of imports to list.
+        depth (int): The deepest nesting level listed, 0 for the module itself.
+
+    Returns:
+        list[dict]: The slowest imports, slowest first.
+    """
+    return sorted(
+        (entry for entry in imports if entry["depth"] <= depth),
+        key=lambda entry: entry["cumulative_s"],
+        reverse=True,
+    )[:top]
+
+
+def first_paint_seconds(script: str = "src/streamlit_app.py") -> float:
+    """
+    Time a cold start of the app, up to its first complete run of the default page.
+
+    Args:
+        script (str): The Streamlit script, relative to the repository root.
+
+    Returns:
+        float: Seconds from starting the interpreter's imports to the rendered page.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_PAINT_SCRIPT.format(script=script)],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report the cold start import time of the app."
+    )
+    parser.add_argument("--module", default="pages.pets_autogen")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--first-paint", action="store_true")
+    args = parser.parse_args()
+
+    imports = measure_imports(args.module)
+    total = next(e for e in imports if e["module"] == args.module)["cumulative_s"]
+    print(f"Importing {args.module} took {total:.3f}s\n")
+    print(format_table(slowest_imports(imports, args.top, args.depth)))
+    print(f"\nHeavy modules imported: {', '.join(heavy_imports(imports)) or 'none'}")
+    if args.first_paint:
+        print(f"First paint: {first_paint_seconds():.3f}s")
@@ -0,0 +1,197 @@
+import argparse
+import os
+import resource
+import statistics
+import sys
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import (
+    MemoryCacheStorageManager,
+)
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.bots.agent_pool import agent_pool  # noqa: E402
+from utils.bots.model_client import SharedModelClient, create_model_client  # noqa: E402
+from utils.mock_llm import MockLLMServer  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "streamlit_app.py")
+PROMPTS = [
+    "I live alone in an apartment and work from home. Which cat suits me, and what will it cost?",
+    "How much should I budget for the first year with an adult cat?",
+]
+
+
+def peak_rss_mb() -> float:
+    """
+    Return the peak resident memory of the process.
+
+    Returns:
+        float: Peak RSS in MB
+    """
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+@contextmanager
+def concurrent_app_tests() -> Iterator[None]:
+    """
+    Let several `AppTest`s run at the same time.
+
+    Every `AppTest` run installs a mock Streamlit runtime and removes it when
+    it finishes, which breaks the other runs still in progress, and likewise
+    patches the config. Both are set up once for the whole load test instead.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+
+    with (
+        patch.object(Runtime, "_instance", runtime),
+        patch("streamlit.testing.v1.app_test.Runtime", SimpleNamespace()),
+        patch(
+            "streamlit.testing.v1.app_test.patch_config_options",
+            lambda options: nullcontext(),
+        ),
+        patch_config_options({"global.appTest": True}),
+    ):
+        yield
+
+
+def run_session(session: int, turns: int, timeout: float) -> list[float]:
+    """
+    Open the chat page and send prompts, as one user would.
+
+    Args:
+        session (int): The session number, added to the prompts.
+        turns (int): Number of prompts to send after the introduction.
+        timeout (float): Seconds a turn may take.
+
+    Returns:
+        list[float]: Latency of each turn in seconds, the introduction first.
+    """
+    latencies = []
+
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+    start = time.perf_counter()
+    at.switch_page("pages/pets_autogen.py").run()
+    latencies.append(time.perf_counter() - start)
+
+    for turn in range(turns):
+        prompt = f"{PROMPTS[turn % len(PROMPTS)]} (session {session})"
+        start = time.perf_counter()
+        at.chat_input(key="chat_bot").set_value(prompt).run()
+        latencies.append(time.perf_counter() - start)
+
+    if at.exception:
+        raise RuntimeError(f"Session {session} failed: {at.exception[0].message}")
+    return latencies
+
+
+def run_load_test(
+    sessions: int = 8,
+    turns: int = 2,
+    latency: float = 0.2,
+    chunk_delay: float = 0.01,
+    timeout: float = 120,
+) -> dict:
+    """
+    Drive concurrent chat sessions against a local mock model.
+
+    Every session runs the real Streamlit page and `autogen_response_stream`,
+    only the model endpoint is replaced by `MockLLMServer`, so no network
+    access or API key is needed.
+
+    Args:
+        sessions (int): Number of concurrent sessions.
+        turns (int): Prompts per session after the introduction.
+        latency (float): Seconds before the mock model's first token.
+        chunk_delay (float): Seconds between the mock model's streamed chunks.
+        timeout (float): Seconds a turn may take.
+
+    Returns:
+        dict: Turn latencies, throughput and memory of the run.
+    """
+    with (
+        MockLLMServer(latency=latency, chunk_delay=chunk_delay) as server,
+        # Every session would share one embedding endpoint, which is not mocked
+        patch("utils.bots.semantic_cache.SEMANTIC_CACHE_ENABLED", False),
+        patch("utils.function_call.retrieval.RETRIEVAL_PREFETCH", False),
+        patch.object(
+            type(st.context), "locale", new_callable=PropertyMock, return_value="en"
+        ),
+        concurrent_app_tests(),
+    ):
+        agent_pool.model_client = SharedModelClient(
+            partial(create_model_client, base_url=server.base_url, api_key="mock"),
+            # The mock has no rate limits to respect
+            scheduler=None,
+        )
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=sessions) as executor:
+                results = list(
+                    executor.map(
+                        run_session,
+                        range(sessions),
+                        [turns] * sessions,
+                        [timeout] * sessions,
+                    )
+                )
+        finally:
+            elapsed = time.perf_counter() - start
+            # The default client is created again on next use
+            agent_pool.model_client = None
+
+    latencies = sorted(turn for result in results for turn in result)
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "model_requests": len(server.requests),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "latency_mean": statistics.mean(latencies),
+        "latency_p50": statistics.median(latencies),
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "latency_max": latencies[-1],
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - rss_before,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load test the chat page against a local mock model."
+    )
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    report = run_load_test(
+        sessions=args.sessions,
+        turns=args.turns,
+        latency=args.latency,
+        chunk_delay=args.chunk_delay,
+    )
+    for name, value in report.items():
+        print(
+            f"{name:>20}: {value:.3f}"
+            if isinstance(value, float)
+            else f"{name:>20}: {value}"
+        )
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.tracing import TRACE_PATH, from_otlp  # noqa: E402
+
+
+class TraceCollector:
+    """
+    A local stand-in for an OpenTelemetry collector.
+
+    Accepts OTLP/HTTP JSON export requests, as sent by `OtlpExporter`, on
+    /v1/traces and appends the spans to a JSON Lines file in the format of
+    `JsonlExporter`, so `run_trace_report.py` can read them.
+
+    Args:
+        path (str): The file the spans are written to.
+        host (str): The host to listen on.
+        port (int): The port to listen on, 0 for any free port.
+    """
+
+    def __init__(
+        self, path: str = TRACE_PATH, host: str = "127.0.0.1", port: int = 4318
+    ) -> None:
+        self.path = path
+        self.received = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/traces"
+
+    def start(self) -> "TraceCollector":
+        threading.Thread(
+            target=self._server.serve_forever, name="trace-collector", daemon=True
+        ).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "TraceCollector":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _write(self, spans: list[dict]) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(span, ensure_ascii=False) + "\n")
+            self.received += len(spans)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                if self.path != "/v1/traces":
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    spans = from_otlp(json.loads(self.rfile.read(length)))
+                except (ValueError, KeyError):
+                    self.send_error(400)
+                    return
+                collector._write(spans)
+
+                body = b"{}"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect OTLP/HTTP JSON traces into a JSON Lines file."
+    )
+    parser.add_argument("--path", default=TRACE_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    args = parser.parse_args()
+
+    collector = TraceCollector(path=args.path, host=args.host, port=args.port)
+    print(f"Collecting traces on {collector.endpoint} into {args.path}")
+    try:
+        collector._server.serve_forever()
+    except KeyboardInterrupt:
+        collector._server.server_close()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.tracing import TRACE_PATH  # noqa: E402
+
+
+def load_spans(path: str = TRACE_PATH) -> list[dict]:
+    """
+    Read the spans written by `JsonlExporter` or `run_trace_collector.py`.
+
+    Args:
+        path (str): The JSON Lines file.
+
+    Returns:
+        list[dict]: The spans, skipping lines that cannot be parsed.
+    """
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def slowest_turns(spans: list[dict], top: int = 10) -> list[dict]:
+    """
+    List the slowest turns with the stage that took longest in each.
+
+    Args:
+        spans (list[dict]): The spans of one or more turns.
+        top (int): The number of turns to list.
+
+    Returns:
+        list[dict]: The slowest turns, slowest first.
+    """
+    stages = defaultdict(list)
+    for span in spans:
+        if span["kind"] != "turn":
+            stages[span["trace_id"]].append(span)
+
+    turns = sorted(
+        (span for span in spans if span["kind"] == "turn"),
+        key=lambda span: span["duration"],
+        reverse=True,
+    )[:top]
+
+    report = []
+    for turn in turns:
+        attributes = turn["attributes"]
+        slowest = max(
+            stages[turn["trace_id"]], key=lambda span: span["duration"], default=None
+        )
+        report.append(
+            {
+                "trace_id": turn["trace_id"],
+                "duration": turn["duration"],
+                "first_text_s": attributes.get("first_text_s"),
+                "prompt_tokens": attributes.get("prompt_tokens", 0),
+                "completion_tokens": attributes.get("completion_tokens", 0),
+                "stages": len(stages[turn["trace_id"]]),
+                "slowest_stage": slowest["name"] if slowest else None,
+                "slowest_stage_duration": slowest["duration"] if slowest else None,
+                "status": turn["status"],
+            }
+        )
+    return report
+
+
+def stage_stats(spans: list[dict]) -> list[dict]:
+    """
+    Aggregate the durations of the stages by name.
+
+    Args:
+        spans (list[dict]): The spans of one or more turns.
+
+    Returns:
+        list[dict]: One entry per stage, the most total time first.
+    """
+    durations = defaultdict(list)
+    tokens = defaultdict(int)
+    errors = defaultdict(int)
+    for span in spans:
+        if span["kind"] == "turn":
+            continue
+        name = span["name"]
+        durations[name].append(span["duration"])
+        if span["kind"] == "model":
+            tokens[name] += span["attributes"].get("prompt_tokens", 0)
+            tokens[name] += span["attributes"].get("completion_tokens", 0)
+        if span["status"] != "ok" or span["attributes"].get("is_error"):
+            errors[name] += 1
+
+    stats = []
+    for name, values in durations.items():
+        values.sort()
+        stats.append(
+            {
+                "stage": name,
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+                "tokens": tokens[name],
+                "errors": errors[name],
+            }
+        )
+    return sorted(stats, key=lambda stat: stat["total"], reverse=True)
+
+
+def format_table(rows: list[dict]) -> str:
+    """
+    Format report rows as an aligned text table.
+
+    Args:
+        rows (list[dict]): Rows with the same keys.
+
+    Returns:
+        str: The table.
+    """
+    if not rows:
+        return "(no spans)"
+
+    def cell(value) -> str:
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return "-" if value is None else str(value)
+
+    columns = list(rows[0])
+    cells = [[cell(row[column]) for column in columns] for row in rows]
+    widths = [
+        max(len(column), *(len(row[i]) for row in cells))
+        for i, column in enumerate(columns)
+    ]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths, strict=True))]
+    lines += [
+        "  ".join(c.ljust(w) for c, w in zip(row, widths, strict=True)) for row in cells
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the slowest turns and stages of recorded traces."
+    )
+    parser.add_argument("--path", default=TRACE_PATH)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    print(f"Slowest turns ({args.path})\n")
+    print(format_table(slowest_turns(spans, args.top)))
+    print("\nStages by total time\n")
+    print(format_table(stage_stats(spans)[: args.top]))
@@ -5,6 +5,11 @@ import sys
 import pandas as pd
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.function_call.embeddings import embed_text  # noqa: E402
+from utils.scheduler import Priority, request_priority  # noqa: E402
+
 
 def vectorize_document(document: str) -> list[float]:
     """
@@ -16,20 +21,9 @@ def vectorize_document(document: str) -> list[float]:
     Returns:
         list[float]: A list of floats representing the vectorized document.
     """
-    import os
-
-    from google import genai
-    from google.genai import types
-
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-
-    result = client.models.embed_content(
-        model="models/text-embedding-004",
-        contents=document,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT"),
-    )
-
-    return result.embeddings[0].values
+    # Shares the key's budget with the chat, which is served first
+    with request_priority(Priority.BATCH):
+        return embed_text(document, task_type="RETRIEVAL_DOCUMENT")
 
 
 def process_csv_vectorization(csv_path: str):
@@ -53,8 +47,8 @@ def process_csv_vectorization(csv_path: str):
     else:
         print("'vectorize' 欄位已存在")
 
-    # 檢查哪些記錄需要向量化（vectorize 欄位為空的記錄）
-    need_vectorize = df["vectorize"] == ""
+    # 檢查哪些記錄需要向量化（vectorize 欄位為空的記錄，讀入時可能是 NaN）
+    need_vectorize = df["vectorize"].isna() | (df["vectorize"] == "")
     records_to_process = need_vectorize.sum()
 
     if records_to_process == 0:
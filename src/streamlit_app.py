@@ -1,9 +1,11 @@
-import pandas as pd
 import streamlit as st
 
 from utils.i18n import i18n
+from utils.warmup import warmup
 
-pd.set_option("future.no_silent_downcasting", True)
+# Load the heavy modules, models, article index and prompts while the first
+# page renders, so the first user does not wait for them
+warmup.start()
 
 
 def sidebar_name_to_page_title(pg_title: str) -> str:
@@ -1,4 +1,5 @@
 from .helpers import (
     chat,
     display_chat_history,
+    display_wordcloud,
 )
@@ -0,0 +1,268 @@
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from functools import wraps
+
+from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.conditions import TextMessageTermination
+from autogen_agentchat.teams import RoundRobinGroupChat
+from autogen_agentchat.tools import AgentTool
+from autogen_core.models import ChatCompletionClient
+from autogen_core.tools import FunctionTool
+
+from utils.bots.cached_tool import CachedAgentTool, prompt_version
+from utils.bots.memory import SummarizingChatCompletionContext, make_summarizer
+from utils.bots.model_client import SharedModelClient
+from utils.bots.workbench import ParallelWorkbench
+from utils.function_call import (
+    content_wordcloud,
+    find_adoptable_pets,
+    get_article_contents,
+    list_pet_attributes,
+    query_top_k_match_contents,
+    rank_pets_for_adopter,
+)
+from utils.helpers import read_file_content
+
+PROMPT_FILES = {
+    "budget_assistant": "./src/static/BudgetAdvisor_Agent_Prompt.txt",
+    "careguide_assistant": "./src/static/CareGuide_Agent_Prompt.txt",
+    "match_maker_assistant": "./src/static/Matchmaker_Agent_Prompt.txt",
+    "head_assistant": "./src/static/system_prompt.txt",
+}
+
+
+def run_in_thread(func: Callable) -> Callable[..., Awaitable]:
+    """
+    Wrap a blocking function as a coroutine function run on a worker thread.
+
+    `FunctionTool` runs blocking functions with `run_in_executor`, which drops
+    the context of the caller, so spans opened by the function would not nest
+    under the tool call. `asyncio.to_thread` keeps it.
+
+    Arguments:
+        func (Callable): The blocking function
+
+    Returns:
+        Callable[..., Awaitable]: A coroutine function with the same signature
+    """
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    return wrapper
+
+
+class AgentPool:
+    """
+    Process-wide factory for the agent team.
+
+    It owns everything that can be shared between sessions: one model client
+    (and therefore one HTTP connection pool), the system prompts and the
+    function tools, whose schemas are built once. Each session only gets its
+    own lightweight agents, which hold the conversation state.
+
+    Parameters:
+        prompt_files (dict[str, str]): System prompt file of each agent.
+    """
+
+    def __init__(self, prompt_files: dict[str, str] = PROMPT_FILES) -> None:
+        self._lock = threading.Lock()
+        self._prompt_files = prompt_files
+        self._prompts: dict[str, str] = {}
+        self._model_client: ChatCompletionClient | None = None
+        self._tools: dict[str, FunctionTool] = {}
+
+    @property
+    def model_client(self) -> ChatCompletionClient:
+        """
+        The model client shared by every agent of the process.
+        """
+        with self._lock:
+            if self._model_client is None:
+                self._model_client = SharedModelClient()
+            return self._model_client
+
+    @model_client.setter
+    def model_client(self, client: ChatCompletionClient | None) -> None:
+        # Agents created afterwards use the new client, e.g. a local mock
+        # model, None creates the default client again on next use
+        with self._lock:
+            self._model_client = client
+
+    def prompt(self, agent_name: str) -> str:
+        """
+        Get the system prompt of an agent, reading its file only once.
+
+        Arguments:
+            agent_name (str): The name of the agent
+
+        Returns:
+            str: The system prompt
+        """
+        with self._lock:
+            if agent_name not in self._prompts:
+                self._prompts[agent_name] = read_file_content(
+                    self._prompt_files[agent_name]
+                )
+            return self._prompts[agent_name]
+
+    def tool(self, func) -> FunctionTool:
+        """
+        Get the shared function tool wrapping a function.
+
+        Arguments:
+            func (Callable): The function exposed to the agents
+
+        Returns:
+            FunctionTool: The tool, created on first use
+        """
+        with self._lock:
+            if func.__name__ not in self._tools:
+                self._tools[func.__name__] = FunctionTool(
+                    run_in_thread(func), description=func.__doc__ or ""
+                )
+            return self._tools[func.__name__]
+
+    def warm_up(self) -> None:
+        """
+        Create the shared model client, prompts and tools ahead of the first session.
+        """
+        _ = self.model_client
+        for agent_name in self._prompt_files:
+            self.prompt(agent_name)
+        self.tool(content_wordcloud)
+        self.tool(query_top_k_match_contents)
+        self.tool(get_article_contents)
+        self.tool(find_adoptable_pets)
+        self.tool(list_pet_attributes)
+        self.tool(rank_pets_for_adopter)
+
+    def create_model_context(self) -> SummarizingChatCompletionContext:
+        """
+        Create the token-budgeted memory of one agent.
+
+        Returns:
+            SummarizingChatCompletionContext: A model context that summarizes older turns
+        """
+        return SummarizingChatCompletionContext(
+            summarizer=make_summarizer(self.model_client)
+        )
+
+    def create_head_agent(self) -> AssistantAgent:
+        """
+        Create the agents of one session.
+
+        Returns:
+            AssistantAgent: The head assistant, which calls the other agents as tools
+        """
+        model_client = self.model_client
+
+        budget_assistant = AssistantAgent(
+            name="budget_assistant",
+            model_client=model_client,
+            system_message=self.prompt("budget_assistant"),
+            model_context=self.create_model_context(),
+            description="A budget advisor agent that provides budget suggestions based on user needs.",
+        )
+        careguide_assistant = AssistantAgent(
+            name="careguide_assistant",
+            model_client=model_client,
+            system_message=self.prompt("careguide_assistant"),
+            model_context=self.create_model_context(),
+            description="A care guide agent that provides care suggestions based on user needs.",
+        )
+        match_maker_assistant = AssistantAgent(
+            name="match_maker_assistant",
+            model_client=model_client,
+            system_message=self.prompt("match_maker_assistant"),
+            model_context=self.create_model_context(),
+            description="A match maker agent that provides match suggestions based on user needs.",
+            workbench=ParallelWorkbench(
+                [
+                    self.tool(query_top_k_match_contents),
+                    self.tool(get_article_contents),
+                    self.tool(find_adoptable_pets),
+                    self.tool(list_pet_attributes),
+                    self.tool(rank_pets_for_adopter),
+                ]
+            ),
+        )
+
+        return AssistantAgent(
+            name="head_assistant",
+            model_client=model_client,
+            workbench=ParallelWorkbench(
+                [
+                    self.tool(content_wordcloud),
+                    # Budget and care questions are mostly generic, so their
+                    # answers are cached across sessions
+                    CachedAgentTool(
+                        budget_assistant,
+                        prompt_version(self.prompt("budget_assistant")),
+                    ),
+                    CachedAgentTool(
+                        careguide_assistant,
+                        prompt_version(self.prompt("careguide_assistant")),
+                    ),
+                    AgentTool(agent=match_maker_assistant),
+                ]
+            ),
+            system_message=self.prompt("head_assistant"),
+            model_context=self.create_model_context(),
+            # Stream the answer to the user as the model writes it
+            model_client_stream=True,
+        )
+
+    @staticmethod
+    async def save_agents_state(head_agent: AssistantAgent) -> dict:
+        """
+        Save the conversations of a session's agents.
+
+        Arguments:
+            head_agent (AssistantAgent): The head assistant of the session
+
+        Returns:
+            dict: The state of the head assistant and the agents it calls as tools
+        """
+        # The state of an assistant holds its model context only, the agents
+        # it calls are reached through its workbench
+        return {
+            "head": await head_agent.save_state(),
+            "tools": await head_agent._workbench.save_state(),
+        }
+
+    @staticmethod
+    async def load_agents_state(head_agent: AssistantAgent, state: dict) -> None:
+        """
+        Restore the conversations of a session's agents.
+
+        Arguments:
+            head_agent (AssistantAgent): A new head assistant, from `create_head_agent`
+            state (dict): A state returned by `save_agents_state`
+        """
+        await head_agent.load_state(state["head"])
+        await head_agent._workbench.load_state(state["tools"])
+
+    @staticmethod
+    def create_team(head_agent: AssistantAgent) -> RoundRobinGroupChat:
+        """
+        Wrap a session's head assistant into a team.
+
+        The team is cheap and bound to the event loop it first runs on, so it
+        is created again for every run while the agents keep the conversation.
+
+        Arguments:
+            head_agent (AssistantAgent): The head assistant of the session
+
+        Returns:
+            RoundRobinGroupChat: The team to run
+        """
+        return RoundRobinGroupChat(
+            [head_agent],
+            termination_condition=TextMessageTermination(head_agent.name),
+        )
+
+
+agent_pool = AgentPool()
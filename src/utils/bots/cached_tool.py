@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import unicodedata
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import ToolCallExecutionEvent
+from autogen_agentchat.tools import AgentTool
+from autogen_core import CancellationToken
+from pydantic import BaseModel, Field
+
+from utils.cache import SingleFlight, TTLCache
+from utils.i18n import i18n
+
+SUBAGENT_CACHE_TTL = float(os.environ.get("SUBAGENT_CACHE_TTL", 6 * 60 * 60))
+SUBAGENT_CACHE_SIZE = int(os.environ.get("SUBAGENT_CACHE_SIZE", 256))
+
+# Shared by every session of the process
+response_cache = TTLCache(maxsize=SUBAGENT_CACHE_SIZE, ttl=SUBAGENT_CACHE_TTL)
+inflight_calls = SingleFlight()
+
+_session_lang: ContextVar[str | None] = ContextVar("session_lang", default=None)
+
+
+@contextmanager
+def session_language(lang: str) -> Iterator[None]:
+    """
+    Key the answers cached inside the block by the language of a session.
+
+    Arguments:
+        lang (str): The language of the session's messages
+    """
+    token = _session_lang.set(lang)
+    try:
+        yield
+    finally:
+        try:
+            _session_lang.reset(token)
+        except ValueError:
+            # An async generator closed from another context
+            _session_lang.set(None)
+
+
+class CachedTaskArgs(BaseModel):
+    task: str = Field(description="The task to be executed.")
+    use_cache: bool = Field(
+        True,
+        description="Whether a recent answer to the same task may be reused. Set to false if the user asks for a fresh answer.",
+    )
+
+
+def normalize_task(task: str) -> str:
+    """
+    Normalize a task so trivially different wordings share a cache entry.
+
+    Arguments:
+        task (str): The task given to the agent
+
+    Returns:
+        str: The task in NFKC form, lower case, without punctuation and extra whitespace
+    """
+    task = unicodedata.normalize("NFKC", task).lower()
+    task = re.sub(r"[^\w\s]", " ", task)
+    return " ".join(task.split())
+
+
+def prompt_version(system_prompt: str) -> str:
+    """
+    Fingerprint a system prompt, so editing it invalidates the cached answers.
+
+    Arguments:
+        system_prompt (str): The system prompt of the agent
+
+    Returns:
+        str: A short hex digest of the prompt
+    """
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def is_error(result: TaskResult) -> bool:
+    """
+    Whether a tool called during an agent run failed.
+
+    Arguments:
+        result (TaskResult): The result of the run
+
+    Returns:
+        bool: True if a tool call of the run returned an error
+    """
+    return any(
+        call.is_error
+        for message in result.messages
+        if isinstance(message, ToolCallExecutionEvent)
+        for call in message.content
+    )
+
+
+class CachedAgentTool(AgentTool):
+    """
+    An agent tool whose answers are cached across sessions.
+
+    Answers are keyed by the agent name, the normalized task, the language of
+    the session (see `session_language`) and the prompt version. Identical tasks requested concurrently are collapsed
+    into one agent run. Runs during which a tool failed are not cached. The
+    calling model can opt out per call with `use_cache`.
+
+    Parameters:
+        agent (BaseChatAgent): The agent to run.
+        version (str): The prompt version of the agent, see `prompt_version`.
+    """
+
+    def __init__(self, agent: BaseChatAgent, version: str) -> None:
+        super().__init__(agent)
+        self._args_type = CachedTaskArgs
+        self._version = version
+
+    def cache_key(self, task: str) -> tuple[str, str, str, str]:
+        lang = _session_lang.get() or i18n.lang
+        return (self.name, normalize_task(task), lang, self._version)
+
+    async def run(
+        self, args: CachedTaskArgs, cancellation_token: CancellationToken
+    ) -> TaskResult:
+        if not args.use_cache:
+            return await super().run(args, cancellation_token)
+
+        key = self.cache_key(args.task)
+        if (result := response_cache.get(key)) is not None:
+            return result
+
+        result = await inflight_calls.run(
+            key, lambda: super(CachedAgentTool, self).run(args, cancellation_token)
+        )
+        if not is_error(result):
+            response_cache.set(key, result)
+        return result
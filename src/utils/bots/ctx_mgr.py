@@ -1,46 +1,98 @@
-from collections import deque
+from collections.abc import MutableMapping
 from typing import Any
 
 import streamlit as st
 
+from utils.bots.memory import estimate_tokens, strip_binary, strip_payloads
+
 
 class CtxMgr:
+    """
+    A chat history stored in st.session_state, or another mapping, optionally
+    kept under a token budget.
+
+    Message dicts with a text "content" are stored without inline binary
+    payloads and with their approximate token count in "tokens". When the
+    history exceeds the token budget, the oldest messages are dropped.
+
+    Parameters:
+        name (str): Name of the context in its state.
+        init_container (list | deque): The initial container of the context.
+        token_budget (int | None): Tokens of the history, None for no limit.
+        state (MutableMapping | None): Where the context is stored, e.g. the
+            state of a `ChatSession`. Defaults to st.session_state.
+    """
+
     def __init__(
         self,
         name: str,
         init_container,
+        token_budget: int | None = None,
+        state: MutableMapping | None = None,
     ) -> None:
         self._name = f"{name}_ctx"
-        if self._name not in st.session_state:
-            st.session_state[self._name] = init_container
+        self._token_budget = token_budget
+        self._state = st.session_state if state is None else state
+        if self._name not in self._state:
+            self._state[self._name] = init_container
 
     @property
     def name(self) -> str:
         """
-        Return the name of the context in st.session_state.
+        Return the name of the context in its state.
         """
         return self._name
 
     def add_context(self, content: Any) -> None:
         """
-        Append a content item to st.session_state[self.ctx_name], initializing it as a deque of max
-        length 20 if needed.
+        Append a content item to st.session_state[self.ctx_name], dropping the
+        oldest items if the token budget is exceeded.
+        """
+        if self._name not in self._state:
+            self._state[self._name] = []
+
+        if isinstance(content, dict) and isinstance(content.get("content"), str):
+            text = strip_binary(content["content"])
+            content = {
+                **content,
+                "content": text,
+                "tokens": estimate_tokens(strip_payloads(text)),
+            }
+
+        container = self._state[self._name]
+        container.append(content)
+
+        if self._token_budget is not None:
+            total = self.token_count()
+            while len(container) > 1 and total > self._token_budget:
+                if isinstance(container, list):
+                    dropped = container.pop(0)
+                else:
+                    dropped = container.popleft()
+                if isinstance(dropped, dict):
+                    total -= dropped.get("tokens", 0)
+
+    def token_count(self) -> int:
+        """
+        Return the approximate number of tokens of the context.
         """
-        if self._name not in st.session_state:
-            st.session_state[self._name] = deque(maxlen=20)
-        st.session_state[self._name].append(content)
+        return sum(
+            item.get("tokens", 0)
+            for item in self._state[self._name]
+            if isinstance(item, dict)
+        )
 
     def clear_context(self) -> None:
         """
         Clear the context in st.session_state[self.ctx_name].
         """
-        st.session_state[self._name].clear()
+        self._state[self._name].clear()
 
     def get_context(self) -> Any:
         """
         Retrieve the current context from st.session_state[self.ctx_name].
         """
-        return list(st.session_state[self._name])
+        return list(self._state[self._name])
 
     def empty(self) -> bool:
-        return len(st.session_state[self._name]) == 0
+        return len(self._state[self._name]) == 0
@@ -3,6 +3,28 @@ from collections.abc import Generator
 import streamlit as st
 
 from utils.bots.ctx_mgr import CtxMgr
+from utils.function_call.render_cache import is_handle, resolve_handle
+from utils.i18n import i18n
+
+
+def display_wordcloud(content: str) -> None:
+    """
+    Render a word cloud tool result, either an image handle or an inline html image.
+
+    Arguments:
+        content (str): The result of the `content_wordcloud` tool
+    """
+    if not is_handle(content):
+        st.markdown(content, unsafe_allow_html=True)
+        return
+
+    if (resolved := resolve_handle(content)) is None:
+        st.caption(i18n("pets.chat.wordcloud_expired"))
+        return
+
+    img, mime = resolved
+    # Raster images are served through Streamlit's media endpoint instead of inline base64
+    st.image(img.decode("utf-8") if mime == "image/svg+xml" else img)
 
 
 def display_chat_history(
@@ -16,7 +38,11 @@ def display_chat_history(
     histories = ctx.get_context()
     for history in histories:
         avatar = user_image if history["role"] == "user" else None
-        st.chat_message(history["role"], avatar=avatar).markdown(history["content"])
+        message = st.chat_message(history["role"], avatar=avatar)
+        message.markdown(history["content"])
+        with message:
+            for image in history.get("images", []):
+                display_wordcloud(image)
 
 
 def chat(ctx_history: CtxMgr, prompt: str, stream: Generator):
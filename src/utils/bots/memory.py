@@ -0,0 +1,360 @@
+import os
+import re
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any
+
+from autogen_core import FunctionCall, Image
+from autogen_core.model_context import (
+    ChatCompletionContext,
+    ChatCompletionContextState,
+)
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+
+# Tokens of the conversation sent to the model, older turns are summarized beyond it
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", 6000))
+# Tokens of the rolling summary of the summarized turns
+MEMORY_SUMMARY_TOKENS = int(os.environ.get("MEMORY_SUMMARY_TOKENS", 500))
+# Tokens of the chat history kept for display, oldest messages are dropped beyond it
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 32000))
+
+# Fold down to this share of the budget, so that not every turn is summarized
+MEMORY_KEEP_RATIO = 0.6
+# Gemini bills an image as a fixed number of tokens
+IMAGE_TOKENS = 258
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a conversation between a user and a pet "
+    "adoption assistant. Update the summary with the new messages. Keep the "
+    "user's preferences and living situation, the pets and articles discussed "
+    "with their links, and any open questions. Write in the language of the "
+    "conversation, at most {max_tokens} tokens, and answer with the summary only."
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+Summarizer = Callable[[str, list[LLMMessage]], Awaitable[str]]
+
+_CJK = re.compile(
+    r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]"
+)
+_DATA_IMG = re.compile(
+    r"""<img\b[^>]*?src=["']data:([\w/+.-]+);base64,([A-Za-z0-9+/=\s]*)["'][^>]*>""",
+    re.IGNORECASE,
+)
+_DATA_URI = re.compile(r"data:([\w/+.-]+);base64,([A-Za-z0-9+/=]+)")
+_BADGE = re.compile(r":\w+-badge\[(?::material/\w+: )?(.*?)\]")
+_HTML_TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens of a text without a tokenizer.
+
+    CJK characters are counted as one token each, other text as one token
+    per four characters.
+
+    Arguments:
+        text (str): The text
+
+    Returns:
+        int: The approximate number of tokens
+    """
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _payload_reference(match: re.Match) -> str:
+    mime, payload = match.group(1), match.group(2)
+    return f"[{mime}, {len(payload) * 3 // 4 // 1024} KB]"
+
+
+def strip_binary(text: str) -> str:
+    """
+    Replace inline base64 images and data URIs by a short reference.
+
+    Arguments:
+        text (str): The text
+
+    Returns:
+        str: The text without binary payloads
+    """
+    text = _DATA_IMG.sub(_payload_reference, text)
+    return _DATA_URI.sub(_payload_reference, text)
+
+
+def strip_payloads(text: str) -> str:
+    """
+    Reduce a message to what the model needs to read.
+
+    Binary payloads become references, status badges become their text and
+    html tags are dropped.
+
+    Arguments:
+        text (str): The text
+
+    Returns:
+        str: The stripped text
+    """
+    text = strip_binary(text)
+    text = _BADGE.sub(r"[\1]", text)
+    return _HTML_TAG.sub("", text)
+
+
+def message_tokens(message: LLMMessage) -> int:
+    """
+    Estimate the number of tokens of a model message.
+
+    Arguments:
+        message (LLMMessage): The message
+
+    Returns:
+        int: The approximate number of tokens
+    """
+    content = message.content
+    if isinstance(content, str):
+        return estimate_tokens(content)
+
+    tokens = 0
+    for item in content:
+        if isinstance(item, str):
+            tokens += estimate_tokens(item)
+        elif isinstance(item, Image):
+            tokens += IMAGE_TOKENS
+        elif isinstance(item, FunctionCall):
+            tokens += estimate_tokens(item.name) + estimate_tokens(item.arguments)
+        else:
+            tokens += estimate_tokens(item.content)
+    return tokens
+
+
+def _strip_message(message: LLMMessage) -> LLMMessage:
+    if isinstance(message, UserMessage | AssistantMessage) and isinstance(
+        message.content, str
+    ):
+        return message.model_copy(update={"content": strip_payloads(message.content)})
+    if isinstance(message, FunctionExecutionResultMessage):
+        return message.model_copy(
+            update={
+                "content": [
+                    result.model_copy(
+                        update={"content": strip_payloads(result.content)}
+                    )
+                    for result in message.content
+                ]
+            }
+        )
+    return message
+
+
+def _transcript(messages: list[LLMMessage]) -> str:
+    lines = []
+    for message in messages:
+        if isinstance(message, FunctionExecutionResultMessage):
+            for result in message.content:
+                lines.append(f"[{result.name} result] {result.content}")
+        elif isinstance(message.content, str):
+            lines.append(f"{getattr(message, 'source', 'system')}: {message.content}")
+        else:
+            for item in message.content:
+                if isinstance(item, FunctionCall):
+                    lines.append(f"[calls {item.name}] {item.arguments}")
+                elif isinstance(item, str):
+                    lines.append(f"{message.source}: {item}")
+    return "\n".join(lines)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Keep the end of a text within a token budget, dropping whole lines first.
+
+    Arguments:
+        text (str): The text
+        max_tokens (int): The token budget
+
+    Returns:
+        str: The text, without its beginning if it was too long
+    """
+    lines = text.split("\n")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    text = "\n".join(lines)
+
+    while text and estimate_tokens(text) > max_tokens:
+        text = text[max(1, len(text) // 4) :]
+    return text
+
+
+def extractive_summary(
+    summary: str, messages: list[LLMMessage], max_tokens: int = MEMORY_SUMMARY_TOKENS
+) -> str:
+    """
+    Summarize messages without a model by keeping the start of each text message.
+
+    Used when the model summary fails, so the context stays bounded anyway.
+
+    Arguments:
+        summary (str): The summary so far
+        messages (list[LLMMessage]): The messages to add to the summary
+        max_tokens (int): The token budget of the summary
+
+    Returns:
+        str: The updated summary
+    """
+    lines = [summary] if summary else []
+    for message in messages:
+        if isinstance(message, UserMessage | AssistantMessage) and isinstance(
+            message.content, str
+        ):
+            lines.append(f"{message.source}: {message.content[:120]}")
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+
+def make_summarizer(
+    model_client: ChatCompletionClient, max_tokens: int = MEMORY_SUMMARY_TOKENS
+) -> Summarizer:
+    """
+    Create a summarizer that updates a rolling summary with the model.
+
+    Arguments:
+        model_client (ChatCompletionClient): The model client
+        max_tokens (int): The token budget of the summary
+
+    Returns:
+        Summarizer: Takes the summary so far and the messages to add
+    """
+
+    async def summarize(summary: str, messages: list[LLMMessage]) -> str:
+        result = await model_client.create(
+            [
+                SystemMessage(content=SUMMARY_PROMPT.format(max_tokens=max_tokens)),
+                UserMessage(
+                    content=f"Summary so far:\n{summary or '(empty)'}\n\n"
+                    f"New messages:\n{_transcript(messages)}",
+                    source="user",
+                ),
+            ]
+        )
+        if not isinstance(result.content, str):
+            raise ValueError("The summary is not text")
+        return result.content.strip()
+
+    return summarize
+
+
+class SummarizingContextState(ChatCompletionContextState):
+    summary: str = ""
+
+
+class SummarizingChatCompletionContext(ChatCompletionContext):
+    """
+    A model context kept under a token budget by summarizing older turns.
+
+    Binary and html payloads are stripped from messages as they are added.
+    When the messages exceed the token budget, the oldest whole turns are
+    folded into a rolling summary, which is sent to the model ahead of the
+    remaining messages. Only the turns being dropped are summarized, so each
+    fold costs one short model call.
+
+    Parameters:
+        summarizer (Summarizer | None): Updates the summary, None to always use `extractive_summary`.
+        token_budget (int): Tokens of the messages sent to the model.
+        summary_tokens (int): Tokens of the rolling summary.
+        initial_messages (list[LLMMessage] | None): The initial messages.
+    """
+
+    def __init__(
+        self,
+        summarizer: Summarizer | None = None,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        summary_tokens: int = MEMORY_SUMMARY_TOKENS,
+        initial_messages: list[LLMMessage] | None = None,
+    ) -> None:
+        super().__init__(initial_messages)
+        self._summarizer = summarizer
+        self._token_budget = token_budget
+        self._summary_tokens = summary_tokens
+        self._summary = ""
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def token_count(self) -> int:
+        """
+        Estimate the tokens of the messages and the summary.
+
+        Returns:
+            int: The approximate number of tokens
+        """
+        return estimate_tokens(self._summary) + sum(
+            message_tokens(message) for message in self._messages
+        )
+
+    async def add_message(self, message: LLMMessage) -> None:
+        await super().add_message(_strip_message(message))
+
+    async def get_messages(self) -> list[LLMMessage]:
+        if self.token_count() > self._token_budget:
+            await self._fold()
+
+        if not self._summary:
+            return list(self._messages)
+        return [
+            UserMessage(content=SUMMARY_HEADER + self._summary, source="memory"),
+            *self._messages,
+        ]
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._summary = ""
+
+    async def save_state(self) -> Mapping[str, Any]:
+        return SummarizingContextState(
+            messages=self._messages, summary=self._summary
+        ).model_dump()
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        loaded = SummarizingContextState.model_validate(state)
+        self._messages = loaded.messages
+        self._summary = loaded.summary
+
+    async def _fold(self) -> None:
+        """
+        Summarize the oldest turns until the rest fits the budget.
+        """
+        # Cut only where a user turn starts, so a tool call is never separated
+        # from its result, and always keep the current turn
+        turn_starts = [
+            i
+            for i, message in enumerate(self._messages)
+            if i > 0 and isinstance(message, UserMessage)
+        ]
+        if not turn_starts:
+            return
+
+        target = self._token_budget * MEMORY_KEEP_RATIO - self._summary_tokens
+        cut = turn_starts[-1]
+        for start in turn_starts:
+            if sum(message_tokens(m) for m in self._messages[start:]) <= target:
+                cut = start
+                break
+
+        dropped = self._messages[:cut]
+        summary = None
+        if self._summarizer is not None:
+            try:
+                summary = await self._summarizer(self._summary, dropped)
+            except Exception as e:
+                print(f"Failed to summarize the conversation: {e}")
+
+        if summary is None:
+            summary = extractive_summary(self._summary, dropped, self._summary_tokens)
+
+        self._summary = truncate_tokens(summary, self._summary_tokens)
+        self._messages = self._messages[cut:]
@@ -0,0 +1,300 @@
+import asyncio
+import itertools
+import os
+import threading
+from collections.abc import AsyncGenerator, Callable, Mapping, Sequence
+from contextlib import aclosing
+from typing import Any
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from autogen_ext.models.openai import OpenAIChatCompletionClient
+from pydantic import BaseModel
+
+from utils.bots.memory import estimate_tokens, message_tokens
+from utils.scheduler import RequestScheduler, gemini_scheduler
+from utils.tracing import Span, tracer
+
+MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+# Another OpenAI-compatible endpoint, e.g. the local mock in `utils.mock_llm`
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL")
+# Budget of the model in `utils.scheduler`
+SCHEDULER_MODEL = "chat"
+
+_DONE = object()
+
+
+def prompt_tokens(messages: Sequence[LLMMessage]) -> int:
+    """
+    Estimate the tokens of the messages sent to the model.
+
+    Arguments:
+        messages (Sequence[LLMMessage]): The messages
+
+    Returns:
+        int: The approximate number of tokens
+    """
+    return sum(message_tokens(message) for message in messages)
+
+
+def record_usage(
+    span: Span, messages: Sequence[LLMMessage], result: CreateResult
+) -> int:
+    """
+    Count the tokens of a model call on its span.
+
+    Streamed responses report no usage unless the endpoint is asked for it, so
+    the tokens are estimated from the messages then.
+
+    Arguments:
+        span (Span): The span of the model call
+        messages (Sequence[LLMMessage]): The messages sent to the model
+        result (CreateResult): The model's response
+
+    Returns:
+        int: The tokens of the call
+    """
+    usage = result.usage
+    if usage.prompt_tokens or usage.completion_tokens:
+        span.add_tokens(usage.prompt_tokens, usage.completion_tokens)
+        return usage.prompt_tokens + usage.completion_tokens
+
+    span.set(estimated_tokens=True)
+    tokens = prompt_tokens(messages), estimate_tokens(str(result.content))
+    span.add_tokens(*tokens)
+    return sum(tokens)
+
+
+def create_model_client(
+    base_url: str | None = LLM_BASE_URL, api_key: str | None = None
+) -> OpenAIChatCompletionClient:
+    """
+    Create the OpenAI-compatible client used to talk to Gemini.
+
+    Arguments:
+        base_url (str | None): The endpoint, None for Gemini's. Defaults to `LLM_BASE_URL`.
+        api_key (str | None): The API key. Defaults to the GEMINI_API_KEY environment variable.
+
+    Returns:
+        OpenAIChatCompletionClient: A new model client
+    """
+    # The client picks Gemini's endpoint from the model name unless one is given
+    endpoint = {"base_url": base_url} if base_url else {}
+    return OpenAIChatCompletionClient(
+        model=MODEL_NAME,
+        model_info=ModelInfo(
+            vision=True,
+            function_calling=True,
+            json_output=True,
+            family="unknown",
+            structured_output=True,
+        ),
+        api_key=api_key or os.environ.get("GEMINI_API_KEY"),
+        **endpoint,
+    )
+
+
+class SharedModelClient(ChatCompletionClient):
+    """
+    A model client that can be shared by every session of the process.
+
+    Streamlit runs each session on its own thread with a fresh event loop per
+    turn, while the HTTP connection pool of the wrapped client may only be used
+    from one event loop. This proxy owns a background event loop and runs every
+    request of the wrapped client there, so all sessions share one client and
+    one connection pool. Requests are paced by the scheduler, which queues
+    them within the budget of the API key shared by all sessions.
+
+    Parameters:
+        client_factory (Callable[[], ChatCompletionClient]): Creates the wrapped client
+        scheduler (RequestScheduler | None): Paces the requests, None to send them right away
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], ChatCompletionClient] = create_model_client,
+        scheduler: RequestScheduler | None = gemini_scheduler,
+    ) -> None:
+        self._scheduler = scheduler
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="shared-model-client", daemon=True
+        )
+        self._thread.start()
+        self._client = client_factory()
+
+    def _submit(
+        self, coro: Any, cancellation_token: CancellationToken | None
+    ) -> asyncio.Future:
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if cancellation_token is not None:
+            cancellation_token.add_callback(future.cancel)
+        return asyncio.wrap_future(future)
+
+    async def _acquire(self, tokens: int) -> None:
+        if self._scheduler is not None:
+            await self._scheduler.acquire(SCHEDULER_MODEL, tokens)
+
+    def _settle(self, estimated: int, actual: int) -> None:
+        if self._scheduler is not None:
+            self._scheduler.settle(SCHEDULER_MODEL, estimated, actual)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        return self._scheduler is not None and self._scheduler.should_retry(
+            SCHEDULER_MODEL, error, attempt
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: bool | type[BaseModel] | None = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: CancellationToken | None = None,
+    ) -> CreateResult:
+        estimated = prompt_tokens(messages)
+        # Spans are opened here, as the shared loop does not see the caller's context
+        with tracer.span(
+            "model.create", kind="model", messages=len(messages), tools=len(tools)
+        ) as span:
+            for attempt in itertools.count():
+                await self._acquire(estimated)
+                try:
+                    result = await self._submit(
+                        self._client.create(
+                            messages,
+                            tools=tools,
+                            json_output=json_output,
+                            extra_create_args=extra_create_args,
+                        ),
+                        cancellation_token,
+                    )
+                    break
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+
+            self._settle(estimated, record_usage(span, messages, result))
+            span.set(finish_reason=result.finish_reason)
+            return result
+
+    async def _stream(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema],
+        json_output: bool | type[BaseModel] | None,
+        extra_create_args: Mapping[str, Any],
+        cancellation_token: CancellationToken | None,
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump() -> None:
+            # Runs on the shared loop and forwards chunks to the caller's loop
+            try:
+                async for chunk in self._client.create_stream(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                ):
+                    loop.call_soon_threadsafe(queue.put_nowait, (chunk, None))
+            except asyncio.CancelledError as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (_DONE, e))
+                raise
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (_DONE, e))
+                return
+            loop.call_soon_threadsafe(queue.put_nowait, (_DONE, None))
+
+        future = self._submit(pump(), cancellation_token)
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if chunk is _DONE:
+                    if error is not None:
+                        raise error
+                    return
+                yield chunk
+        finally:
+            future.cancel()
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: bool | type[BaseModel] | None = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: CancellationToken | None = None,
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        estimated = prompt_tokens(messages)
+        with tracer.span(
+            "model.stream", kind="model", messages=len(messages), tools=len(tools)
+        ) as span:
+            for attempt in itertools.count():
+                await self._acquire(estimated)
+                streamed = False
+                try:
+                    async with aclosing(
+                        self._stream(
+                            messages,
+                            tools,
+                            json_output,
+                            extra_create_args,
+                            cancellation_token,
+                        )
+                    ) as chunks:
+                        async for chunk in chunks:
+                            if isinstance(chunk, CreateResult):
+                                self._settle(
+                                    estimated, record_usage(span, messages, chunk)
+                                )
+                                span.set(finish_reason=chunk.finish_reason)
+                            else:
+                                streamed = True
+                                span.mark("first_token_s")
+                            yield chunk
+                    return
+                except Exception as e:
+                    # Shown chunks cannot be taken back, so only a stream
+                    # that failed before its first chunk is sent again
+                    if streamed or not self._should_retry(e, attempt):
+                        raise
+
+    async def close(self) -> None:
+        await self._submit(self._client.close(), None)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def actual_usage(self) -> RequestUsage:
+        return self._client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._client.total_usage()
+
+    def count_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return self._client.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return self._client.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        return self._client.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._client.model_info
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import partial
+
+import numpy as np
+
+from utils.function_call.embeddings import embed_text
+from utils.function_call.retrieval import article_index_version
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE", "1").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.93))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", 512))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", 24 * 60 * 60))
+
+
+@dataclass
+class CachedAnswer:
+    prompt: str
+    # What was shown to the user, including tool badges
+    answer: str
+    # The final reply of the head agent, replayed into its model context
+    reply: str
+    lang: str
+    index_version: str
+    created_at: float
+    last_used: float
+    images: list[str] = field(default_factory=list)
+
+
+class SemanticCache:
+    """
+    Serve answers to prompts that mean the same as an earlier prompt.
+
+    Prompts are embedded and compared by cosine similarity with the prompts of
+    earlier answers in the same language. An answer is only served while the
+    article index it was produced with is still current and it is younger than
+    the TTL. The least recently used entries are evicted when the cache is full.
+
+    Parameters:
+        embed (Callable[[str], list[float]]): Embeds a prompt.
+        index_version (Callable[[], str]): Returns the current article index version.
+        threshold (float): Minimum cosine similarity for a hit.
+        maxsize (int): Maximum number of cached answers.
+        ttl (float): Seconds an answer stays valid.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], list[float]],
+        index_version: Callable[[], str],
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        ttl: float = SEMANTIC_CACHE_TTL,
+    ) -> None:
+        self._embed = embed
+        self._index_version = index_version
+        self._threshold = threshold
+        self._maxsize = maxsize
+        self._ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: list[CachedAnswer] = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        """
+        Return the hit-rate metrics of the cache.
+
+        Returns:
+            dict: Number of entries, hits, misses, embedding errors and the hit rate
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hit_rate,
+        }
+
+    def embed(self, prompt: str) -> np.ndarray | None:
+        """
+        Embed and L2-normalize a prompt.
+
+        Arguments:
+            prompt (str): The user prompt
+
+        Returns:
+            np.ndarray | None: The unit vector, or None if embedding failed
+        """
+        try:
+            vector = np.asarray(self._embed(prompt), dtype=np.float32)
+        except Exception as e:
+            self.errors += 1
+            print(f"Semantic cache embedding failed: {e}")
+            return None
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray, lang: str) -> CachedAnswer | None:
+        """
+        Find the most similar fresh answer in the same language.
+
+        Arguments:
+            vector (np.ndarray): The prompt embedding from `embed`
+            lang (str): The language of the conversation
+
+        Returns:
+            CachedAnswer | None: The cached answer, or None on a miss
+        """
+        index_version = self._index_version()
+        now = time.time()
+
+        with self._lock:
+            self._drop_stale(index_version, now)
+
+            best = None
+            if self._entries and self._vectors.shape[1] == vector.shape[0]:
+                similarities = self._vectors @ vector
+                for i in np.argsort(similarities)[::-1]:
+                    if similarities[i] < self._threshold:
+                        break
+                    if self._entries[i].lang == lang:
+                        best = self._entries[i]
+                        best.last_used = now
+                        break
+
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def add(
+        self,
+        vector: np.ndarray,
+        lang: str,
+        prompt: str,
+        answer: str,
+        reply: str,
+        images: list[str] | None = None,
+    ) -> None:
+        """
+        Cache the answer to a prompt.
+
+        Arguments:
+            vector (np.ndarray): The prompt embedding from `embed`
+            lang (str): The language of the conversation
+            prompt (str): The user prompt
+            answer (str): The answer shown to the user
+            reply (str): The final reply of the head agent
+            images (list[str] | None): Image handles shown with the answer
+        """
+        now = time.time()
+        entry = CachedAnswer(
+            prompt=prompt,
+            answer=answer,
+            reply=reply,
+            lang=lang,
+            index_version=self._index_version(),
+            created_at=now,
+            last_used=now,
+            images=images or [],
+        )
+
+        with self._lock:
+            if self._vectors.shape[1] != vector.shape[0]:
+                # The embedding model changed, earlier vectors are not comparable
+                self._entries = []
+                self._vectors = np.empty((0, vector.shape[0]), dtype=np.float32)
+
+            self._entries.append(entry)
+            self._vectors = np.vstack([self._vectors, vector[np.newaxis, :]])
+
+            if len(self._entries) > self._maxsize:
+                lru = min(
+                    range(len(self._entries)), key=lambda i: self._entries[i].last_used
+                )
+                self._keep([i for i in range(len(self._entries)) if i != lru])
+
+    def clear(self) -> None:
+        """
+        Remove every cached answer.
+        """
+        with self._lock:
+            self._keep([])
+
+    def _drop_stale(self, index_version: str, now: float) -> None:
+        keep = [
+            i
+            for i, entry in enumerate(self._entries)
+            if entry.index_version == index_version
+            and now - entry.created_at <= self._ttl
+        ]
+        if len(keep) != len(self._entries):
+            self._keep(keep)
+
+    def _keep(self, indices: list[int]) -> None:
+        self._entries = [self._entries[i] for i in indices]
+        self._vectors = self._vectors[indices]
+
+
+# Shared by every session of the process
+semantic_cache = SemanticCache(
+    embed=partial(embed_text, task_type="SEMANTIC_SIMILARITY"),
+    index_version=article_index_version,
+)
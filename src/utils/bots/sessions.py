@@ -0,0 +1,427 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from autogen_agentchat.agents import AssistantAgent
+
+from utils.bots.agent_pool import agent_pool
+
+# Where sessions are kept between turns: "sqlite" or "memory"
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite")
+# SQLite file of the sessions, shared by every server process using it
+SESSION_DB = os.environ.get("SESSION_DB", "./.cache/sessions.db")
+# Seconds an idle session stays in process memory, it is reloaded from the store when it returns
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", 15 * 60))
+# Seconds a session is kept in the store after its last turn
+SESSION_MAX_AGE = float(os.environ.get("SESSION_MAX_AGE", 7 * 24 * 60 * 60))
+# Attempts to save a session continued by another process meanwhile
+SESSION_SAVE_ATTEMPTS = 3
+
+
+class SessionConflict(Exception):
+    """
+    The session was saved by another process since it was loaded.
+    """
+
+
+class SessionStore(Protocol):
+    def version(self, session_id: str) -> int | None: ...
+
+    def load(self, session_id: str) -> tuple[int, dict] | None: ...
+
+    def save(self, session_id: str, state: dict, version: int) -> int: ...
+
+    def delete(self, session_id: str) -> bool: ...
+
+    def purge(self, max_age: float) -> int: ...
+
+
+class MemorySessionStore:
+    """
+    Sessions kept as JSON in the memory of this process.
+
+    Sessions are serialized like in `SqliteSessionStore`, so loading one
+    gives the same result with either store.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Session id -> (version, state as JSON, unix time of the last save)
+        self._sessions: dict[str, tuple[int, str, float]] = {}
+
+    def version(self, session_id: str) -> int | None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry[0] if entry else None
+
+    def load(self, session_id: str) -> tuple[int, dict] | None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return (entry[0], json.loads(entry[1])) if entry else None
+
+    def save(self, session_id: str, state: dict, version: int) -> int:
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            if self._sessions.get(session_id, (0,))[0] != version:
+                raise SessionConflict(session_id)
+            self._sessions[session_id] = (version + 1, data, time.time())
+        return version + 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def purge(self, max_age: float) -> int:
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [sid for sid, (_, _, t) in self._sessions.items() if t < cutoff]
+            for session_id in stale:
+                del self._sessions[session_id]
+        return len(stale)
+
+
+class SqliteSessionStore:
+    """
+    Sessions shared by every process using the same SQLite file.
+
+    Each save increments the version of the session, so a process holding a
+    session in memory can tell when another process has continued it. A save
+    only succeeds over the version it was loaded as, see `save`.
+
+    Parameters:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str = SESSION_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, "
+            "version INTEGER NOT NULL, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections may only be used by the thread that opened them
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+        return conn
+
+    def version(self, session_id: str) -> int | None:
+        row = (
+            self._connect()
+            .execute("SELECT version FROM sessions WHERE id = ?", (session_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def load(self, session_id: str) -> tuple[int, dict] | None:
+        row = (
+            self._connect()
+            .execute("SELECT version, state FROM sessions WHERE id = ?", (session_id,))
+            .fetchone()
+        )
+        return (row[0], json.loads(row[1])) if row else None
+
+    def save(self, session_id: str, state: dict, version: int) -> int:
+        """
+        Save a session over the version it was loaded as.
+
+        Arguments:
+            session_id (str): The id of the session
+            state (dict): The state to save
+            version (int): The version in the store, 0 for a new session
+
+        Returns:
+            int: The new version
+
+        Raises:
+            SessionConflict: If the session is at another version in the store
+        """
+        data = json.dumps(state, ensure_ascii=False)
+        if version == 0:
+            cursor = self._connect().execute(
+                "INSERT INTO sessions VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (id) DO NOTHING RETURNING version",
+                (session_id, data, time.time()),
+            )
+        else:
+            cursor = self._connect().execute(
+                "UPDATE sessions SET version = version + 1, state = ?, updated = ? "
+                "WHERE id = ? AND version = ? RETURNING version",
+                (data, time.time(), session_id, version),
+            )
+        if (row := cursor.fetchone()) is None:
+            raise SessionConflict(session_id)
+        return row[0]
+
+    def delete(self, session_id: str) -> bool:
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE id = ?", (session_id,)
+        )
+        return cursor.rowcount > 0
+
+    def purge(self, max_age: float) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE updated < ?", (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    """
+    Create the session store of a kind.
+
+    Arguments:
+        kind (str): "sqlite" or "memory". Defaults to `SESSION_STORE`.
+
+    Returns:
+        SessionStore: The store
+    """
+    factories = {"sqlite": SqliteSessionStore, "memory": MemorySessionStore}
+    return factories[kind.strip().lower()]()
+
+
+@dataclass
+class ChatSession:
+    """
+    A conversation with the agent team, as held in process memory.
+
+    Parameters:
+        session_id (str): The id clients refer to the session by.
+        lang (str): The language of the session's messages.
+        head_agent (AssistantAgent): The head assistant, which holds the conversation.
+        state (dict): JSON-serializable state of the client, e.g. the displayed history.
+        version (int): The version of the session in the store it was loaded from or saved as.
+        saved_messages (int): Messages of the head assistant when it was loaded or saved.
+        last_used (float): Monotonic time the session was last used.
+        lock (asyncio.Lock): Held while a turn runs, turns of a session run one at a time.
+    """
+
+    session_id: str
+    lang: str
+    head_agent: AssistantAgent
+    state: dict[str, Any] = field(default_factory=dict)
+    version: int = 0
+    saved_messages: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SessionManager:
+    """
+    Keep the sessions in use in memory, and every session in a store.
+
+    Sessions are saved to the store after every turn. Sessions idle for
+    longer than `idle_ttl` are dropped from memory and loaded again, agents
+    included, when they are next used. A session continued by another
+    process is loaded again as well, so processes sharing a store can serve
+    any session. When two processes run a turn of a session at once, the
+    later save replays its turn onto the one saved first, see `save`.
+
+    Parameters:
+        store (SessionStore | None): The store. Defaults to one of `SESSION_STORE`.
+        agent_factory (Callable[[], AssistantAgent] | None): Creates the head
+            assistant of a session. Defaults to `agent_pool.create_head_agent`.
+        idle_ttl (float): Seconds an idle session stays in memory.
+        max_age (float): Seconds a session stays in the store after its last turn.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore | None = None,
+        agent_factory: Callable[[], AssistantAgent] | None = None,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        max_age: float = SESSION_MAX_AGE,
+    ) -> None:
+        self._store = store
+        self._agent_factory = agent_factory
+        self._idle_ttl = idle_ttl
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._live: dict[str, ChatSession] = {}
+        self.loads = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @property
+    def store(self) -> SessionStore:
+        # Created on first use, so importing the module opens no database
+        with self._lock:
+            if self._store is None:
+                self._store = create_session_store()
+            return self._store
+
+    def _create_agent(self) -> AssistantAgent:
+        factory = self._agent_factory or agent_pool.create_head_agent
+        return factory()
+
+    async def create(self, lang: str) -> ChatSession:
+        """
+        Start a session.
+
+        Arguments:
+            lang (str): The language of the session's messages
+
+        Returns:
+            ChatSession: The new session, saved to the store
+        """
+        self.evict_idle()
+        await asyncio.to_thread(self.store.purge, self._max_age)
+
+        session = ChatSession(
+            session_id=uuid.uuid4().hex, lang=lang, head_agent=self._create_agent()
+        )
+        await self.save(session)
+        return session
+
+    async def get(self, session_id: str) -> ChatSession | None:
+        """
+        Get a session, loading it from the store if it is not in memory or outdated.
+
+        Arguments:
+            session_id (str): The id of the session
+
+        Returns:
+            ChatSession | None: The session, None if it is unknown or expired
+        """
+        self.evict_idle()
+        version = await asyncio.to_thread(self.store.version, session_id)
+        if version is None:
+            with self._lock:
+                self._live.pop(session_id, None)
+            return None
+
+        with self._lock:
+            session = self._live.get(session_id)
+        if session is not None and session.version == version:
+            session.last_used = time.monotonic()
+            return session
+
+        if (loaded := await asyncio.to_thread(self.store.load, session_id)) is None:
+            return None
+        version, saved = loaded
+        head_agent = await self._load_agent(saved)
+        session = ChatSession(
+            session_id=session_id,
+            lang=saved["lang"],
+            head_agent=head_agent,
+            state=saved["state"],
+            version=version,
+            saved_messages=len(await head_agent.model_context.get_messages()),
+        )
+        self.loads += 1
+        with self._lock:
+            self._live[session_id] = session
+        return session
+
+    async def _load_agent(self, saved: dict) -> AssistantAgent:
+        head_agent = self._create_agent()
+        await agent_pool.load_agents_state(head_agent, saved["agents"])
+        return head_agent
+
+    async def _rebase(self, session: ChatSession) -> None:
+        # Replay the messages of this turn onto the conversation saved by the
+        # other process. The client state of this turn is kept as is.
+        loaded = await asyncio.to_thread(self.store.load, session.session_id)
+        if loaded is None:
+            # Deleted meanwhile, saved again as a new session
+            session.version = 0
+            return
+        version, saved = loaded
+        messages = await session.head_agent.model_context.get_messages()
+        if len(messages) >= session.saved_messages:
+            head_agent = await self._load_agent(saved)
+            base = len(await head_agent.model_context.get_messages())
+            for message in messages[session.saved_messages :]:
+                await head_agent.model_context.add_message(message)
+            session.head_agent = head_agent
+            session.saved_messages = base
+        # Otherwise this turn reset the conversation, which is saved over the other one
+        session.version = version
+
+    async def save(self, session: ChatSession) -> None:
+        """
+        Save a session to the store, after a turn or a change of its state.
+
+        If another process saved the session since it was loaded, the
+        messages of this turn are replayed onto the saved conversation, and
+        the save is tried again.
+
+        Arguments:
+            session (ChatSession): The session
+
+        Raises:
+            SessionConflict: If the session kept changing over `SESSION_SAVE_ATTEMPTS` saves
+        """
+        for attempt in range(SESSION_SAVE_ATTEMPTS):
+            saved = {
+                "lang": session.lang,
+                "agents": await agent_pool.save_agents_state(session.head_agent),
+                "state": session.state,
+            }
+            try:
+                session.version = await asyncio.to_thread(
+                    self.store.save, session.session_id, saved, session.version
+                )
+                break
+            except SessionConflict:
+                if attempt == SESSION_SAVE_ATTEMPTS - 1:
+                    raise
+                await self._rebase(session)
+        session.saved_messages = len(
+            await session.head_agent.model_context.get_messages()
+        )
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._live[session.session_id] = session
+
+    async def delete(self, session_id: str) -> bool:
+        """
+        End a session.
+
+        Arguments:
+            session_id (str): The id of the session
+
+        Returns:
+            bool: Whether the session existed
+        """
+        with self._lock:
+            self._live.pop(session_id, None)
+        return await asyncio.to_thread(self.store.delete, session_id)
+
+    def evict_idle(self) -> int:
+        """
+        Drop the sessions idle for longer than `idle_ttl` from memory.
+
+        Returns:
+            int: The number of sessions dropped
+        """
+        cutoff = time.monotonic() - self._idle_ttl
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, session in self._live.items()
+                if session.last_used < cutoff and not session.lock.locked()
+            ]
+            for session_id in idle:
+                del self._live[session_id]
+        return len(idle)
+
+
+session_manager = SessionManager()
@@ -0,0 +1,93 @@
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Literal
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.teams import RoundRobinGroupChat
+
+
+@dataclass
+class TurnEvent:
+    """
+    Something that happened while the team answered, independent of how it is shown.
+
+    Parameters:
+        type (str): One of
+            "text": text to show the user, streamed or as a complete message,
+            "reply": the complete text message of an agent, after its text,
+            "tool_call": a tool was called,
+            "tool_result": a tool call finished,
+            "thinking": the head agent is writing an answer from tool results,
+            "done": the team has finished.
+        text (str): The text, or the result of a tool call.
+        name (str): The tool of tool events.
+        call_id (str): The call id of tool events, the tool name when the model gave none.
+        is_error (bool): Whether a tool call failed.
+        result (TaskResult | None): The result of the team, for "done".
+    """
+
+    type: Literal["text", "reply", "tool_call", "tool_result", "thinking", "done"]
+    text: str = ""
+    name: str = ""
+    call_id: str = ""
+    is_error: bool = False
+    result: TaskResult | None = None
+
+
+async def team_events(team: RoundRobinGroupChat, task: str) -> AsyncIterator[TurnEvent]:
+    """
+    Run the team on a task and describe what happens as it answers.
+
+    Arguments:
+        team (RoundRobinGroupChat): The team of a session
+        task (str): The user's prompt
+
+    Yields:
+        TurnEvent: The events of the turn, ending with "done"
+    """
+    streamed = ""
+    async for event in team.run_stream(task=task):
+        if isinstance(event, TaskResult):
+            print(event, end="\n\n")
+            yield TurnEvent("done", result=event)
+            return
+
+        if event.type != "ModelClientStreamingChunkEvent":
+            print(event, end="\n\n")
+
+        if event.source == "user":
+            continue
+
+        match event.type:
+            case "ModelClientStreamingChunkEvent":
+                streamed += event.content
+                yield TurnEvent("text", event.content)
+            case "TextMessage" | "ThoughtEvent":
+                # The complete message follows its streamed chunks, which
+                # have been shown already
+                if not streamed:
+                    yield TurnEvent("text", event.content)
+                if event.type == "TextMessage":
+                    yield TurnEvent("reply", event.content)
+                streamed = ""
+            case "ToolCallRequestEvent":
+                streamed = ""
+                for func_call in event.content:
+                    yield TurnEvent(
+                        "tool_call",
+                        name=func_call.name,
+                        call_id=func_call.id or func_call.name,
+                    )
+            case "ToolCallExecutionEvent":
+                for result in event.content:
+                    yield TurnEvent(
+                        "tool_result",
+                        result.content,
+                        name=result.name,
+                        call_id=result.call_id or result.name,
+                        is_error=bool(result.is_error),
+                    )
+            case "ToolCallSummaryMessage":
+                yield TurnEvent("thinking")
+            case _:
+                pass
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import weakref
+from collections.abc import Mapping
+from typing import Any
+
+from autogen_agentchat.tools import AgentTool
+from autogen_core import CancellationToken
+from autogen_core.tools import BaseTool, StaticWorkbench, TextResultContent, ToolResult
+
+from utils.tracing import tracer
+
+# Run the independent tool calls of one model response concurrently
+TOOL_PARALLEL = os.environ.get("TOOL_PARALLEL", "1").lower() not in ("0", "false", "no")
+TOOL_MAX_CONCURRENCY = int(os.environ.get("TOOL_MAX_CONCURRENCY", 4))
+TOOL_DEFAULT_TIMEOUT = float(os.environ.get("TOOL_DEFAULT_TIMEOUT", 180))
+
+# Per-tool timeouts in seconds, tools not listed use `TOOL_DEFAULT_TIMEOUT`
+TOOL_TIMEOUTS = {
+    "content_wordcloud": 120.0,
+    "query_top_k_match_contents": 60.0,
+    "get_article_contents": 30.0,
+}
+
+
+class ParallelWorkbench(StaticWorkbench):
+    """
+    A static workbench with a concurrency cap and per-tool timeouts.
+
+    The assistant agent runs every tool call of a model response at the same
+    time. This workbench caps how many of them run at once (1 runs them
+    serially) and turns a call that exceeds its timeout into an error result,
+    so one slow tool cannot hold up the whole turn.
+
+    Parameters:
+        tools (list[BaseTool]): The tools of the workbench.
+        parallel (bool): Whether to run tool calls concurrently. Defaults to `TOOL_PARALLEL`.
+        max_concurrency (int): Maximum concurrent calls per turn. Defaults to `TOOL_MAX_CONCURRENCY`.
+        timeouts (Mapping[str, float] | None): Timeout of each tool in seconds. Defaults to `TOOL_TIMEOUTS`.
+        default_timeout (float | None): Timeout of unlisted tools, None for no timeout.
+    """
+
+    def __init__(
+        self,
+        tools: list[BaseTool[Any, Any]],
+        parallel: bool = TOOL_PARALLEL,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        timeouts: Mapping[str, float] | None = None,
+        default_timeout: float | None = TOOL_DEFAULT_TIMEOUT,
+    ) -> None:
+        super().__init__(tools)
+        self._max_concurrency = max(1, max_concurrency) if parallel else 1
+        self._timeouts = TOOL_TIMEOUTS if timeouts is None else timeouts
+        self._default_timeout = default_timeout
+        # asyncio primitives belong to one event loop, and every turn runs on its own loop
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphores[loop]
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: Mapping[str, Any] | None = None,
+        cancellation_token: CancellationToken | None = None,
+    ) -> ToolResult:
+        timeout = self._timeouts.get(name, self._default_timeout)
+        tool = next((tool for tool in self._tools if tool.name == name), None)
+        kind = "agent" if isinstance(tool, AgentTool) else "tool"
+
+        with tracer.span(f"{kind}.{name}", kind=kind) as span:
+            async with self._semaphore():
+                span.mark("queued_s")
+                try:
+                    result = await asyncio.wait_for(
+                        super().call_tool(name, arguments, cancellation_token),
+                        timeout=timeout,
+                    )
+                except TimeoutError:
+                    span.set(timed_out=True)
+                    result = ToolResult(
+                        name=name,
+                        result=[
+                            TextResultContent(
+                                content=f"Tool {name} timed out after {timeout} seconds."
+                            )
+                        ],
+                        is_error=True,
+                    )
+            span.set(is_error=result.is_error)
+            return result
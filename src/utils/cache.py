@@ -0,0 +1,117 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Parameters:
+        maxsize (int): Maximum number of entries, the least recently used is evicted.
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get an entry if it exists and has not expired.
+
+        Arguments:
+            key (Hashable): The cache key
+            default (Any): Returned on a miss. Defaults to None.
+
+        Returns:
+            Any: The cached value or `default`
+        """
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store an entry, evicting the least recently used one if full.
+
+        Arguments:
+            key (Hashable): The cache key
+            value (Any): The value to cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical async calls into one in-flight call.
+
+    The first caller of a key runs the call, later callers of the same key wait
+    for its result instead of starting their own. Callers may run on different
+    threads and event loops, e.g. different Streamlit sessions.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, concurrent.futures.Future] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `func` unless a call with the same key is already in flight.
+
+        Arguments:
+            key (Hashable): Identifies identical calls
+            func (Callable[[], Awaitable[Any]]): Starts the call
+
+        Returns:
+            Any: The result of the in-flight call
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = concurrent.futures.Future()
+
+        if not leader:
+            # Shield the shared future, a cancelled follower must not cancel it
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
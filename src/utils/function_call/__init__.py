@@ -2,8 +2,13 @@ from .pets import (
     # cawling_dcard_urls,
     content_wordcloud,
     # crawling_dcard_article_content,
+    draw_content_wordcloud,
+    find_adoptable_pets,
+    get_article_contents,
     # get_awaiting_adoption_pet_info,
+    list_pet_attributes,
     # mock_crawling_dcard_article_content,
     # mock_crawling_dcard_urls,
     query_top_k_match_contents,
+    rank_pets_for_adopter,
 )
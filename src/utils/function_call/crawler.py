@@ -0,0 +1,560 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urljoin, urlsplit
+
+from utils.tracing import tracer
+
+# httpx is imported when a crawler is opened, not at page load
+if TYPE_CHECKING:
+    import httpx
+
+from .retrieval import import_pandas
+
+# Dcard URL for "送養" topic
+ADOPTION_TAG_URL = "https://www.dcard.tw/topics/%E9%80%81%E9%A4%8A"
+
+# Requests in flight at once, also the size of the connection pool
+CRAWLER_CONCURRENCY = int(os.environ.get("CRAWLER_CONCURRENCY", 4))
+# Seconds between the starts of two requests to the same host
+CRAWLER_HOST_INTERVAL = float(os.environ.get("CRAWLER_HOST_INTERVAL", 1.0))
+# Seconds a request may take
+CRAWLER_TIMEOUT = float(os.environ.get("CRAWLER_TIMEOUT", 20))
+# Times a request is retried after a network error, 429 or 5xx
+CRAWLER_MAX_RETRIES = int(os.environ.get("CRAWLER_MAX_RETRIES", 3))
+# SQLite file of the validators (ETag, Last-Modified) and parsed content of each page
+CRAWLER_CACHE_DB = os.environ.get("CRAWLER_CACHE_DB", "./.cache/crawler.db")
+CRAWLER_USER_AGENT = os.environ.get(
+    "CRAWLER_USER_AGENT", "Pet-Adoption-Matching-Agent/0.1 (adoption post indexer)"
+)
+
+# Longest wait asked by a Retry-After header that is honoured
+MAX_RETRY_AFTER = 120.0
+
+# Post pages, e.g. "/f/pet/p/258795431"
+_POST_PATH = re.compile(r"^/f/[^/]+/p/\d+$")
+# Schema.org types of a forum post
+_POST_TYPES = {"DiscussionForumPosting", "SocialMediaPosting", "BlogPosting", "Article"}
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+class _PageParser(HTMLParser):
+    """
+    Collects the structured parts of a page in one pass: JSON-LD scripts,
+    meta tags, the first heading, the first <time>, the text of <article>
+    and the links.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.json_ld: list[str] = []
+        self.meta: dict[str, str] = {}
+        self.heading = ""
+        self.time = ""
+        self.article: list[str] = []
+        self.links: list[tuple[str, str]] = []
+        self._script: list[str] | None = None
+        self._in_heading = False
+        self._article_depth = 0
+        self._link: tuple[str, list[str]] | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        attributes = {name: value or "" for name, value in attrs}
+        if tag == "script" and attributes.get("type") == "application/ld+json":
+            self._script = []
+        elif tag == "meta" and "content" in attributes:
+            key = attributes.get("property") or attributes.get("name")
+            if key:
+                self.meta.setdefault(key, attributes["content"])
+        elif tag == "h1" and not self.heading:
+            self._in_heading = True
+        elif tag == "time" and not self.time:
+            self.time = attributes.get("datetime", "")
+        elif tag == "article":
+            self._article_depth += 1
+        elif tag == "a" and "href" in attributes:
+            self._link = (attributes["href"], [])
+        if tag in ("p", "br", "div", "li") and self._article_depth:
+            self.article.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script" and self._script is not None:
+            self.json_ld.append("".join(self._script))
+            self._script = None
+        elif tag == "h1":
+            self._in_heading = False
+        elif tag == "article" and self._article_depth:
+            self._article_depth -= 1
+        elif tag == "a" and self._link is not None:
+            href, text = self._link
+            self.links.append((href, "".join(text).strip()))
+            self._link = None
+
+    def handle_data(self, data: str) -> None:
+        if self._script is not None:
+            self._script.append(data)
+            return
+        if self._in_heading:
+            self.heading += data
+        if self._article_depth:
+            self.article.append(data)
+        if self._link is not None:
+            self._link[1].append(data)
+
+
+def _parse_page(html: str) -> _PageParser:
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def _ld_objects(scripts: list[str]) -> list[dict]:
+    objects = []
+    for script in scripts:
+        try:
+            data = json.loads(script)
+        except json.JSONDecodeError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                objects += [item, *item.get("@graph", [])]
+    return [item for item in objects if isinstance(item, dict)]
+
+
+def _is_post(item: dict) -> bool:
+    types = item.get("@type")
+    return bool(set(types if isinstance(types, list) else [types]) & _POST_TYPES)
+
+
+def _author_name(author: Any) -> str:
+    if isinstance(author, list):
+        author = author[0] if author else ""
+    if isinstance(author, dict):
+        author = author.get("name", "")
+    return str(author or "").strip()
+
+
+def _clean(text: str) -> str:
+    lines = (line.strip() for line in text.replace("\r", "").split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def parse_article(html: str, url: str) -> dict | None:
+    """
+    Extract a post from its page.
+
+    The post's JSON-LD is read first. Pages without it fall back to their
+    Open Graph tags, first heading, first <time> and <article> text.
+
+    Args:
+        html (str): The page.
+        url (str): Its URL.
+
+    Returns:
+        dict | None: The url, title, author, createdAt and content of the post,
+                     None when the page has neither a title nor content.
+    """
+    page = _parse_page(html)
+    post = next((item for item in _ld_objects(page.json_ld) if _is_post(item)), {})
+    article = {
+        "url": url,
+        "title": str(post.get("headline") or post.get("name") or "").strip()
+        or page.heading.strip()
+        or page.meta.get("og:title", "").strip(),
+        "author": _author_name(post.get("author"))
+        or page.meta.get("author", "").strip(),
+        "createdAt": str(post.get("datePublished") or post.get("dateCreated") or "")
+        or page.time
+        or page.meta.get("article:published_time", ""),
+        "content": _clean(
+            str(post.get("articleBody") or post.get("text") or "")
+            or "".join(page.article)
+            or page.meta.get("og:description", "")
+            or page.meta.get("description", "")
+        ),
+    }
+    if not article["title"] and not article["content"]:
+        return None
+    return article
+
+
+def parse_post_links(html: str, base_url: str) -> list[tuple[str, str]]:
+    """
+    Find the posts linked from a topic or forum page.
+
+    Args:
+        html (str): The page.
+        base_url (str): Its URL, against which relative links are resolved.
+
+    Returns:
+        list[tuple[str, str]]: The title and URL of each post, in page order,
+                               like `dcard_article_urls.json`.
+    """
+    host = urlsplit(base_url).netloc
+    posts: dict[str, str] = {}
+    for href, text in _parse_page(html).links:
+        link = urlsplit(urljoin(base_url, href))
+        if link.netloc != host or not _POST_PATH.match(link.path):
+            continue
+        url = f"{link.scheme}://{link.netloc}{link.path}"
+        if not posts.get(url):
+            posts[url] = text
+    return [(title, url) for url, title in posts.items()]
+
+
+class HostRateLimiter:
+    """
+    Space the requests to each host, so no host sees a burst.
+
+    Parameters:
+        interval (float): Seconds between the starts of two requests to the same host.
+    """
+
+    def __init__(self, interval: float = CRAWLER_HOST_INTERVAL) -> None:
+        self.interval = interval
+        self._next: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str) -> None:
+        """
+        Wait for the turn of a request to a host.
+
+        Args:
+            host (str): The host, e.g. "www.dcard.tw".
+        """
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            if (delay := self._next.get(host, 0.0) - time.monotonic()) > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = time.monotonic() + self.interval
+
+    def defer(self, host: str, seconds: float) -> None:
+        """
+        Hold every request to a host back, e.g. after it answered 429.
+
+        Args:
+            host (str): The host.
+            seconds (float): Seconds from now before the next request.
+        """
+        self._next[host] = max(self._next.get(host, 0.0), time.monotonic() + seconds)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    """
+    What is kept of a page between crawls.
+
+    Parameters:
+        etag (str): Its ETag, sent back as If-None-Match.
+        last_modified (str): Its Last-Modified, sent back as If-Modified-Since.
+        data (Any): What was parsed from it, reused when it has not changed.
+    """
+
+    etag: str
+    last_modified: str
+    data: Any
+
+
+class CrawlCache:
+    """
+    The validators and parsed content of each crawled page, in a SQLite file.
+
+    Pages are requested conditionally, and a 304 Not Modified answer is
+    served from here without downloading or parsing the page again.
+
+    Parameters:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str = CRAWLER_CACHE_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT NOT NULL, "
+            "last_modified TEXT NOT NULL, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections may only be used by the thread that opened them
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+        return conn
+
+    def get(self, url: str) -> CachedPage | None:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT etag, last_modified, data FROM pages WHERE url = ?", (url,)
+            )
+            .fetchone()
+        )
+        return CachedPage(row[0], row[1], json.loads(row[2])) if row else None
+
+    def put(self, url: str, page: CachedPage) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (
+                url,
+                page.etag,
+                page.last_modified,
+                json.dumps(page.data, ensure_ascii=False),
+                time.time(),
+            ),
+        )
+
+
+def _retry_after(response: "httpx.Response", default: float) -> float:
+    value = response.headers.get("Retry-After", "").strip()
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+class DcardCrawler:
+    """
+    Crawls Dcard posts over one pooled async HTTP client.
+
+    At most `concurrency` requests are in flight, each host is paced by a
+    `HostRateLimiter`, and pages already crawled are requested with their
+    validators so unchanged ones cost a 304 and no parsing.
+
+    Use it as an async context manager, which closes the client it opened.
+
+    Parameters:
+        cache (CrawlCache | None): The validators of pages crawled before. Defaults to none.
+        concurrency (int): Requests in flight at once. Defaults to `CRAWLER_CONCURRENCY`.
+        host_interval (float): Seconds between requests to a host. Defaults to `CRAWLER_HOST_INTERVAL`.
+        max_retries (int): Retries of a failed request. Defaults to `CRAWLER_MAX_RETRIES`.
+        client (httpx.AsyncClient | None): The client to use, e.g. with a mock transport.
+            Defaults to a new pooled client.
+    """
+
+    def __init__(
+        self,
+        cache: CrawlCache | None = None,
+        concurrency: int = CRAWLER_CONCURRENCY,
+        host_interval: float = CRAWLER_HOST_INTERVAL,
+        max_retries: int = CRAWLER_MAX_RETRIES,
+        client: "httpx.AsyncClient | None" = None,
+    ) -> None:
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.hosts = HostRateLimiter(host_interval)
+        self.stats = {"fetched": 0, "not_modified": 0, "failed": 0}
+        self._client = client
+        self._owns_client = client is None
+        self._slots: asyncio.Semaphore | None = None
+
+    async def __aenter__(self) -> "DcardCrawler":
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "User-Agent": CRAWLER_USER_AGENT,
+                    "Accept-Language": "zh-TW,zh;q=0.9",
+                },
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+                timeout=CRAWLER_TIMEOUT,
+                follow_redirects=True,
+            )
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str, parse: Callable[[str, str], Any]) -> Any:
+        """
+        Get a page and parse it, or reuse the parse of an unchanged page.
+
+        Args:
+            url (str): The page.
+            parse (Callable[[str, str], Any]): Parses the page's text and URL into
+                JSON-serializable data.
+
+        Returns:
+            Any: What `parse` returned for the current version of the page.
+
+        Raises:
+            httpx.HTTPError: When the page cannot be fetched after the retries.
+        """
+        import httpx
+
+        if self._client is None or self._slots is None:
+            raise RuntimeError("Open the crawler with `async with` first")
+
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        host = urlsplit(url).netloc
+
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                backoff = self.hosts.interval * 2**attempt
+                await self.hosts.wait(host)
+                try:
+                    with tracer.span("crawler.fetch", kind="crawler", attempt=attempt):
+                        response = await self._client.get(url, headers=headers)
+                except httpx.TransportError:
+                    if attempt == self.max_retries:
+                        raise
+                    await asyncio.sleep(backoff)
+                    continue
+
+                if response.status_code == 304 and cached is not None:
+                    self.stats["not_modified"] += 1
+                    return cached.data
+                if (
+                    response.status_code == 429 or response.status_code >= 500
+                ) and attempt < self.max_retries:
+                    # Slow down every request to the host, not only this one
+                    self.hosts.defer(host, _retry_after(response, backoff))
+                    continue
+                response.raise_for_status()
+
+                data = parse(response.text, str(response.url))
+                self.stats["fetched"] += 1
+                if self.cache is not None and (
+                    response.headers.get("ETag")
+                    or response.headers.get("Last-Modified")
+                ):
+                    self.cache.put(
+                        url,
+                        CachedPage(
+                            response.headers.get("ETag", ""),
+                            response.headers.get("Last-Modified", ""),
+                            data,
+                        ),
+                    )
+                return data
+        # The last attempt returns or raises above
+        raise AssertionError("unreachable")
+
+    async def crawl_post_urls(
+        self, list_url: str = ADOPTION_TAG_URL, limit: int = 30
+    ) -> list[tuple[str, str]]:
+        """
+        List the posts of a topic or forum page.
+
+        Args:
+            list_url (str): The page. Defaults to the "送養" topic.
+            limit (int): The maximum number of posts. Defaults to 30.
+
+        Returns:
+            list[tuple[str, str]]: The title and URL of each post.
+        """
+        links = await self.fetch(list_url, parse_post_links)
+        return [tuple(link) for link in links][:limit]
+
+    async def crawl_articles(self, urls: list[str]) -> list[dict]:
+        """
+        Crawl posts concurrently.
+
+        A post that cannot be fetched or parsed is counted in `stats["failed"]`
+        and left out, so one bad page does not stop the crawl.
+
+        Args:
+            urls (list[str]): The post URLs.
+
+        Returns:
+            list[dict]: The url, title, author, createdAt and content of each post,
+                        in the order of `urls`.
+        """
+        with tracer.span("crawler.articles", kind="crawler", urls=len(urls)) as span:
+            results = await asyncio.gather(
+                *(self.fetch(url, parse_article) for url in dict.fromkeys(urls)),
+                return_exceptions=True,
+            )
+            articles = []
+            for url, result in zip(dict.fromkeys(urls), results, strict=True):
+                if isinstance(result, BaseException) or result is None:
+                    print(f"Crawling {url} failed: {result!r}")
+                    self.stats["failed"] += 1
+                elif isinstance(result, dict):
+                    articles.append(result)
+            span.set(**self.stats)
+            return articles
+
+
+ARTICLE_COLUMNS = ("url", "title", "author", "createdAt", "content")
+
+
+def merge_articles(articles: list[dict], csv_path: str) -> dict[str, int]:
+    """
+    Write crawled posts into the article CSV read by the retrieval index.
+
+    Posts already in the CSV with the same content keep their row and
+    embedding. Edited posts are updated and their embedding cleared, so the
+    vectorizer embeds them again. New posts are appended.
+
+    Args:
+        articles (list[dict]): Posts returned by `DcardCrawler.crawl_articles`.
+        csv_path (str): The article CSV, created when missing.
+
+    Returns:
+        dict[str, int]: The number of "added", "updated" and "unchanged" posts.
+    """
+    pd = import_pandas()
+
+    if os.path.exists(csv_path):
+        df = pd.read_csv(
+            csv_path, dtype=dict.fromkeys([*ARTICLE_COLUMNS, "vectorize"], str)
+        )
+    else:
+        df = pd.DataFrame(columns=[*ARTICLE_COLUMNS, "vectorize"])
+    for column in (*ARTICLE_COLUMNS, "vectorize"):
+        if column not in df.columns:
+            df[column] = ""
+
+    rows = {url: i for i, url in enumerate(df["url"].astype(str))}
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+    new_rows = []
+    for article in articles:
+        row = {column: article.get(column, "") for column in ARTICLE_COLUMNS}
+        if (i := rows.get(article["url"])) is None:
+            new_rows.append({**row, "vectorize": ""})
+            counts["added"] += 1
+        elif str(df.at[df.index[i], "content"]) != article["content"]:
+            for column, value in row.items():
+                df.at[df.index[i], column] = value
+            df.at[df.index[i], "vectorize"] = ""
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+
+    if new_rows:
+        df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    tmp_path = f"{csv_path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+    return counts
@@ -0,0 +1,56 @@
+import os
+from functools import cache
+from typing import TYPE_CHECKING
+
+from utils.bots.memory import estimate_tokens
+from utils.scheduler import gemini_scheduler
+from utils.tracing import tracer
+
+# The Gemini SDK is imported on the first embedding, not at page load
+if TYPE_CHECKING:
+    from google import genai
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+
+@cache
+def get_genai_client() -> "genai.Client":
+    """
+    Get the Gemini client shared by the whole process.
+
+    Returns:
+        genai.Client: The Gemini client
+    """
+    from google import genai
+
+    return genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+
+
+def embed_text(text: str, task_type: str = "RETRIEVAL_QUERY") -> list[float]:
+    """
+    Embed a text with the Gemini embedding model.
+
+    Args:
+        text (str): The text to embed.
+        task_type (str): The Gemini embedding task type. Default is "RETRIEVAL_QUERY".
+
+    Returns:
+        list[float]: The embedding vector.
+    """
+    from google.genai import types
+
+    with tracer.span(
+        "embedding", kind="embedding", task_type=task_type, chars=len(text)
+    ):
+        # The key's budget is shared with every session and the vectorizer
+        result = gemini_scheduler.run_sync(
+            "embedding",
+            estimate_tokens(text),
+            lambda: get_genai_client().models.embed_content(
+                model=EMBEDDING_MODEL,
+                contents=text,
+                config=types.EmbedContentConfig(task_type=task_type),
+            ),
+        )
+
+    return result.embeddings[0].values
@@ -0,0 +1,409 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from autogen_core.models import ChatCompletionClient, SystemMessage, UserMessage
+
+from utils.scheduler import Priority, request_priority
+from utils.tracing import tracer
+
+from .pet_records import EXTRACTED_PETS_PATH
+from .projection import extract_fields
+from .retrieval import import_pandas
+
+# SQLite file of the extraction of each article, by content hash
+EXTRACTION_CACHE_DB = os.environ.get("EXTRACTION_CACHE_DB", "./.cache/extraction.db")
+# Articles sent to the model in one request
+EXTRACTION_BATCH_SIZE = int(os.environ.get("EXTRACTION_BATCH_SIZE", 8))
+# Model requests in flight at once, the scheduler paces them further
+EXTRACTION_CONCURRENCY = int(os.environ.get("EXTRACTION_CONCURRENCY", 2))
+# Characters of an article sent to the model
+EXTRACTION_MAX_CHARS = int(os.environ.get("EXTRACTION_MAX_CHARS", 1500))
+
+# Bump when the rules or the prompt change, so articles are extracted again
+EXTRACTION_VERSION = "1"
+
+# Fields an extraction needs before it is trusted without the model
+REQUIRED_FIELDS = ("animal_type", "age", "location")
+
+ANIMAL_TYPES = {
+    "cat": "貓|喵",
+    "dog": "狗|犬|汪",
+    "rabbit": "兔",
+    "hamster": "倉鼠|鼠寶|黃金鼠|一線鼠",
+    "bird": "鸚鵡|鳥",
+}
+_ANIMAL_TYPES = {name: re.compile(pattern) for name, pattern in ANIMAL_TYPES.items()}
+SPECIES = (
+    "米克斯",
+    "三花",
+    "虎斑",
+    "橘貓",
+    "黑貓",
+    "白貓",
+    "賓士",
+    "玳瑁",
+    "美短",
+    "英短",
+    "布偶",
+    "暹羅",
+    "柴犬",
+    "黃金獵犬",
+    "拉布拉多",
+    "柯基",
+    "貴賓",
+    "博美",
+    "臘腸",
+    "哈士奇",
+    "米格魯",
+    "台灣犬",
+)
+CITIES = (
+    "台北|臺北|新北|桃園|台中|臺中|台南|臺南|高雄|基隆|新竹|苗栗|彰化|南投|雲林"
+    "|嘉義|屏東|宜蘭|花蓮|台東|臺東|澎湖|金門|連江|馬祖"
+)
+_LOCATION = re.compile(rf"(?:{CITIES})(?:市|縣)?(?:[\u4e00-\u9fff]{{1,3}}[區鄉鎮市])?")
+_AGE = re.compile(
+    r"(?:約|大約|大概)?\s*[\d一二三四五六七八九十兩半]+(?:\.\d+)?\s*"
+    r"(?:歲|個月|週|周)(?:大|左右)?"
+)
+_NAME = re.compile(r"(?:名字|名稱|叫做)\s*[:：]?\s*([\u4e00-\u9fffA-Za-z]{1,8})")
+TAGS = (
+    "親人",
+    "黏人",
+    "安靜",
+    "活潑",
+    "怕生",
+    "溫馴",
+    "溫和",
+    "膽小",
+    "貪玩",
+    "愛撒嬌",
+    "適合新手",
+)
+HEALTH = (
+    "已結紮",
+    "已絕育",
+    "已打疫苗",
+    "已施打疫苗",
+    "已驅蟲",
+    "已植晶片",
+    "已植入晶片",
+)
+_REQUIREMENT = re.compile(r"須|需|必須|希望|條件|不可|不能|限|同意|門窗|紗窗|簽")
+_SENTENCE = re.compile(r"[^。！？!?\n；;]+")
+MAX_REQUIREMENTS = 8
+
+EXTRACTION_PROMPT = """You extract adoptable pets from Taiwanese adoption posts.
+For each post, answer with one JSON object with these keys:
+"index" (the number of the post), "animal_type" ("cat", "dog", "rabbit", "hamster", "bird" or "other"),
+"animal_name", "animal_species", "age", "location" (the city and district in Traditional Chinese),
+"animal_characteristic_tags" (short personality words, e.g. "親人"),
+"adopt_requirements" (what the poster asks of adopters), "health_info".
+Use "" or [] for what the post does not say. Copy the wording of the post.
+Answer with a JSON array of the objects only."""
+
+
+def content_hash(title: str, content: str) -> str:
+    """
+    Identify an article by its text and the extraction version.
+
+    Arguments:
+        title (str): The title of the article
+        content (str): The text of the article
+
+    Returns:
+        str: A hex digest
+    """
+    payload = f"{EXTRACTION_VERSION}\n{title}\n{content}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def rule_extract(title: str, content: str) -> dict:
+    """
+    Extract a pet record from an adoption post with patterns and word lists.
+
+    Arguments:
+        title (str): The title of the post
+        content (str): The text of the post
+
+    Returns:
+        dict: The fields found, in the format of `animal_info.json`
+    """
+    text = f"{title}\n{content}"
+    fields = extract_fields(text)
+    record: dict = {}
+
+    counts = {
+        name: len(pattern.findall(text)) for name, pattern in _ANIMAL_TYPES.items()
+    }
+    if (animal_type := max(counts, key=counts.get)) and counts[animal_type]:
+        record["animal_type"] = animal_type
+    if match := _NAME.search(text):
+        record["animal_name"] = match.group(1)
+    if species := fields.get("species"):
+        record["animal_species"] = species
+    elif species := [name for name in SPECIES if name in text]:
+        record["animal_species"] = "、".join(species)
+    if age := fields.get("age"):
+        record["age"] = age
+    elif match := _AGE.search(text):
+        record["age"] = match.group(0).strip()
+    if location := fields.get("location"):
+        record["location"] = location
+    elif match := _LOCATION.search(text):
+        record["location"] = match.group(0)
+
+    if tags := [tag for tag in TAGS if tag in text]:
+        record["animal_characteristic_tags"] = tags
+    if health := [fact for fact in HEALTH if fact in text]:
+        record["health_info"] = health
+    requirements = [
+        sentence.strip()
+        for sentence in _SENTENCE.findall(content)
+        if _REQUIREMENT.search(sentence) and len(sentence.strip()) <= 60
+    ]
+    if requirements:
+        record["adopt_requirements"] = list(dict.fromkeys(requirements))[
+            :MAX_REQUIREMENTS
+        ]
+    return record
+
+
+def is_complete(record: dict) -> bool:
+    return all(record.get(field) for field in REQUIRED_FIELDS)
+
+
+def parse_model_records(text: str) -> dict[int, dict]:
+    """
+    Parse the model's answer to `EXTRACTION_PROMPT`.
+
+    Arguments:
+        text (str): The answer, possibly in a markdown code block
+
+    Returns:
+        dict[int, dict]: The record of each post index answered
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", text.strip()).strip()
+    records = json.loads(text)
+    if not isinstance(records, list):
+        raise ValueError("The extraction is not a JSON array")
+
+    keys = (
+        "animal_type",
+        "animal_name",
+        "animal_species",
+        "age",
+        "location",
+        "animal_characteristic_tags",
+        "adopt_requirements",
+        "health_info",
+    )
+    return {
+        int(record["index"]): {key: record[key] for key in keys if record.get(key)}
+        for record in records
+        if isinstance(record, dict) and "index" in record
+    }
+
+
+class ExtractionCache:
+    """
+    The extraction of each article, by content hash, in a SQLite file.
+
+    Articles are only extracted again when their text or `EXTRACTION_VERSION`
+    changes, so the pipeline can be rerun after every crawl.
+
+    Parameters:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_DB) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS extractions (hash TEXT PRIMARY KEY, "
+            "method TEXT NOT NULL, record TEXT NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections may only be used by the thread that opened them
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+        return conn
+
+    def get(self, key: str) -> tuple[str, dict] | None:
+        row = (
+            self._connect()
+            .execute("SELECT method, record FROM extractions WHERE hash = ?", (key,))
+            .fetchone()
+        )
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key: str, method: str, record: dict) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?)",
+            (key, method, json.dumps(record, ensure_ascii=False)),
+        )
+
+
+async def model_extract(
+    model_client: ChatCompletionClient, articles: list[dict]
+) -> dict[int, dict]:
+    """
+    Extract pet records from a batch of articles with one model request.
+
+    Arguments:
+        model_client (ChatCompletionClient): The model client
+        articles (list[dict]): The articles, with their title and content
+
+    Returns:
+        dict[int, dict]: The record of each article, by position in the batch
+    """
+    posts = "\n\n".join(
+        f"# Post {i}\n{article['title']}\n{article['content'][:EXTRACTION_MAX_CHARS]}"
+        for i, article in enumerate(articles)
+    )
+    with tracer.span("extraction.model", kind="extraction", articles=len(articles)):
+        # Shares the key's budget with the chat, which is served first
+        with request_priority(Priority.BATCH):
+            result = await model_client.create(
+                [
+                    SystemMessage(content=EXTRACTION_PROMPT),
+                    UserMessage(content=posts, source="user"),
+                ]
+            )
+    if not isinstance(result.content, str):
+        raise ValueError("The extraction is not text")
+    return parse_model_records(result.content)
+
+
+async def extract_pets(
+    articles: list[dict],
+    model_client: ChatCompletionClient | None,
+    cache: ExtractionCache,
+    batch_size: int = EXTRACTION_BATCH_SIZE,
+    concurrency: int = EXTRACTION_CONCURRENCY,
+) -> tuple[list[dict], dict[str, int]]:
+    """
+    Extract a pet record from every article.
+
+    Cached extractions are reused. The others are extracted with the rules
+    first, and only the articles the rules leave incomplete are sent to the
+    model, several per request. A record the model could not complete is
+    kept as the rules found it, and extracted again on the next run.
+
+    Arguments:
+        articles (list[dict]): The articles, with their url, title and content
+        model_client (ChatCompletionClient | None): The model client, None to use the rules only
+        cache (ExtractionCache): The extractions of earlier runs
+        batch_size (int): Articles per model request. Defaults to `EXTRACTION_BATCH_SIZE`.
+        concurrency (int): Model requests at once. Defaults to `EXTRACTION_CONCURRENCY`.
+
+    Returns:
+        tuple[list[dict], dict[str, int]]: The record of each article, in order, and
+            the number of records that were cached, found by the rules, by the
+            model, or left incomplete
+    """
+    records: list[dict] = [{} for _ in articles]
+    stats = {"cached": 0, "rules": 0, "model": 0, "incomplete": 0}
+    pending: list[int] = []
+
+    for i, article in enumerate(articles):
+        key = content_hash(article["title"], article["content"])
+        if (cached := cache.get(key)) is not None:
+            records[i] = cached[1]
+            stats["cached"] += 1
+            continue
+
+        records[i] = rule_extract(article["title"], article["content"])
+        if is_complete(records[i]):
+            cache.put(key, "rules", records[i])
+            stats["rules"] += 1
+        elif model_client is None:
+            # Not cached, so a run with the model completes it
+            stats["incomplete"] += 1
+        else:
+            pending.append(i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_batch(batch: list[int]) -> None:
+        async with semaphore:
+            try:
+                extracted = await model_extract(
+                    model_client, [articles[i] for i in batch]
+                )
+            except Exception as e:
+                print(f"Extraction of {len(batch)} articles failed: {e!r}")
+                extracted = {}
+
+        for position, i in enumerate(batch):
+            if position not in extracted:
+                stats["incomplete"] += 1
+                continue
+            # The rules copy the post's own wording, the model fills the gaps
+            records[i] = extracted[position] | records[i]
+            article = articles[i]
+            cache.put(
+                content_hash(article["title"], article["content"]), "model", records[i]
+            )
+            stats["model"] += 1
+
+    await asyncio.gather(
+        *(
+            run_batch(pending[start : start + batch_size])
+            for start in range(0, len(pending), batch_size)
+        )
+    )
+
+    for article, record in zip(articles, records, strict=True):
+        if url := article.get("url"):
+            record["url"] = url
+    return records, stats
+
+
+def read_articles(csv_path: str) -> list[dict]:
+    """
+    Read the crawled articles.
+
+    Arguments:
+        csv_path (str): The CSV of the articles, with url, title and content columns
+
+    Returns:
+        list[dict]: The url, title and content of each article with content
+    """
+    pd = import_pandas()
+
+    df = pd.read_csv(csv_path)
+    df = df[df["content"].notna() & (df["content"].astype(str).str.strip() != "")]
+    return [
+        {"url": str(row.url), "title": str(row.title), "content": str(row.content)}
+        for row in df[["url", "title", "content"]].itertuples(index=False)
+    ]
+
+
+def save_extracted_pets(records: list[dict], path: str = EXTRACTED_PETS_PATH) -> int:
+    """
+    Write the extracted pets for the pet store, leaving out articles without an animal.
+
+    Arguments:
+        records (list[dict]): Records returned by `extract_pets`
+        path (str): The JSON file. Defaults to `EXTRACTED_PETS_PATH`.
+
+    Returns:
+        int: The number of pets written
+    """
+    pets = [record for record in records if record.get("animal_type")]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pets, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(pets)
@@ -0,0 +1,246 @@
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Where the lexicon harvested from CKIP output is persisted between runs
+LEXICON_PATH = os.environ.get("CKIP_LEXICON_PATH", "./src/static/ckip_lexicon.json")
+# Seconds between two writes of a changed lexicon, it is also written at exit
+LEXICON_SAVE_INTERVAL = float(os.environ.get("CKIP_LEXICON_SAVE_INTERVAL", 60))
+
+# Tag returned for words that were never seen in CKIP output
+UNKNOWN_TAG = "X"
+
+# Longer CKIP tokens (URLs, long numbers) are kept but never matched, so the
+# segmentation DAG stays narrow
+MAX_WORD_LEN = 8
+
+
+class Lexicon:
+    """
+    A word/POS lexicon harvested from CKIP output, used for fast tokenization.
+
+    Segmentation builds a DAG of every lexicon word found in the text and picks
+    the most probable path with dynamic programming (unigram model), then tags
+    each word with its most frequent CKIP tag.
+
+    Parameters:
+        path (str | None): JSON file to load from and save to. Defaults to None.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._tag_counts: dict[str, Counter] = defaultdict(Counter)
+        self._freq: dict[str, int] = {}
+        self._best_tag: dict[str, str] = {}
+        self._prefixes: set[str] = set()
+        self._total = 0
+        self._max_word_len = 1
+        # Updates made, and how many of them are on disk
+        self._changes = 0
+        self._saved_changes = 0
+        self._last_save = time.monotonic()
+        self._save_lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._freq)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._freq
+
+    @property
+    def dirty(self) -> bool:
+        """
+        Whether the lexicon has updates not saved to its own path yet.
+        """
+        return self._changes != self._saved_changes
+
+    def update(self, tokens: list[str], tags: list[str]) -> None:
+        """
+        Accumulate the tokens and POS tags of one CKIP-processed sentence.
+
+        Arguments:
+            tokens (list[str]): Tokens produced by the CKIP word segmenter
+            tags (list[str]): POS tags produced by the CKIP POS tagger
+        """
+        with self._lock:
+            for token, tag in zip(tokens, tags, strict=False):
+                if token.strip():
+                    self._add(token, {tag: 1})
+            self._changes += 1
+
+    def _add(self, word: str, tag_counts: dict[str, int]) -> None:
+        """
+        Add tag counts of a word. The caller must hold the lock.
+        """
+        counts = self._tag_counts[word]
+        counts.update(tag_counts)
+        added = sum(tag_counts.values())
+        self._freq[word] = self._freq.get(word, 0) + added
+        self._best_tag[word] = counts.most_common(1)[0][0]
+        self._total += added
+        if len(word) <= MAX_WORD_LEN:
+            self._max_word_len = max(self._max_word_len, len(word))
+            self._prefixes.update(word[:end] for end in range(2, len(word) + 1))
+
+    def tag(self, word: str) -> str:
+        """
+        Return the most frequent CKIP tag of a word.
+
+        Arguments:
+            word (str): The word to tag
+
+        Returns:
+            str: The POS tag, or `UNKNOWN_TAG` for unseen words
+        """
+        return self._best_tag.get(word, UNKNOWN_TAG)
+
+    def segment(self, text: str) -> list[str]:
+        """
+        Segment text into the most probable sequence of lexicon words.
+
+        Arguments:
+            text (str): The text to segment, without whitespace
+
+        Returns:
+            list[str]: The segmented words
+        """
+        freq = self._freq
+        prefixes = self._prefixes
+        max_len = self._max_word_len
+        log_total = math.log(self._total or 1)
+        n = len(text)
+
+        # route[i] = (best log probability of text[i:], end of the first word)
+        route: list[tuple[float, int]] = [(0.0, 0)] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            # A single character is always a candidate, known or not
+            best = (math.log(freq.get(text[i], 1)) - log_total + route[i + 1][0], i + 1)
+            for j in range(i + 2, min(n, i + max_len) + 1):
+                fragment = text[i:j]
+                if fragment not in prefixes:
+                    break
+                if (count := freq.get(fragment)) is not None:
+                    score = math.log(count) - log_total + route[j][0]
+                    if score > best[0]:
+                        best = (score, j)
+            route[i] = best
+
+        words = []
+        i = 0
+        while i < n:
+            j = route[i][1]
+            words.append(text[i:j])
+            i = j
+        return words
+
+    def tokenize(self, texts: list[str]) -> tuple[list[list[str]], list[list[str]]]:
+        """
+        Segment and tag sentences, mirroring the output shape of CKIP.
+
+        Arguments:
+            texts (list[str]): Sentences to process
+
+        Returns:
+            tuple[list[list[str]], list[list[str]]]: Tokens and POS tags per sentence
+        """
+        tokens = [self.segment(text) for text in texts]
+        tags = [[self.tag(word) for word in sent] for sent in tokens]
+        return tokens, tags
+
+    def load(self, path: str) -> None:
+        """
+        Load word/tag counts from a JSON file written by `save`.
+
+        Arguments:
+            path (str): The JSON file to load
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        with self._lock:
+            for word, tag_counts in data.items():
+                self._add(word, tag_counts)
+
+    def save(self, path: str | None = None) -> None:
+        """
+        Persist the word/tag counts as JSON.
+
+        Arguments:
+            path (str | None): The file to write. Defaults to the lexicon's own path.
+        """
+        path = path or self._path
+        if path is None:
+            raise ValueError("No path given to save the lexicon to")
+
+        # One writer at a time, each through its own temporary file, so a
+        # concurrent save never publishes a half-written file
+        with self._save_lock:
+            with self._lock:
+                data = {word: dict(counts) for word, counts in self._tag_counts.items()}
+                changes = self._changes
+
+            with tempfile.NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=os.path.dirname(os.path.abspath(path)),
+                prefix=f"{os.path.basename(path)}.",
+                suffix=".tmp",
+                delete=False,
+            ) as f:
+                tmp_path = f.name
+                try:
+                    json.dump(data, f, ensure_ascii=False)
+                except BaseException:
+                    f.close()
+                    os.unlink(tmp_path)
+                    raise
+            try:
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+            if path == self._path:
+                self._saved_changes = changes
+                self._last_save = time.monotonic()
+
+    def save_if_due(self, interval: float = LEXICON_SAVE_INTERVAL) -> bool:
+        """
+        Save the lexicon to its own path if it changed and was not saved recently.
+
+        Arguments:
+            interval (float): Seconds since the last save before saving again.
+                Defaults to `LEXICON_SAVE_INTERVAL`.
+
+        Returns:
+            bool: Whether it was saved
+        """
+        if (
+            self._path is None
+            or not self.dirty
+            or time.monotonic() - self._last_save < interval
+        ):
+            return False
+        self.save()
+        return True
+
+
+lexicon = Lexicon(LEXICON_PATH)
+
+
+@atexit.register
+def _save_at_exit() -> None:
+    if lexicon.dirty:
+        try:
+            lexicon.save()
+        except OSError as e:
+            print(f"Failed to save lexicon: {e}")
@@ -0,0 +1,313 @@
+import math
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Default distance of searches near a place
+NEARBY_RADIUS_KM = float(os.environ.get("NEARBY_RADIUS_KM", 40))
+# Farthest a search near a place reaches, Taiwan is under 400 km long
+MAX_NEARBY_RADIUS_KM = 400.0
+# Side of the cells of `GridIndex`, 0.2° is about 20 km in Taiwan
+GRID_CELL_DEG = 0.2
+
+EARTH_RADIUS_KM = 6371.0
+
+# Counties and cities: name, other spellings, latitude and longitude of the seat
+COUNTIES = (
+    ("台北市", ("臺北市", "台北", "臺北", "北市"), 25.0375, 121.5637),
+    ("新北市", ("新北",), 25.0120, 121.4650),
+    ("基隆市", ("基隆",), 25.1276, 121.7392),
+    ("桃園市", ("桃園",), 24.9936, 121.3010),
+    ("新竹縣", (), 24.8387, 121.0177),
+    ("新竹市", ("新竹",), 24.8138, 120.9675),
+    ("苗栗縣", ("苗栗",), 24.5602, 120.8214),
+    ("台中市", ("臺中市", "台中", "臺中", "中市"), 24.1477, 120.6736),
+    ("彰化縣", ("彰化",), 24.0518, 120.5161),
+    ("南投縣", ("南投",), 23.9157, 120.6863),
+    ("雲林縣", ("雲林",), 23.7092, 120.5435),
+    ("嘉義縣", (), 23.4593, 120.3326),
+    ("嘉義市", ("嘉義",), 23.4801, 120.4491),
+    ("台南市", ("臺南市", "台南", "臺南", "南市"), 22.9999, 120.2270),
+    ("高雄市", ("高雄",), 22.6273, 120.3014),
+    ("屏東縣", ("屏東",), 22.6690, 120.4862),
+    ("宜蘭縣", ("宜蘭",), 24.7021, 121.7378),
+    ("花蓮縣", ("花蓮",), 23.9872, 121.6016),
+    ("台東縣", ("臺東縣", "台東", "臺東"), 22.7583, 121.1444),
+    ("澎湖縣", ("澎湖",), 23.5711, 119.5793),
+    ("金門縣", ("金門",), 24.4322, 118.3171),
+    ("連江縣", ("連江", "馬祖"), 26.1605, 119.9517),
+)
+
+# Spellings that are also parts of common words, e.g. "湖北市場", and only
+# recognised in short location fields
+ABBREVIATIONS = frozenset({"北市", "中市", "南市"})
+
+# Districts and townships often named without their county: name, county,
+# latitude and longitude of the district office. Names shared by several
+# counties (e.g. 東區, 中山區) are left out.
+DISTRICTS = (
+    ("大安區", "台北市", 25.0264, 121.5435),
+    ("信義區", "台北市", 25.0330, 121.5654),
+    ("松山區", "台北市", 25.0500, 121.5770),
+    ("內湖區", "台北市", 25.0690, 121.5880),
+    ("士林區", "台北市", 25.0930, 121.5250),
+    ("北投區", "台北市", 25.1320, 121.5010),
+    ("文山區", "台北市", 24.9890, 121.5700),
+    ("萬華區", "台北市", 25.0350, 121.4990),
+    ("南港區", "台北市", 25.0550, 121.6070),
+    ("板橋區", "新北市", 25.0143, 121.4672),
+    ("三重區", "新北市", 25.0614, 121.4880),
+    ("中和區", "新北市", 24.9994, 121.4990),
+    ("永和區", "新北市", 25.0076, 121.5138),
+    ("新莊區", "新北市", 25.0359, 121.4500),
+    ("土城區", "新北市", 24.9723, 121.4437),
+    ("泰山區", "新北市", 25.0589, 121.4308),
+    ("林口區", "新北市", 25.0776, 121.3917),
+    ("汐止區", "新北市", 25.0630, 121.6410),
+    ("淡水區", "新北市", 25.1696, 121.4410),
+    ("樹林區", "新北市", 24.9907, 121.4200),
+    ("蘆洲區", "新北市", 25.0849, 121.4735),
+    ("新店區", "新北市", 24.9676, 121.5420),
+    ("三峽區", "新北市", 24.9340, 121.3690),
+    ("鶯歌區", "新北市", 24.9550, 121.3547),
+    ("中壢區", "桃園市", 24.9653, 121.2246),
+    ("龜山區", "桃園市", 25.0290, 121.3580),
+    ("平鎮區", "桃園市", 24.9460, 121.2180),
+    ("八德區", "桃園市", 24.9280, 121.2840),
+    ("楊梅區", "桃園市", 24.9080, 121.1450),
+    ("蘆竹區", "桃園市", 25.0450, 121.2920),
+    ("龍潭區", "桃園市", 24.8640, 121.2160),
+    ("竹北市", "新竹縣", 24.8387, 121.0177),
+    ("竹東鎮", "新竹縣", 24.7360, 121.0920),
+    ("頭份市", "苗栗縣", 24.6880, 120.9030),
+    ("北屯區", "台中市", 24.1820, 120.6860),
+    ("西屯區", "台中市", 24.1810, 120.6160),
+    ("南屯區", "台中市", 24.1380, 120.6430),
+    ("豐原區", "台中市", 24.2520, 120.7220),
+    ("大里區", "台中市", 24.0990, 120.6780),
+    ("太平區", "台中市", 24.1270, 120.7180),
+    ("沙鹿區", "台中市", 24.2330, 120.5660),
+    ("霧峰區", "台中市", 24.0620, 120.7000),
+    ("員林市", "彰化縣", 23.9590, 120.5740),
+    ("鹿港鎮", "彰化縣", 24.0570, 120.4330),
+    ("南投市", "南投縣", 23.9157, 120.6863),
+    ("草屯鎮", "南投縣", 23.9740, 120.6800),
+    ("埔里鎮", "南投縣", 23.9650, 120.9670),
+    ("斗六市", "雲林縣", 23.7092, 120.5435),
+    ("永康區", "台南市", 23.0260, 120.2570),
+    ("安平區", "台南市", 22.9990, 120.1660),
+    ("新營區", "台南市", 23.3100, 120.3170),
+    ("歸仁區", "台南市", 22.9670, 120.2930),
+    ("仁德區", "台南市", 22.9720, 120.2520),
+    ("鳳山區", "高雄市", 22.6270, 120.3570),
+    ("左營區", "高雄市", 22.6900, 120.2950),
+    ("三民區", "高雄市", 22.6500, 120.3200),
+    ("前鎮區", "高雄市", 22.5950, 120.3170),
+    ("苓雅區", "高雄市", 22.6220, 120.3120),
+    ("鼓山區", "高雄市", 22.6460, 120.2740),
+    ("楠梓區", "高雄市", 22.7270, 120.3260),
+    ("岡山區", "高雄市", 22.7970, 120.2960),
+    ("小港區", "高雄市", 22.5650, 120.3540),
+    ("屏東市", "屏東縣", 22.6690, 120.4862),
+    ("潮州鎮", "屏東縣", 22.5500, 120.5420),
+    ("宜蘭市", "宜蘭縣", 24.7570, 121.7530),
+    ("羅東鎮", "宜蘭縣", 24.6770, 121.7670),
+    ("花蓮市", "花蓮縣", 23.9872, 121.6016),
+    ("吉安鄉", "花蓮縣", 23.9720, 121.5680),
+    ("台東市", "台東縣", 22.7583, 121.1444),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Region:
+    """
+    A Taiwanese administrative region.
+
+    Parameters:
+        name (str): The full name, e.g. "新北市泰山區" or "台中市".
+        county (str): The county or city it belongs to.
+        district (str): The district or township, empty for a whole county.
+        lat (float): Latitude of its seat.
+        lon (float): Longitude of its seat.
+    """
+
+    name: str
+    county: str
+    district: str
+    lat: float
+    lon: float
+
+
+def _build_names(free_text: bool = False) -> dict[str, Region]:
+    names: dict[str, Region] = {}
+    spellings: dict[str, tuple[str, ...]] = {}
+    for county, aliases, lat, lon in COUNTIES:
+        region = Region(county, county, "", lat, lon)
+        spellings[county] = (county, *aliases)
+        for name in spellings[county]:
+            if not (free_text and name in ABBREVIATIONS):
+                names[name] = region
+    for district, county, lat, lon in DISTRICTS:
+        region = Region(
+            # "南投市" is both the district and its usual name
+            district if district.startswith(county[:2]) else county + district,
+            county,
+            district,
+            lat,
+            lon,
+        )
+        # Districts are usually written without their suffix, e.g. "新北三重".
+        # Many such names are common words (中和, 信義, 太平), so in free text
+        # they are only recognised right after their county.
+        if free_text:
+            names.setdefault(district, region)
+            for name in spellings[county]:
+                names.setdefault(name + district[:-1], region)
+        else:
+            for name in (district, district[:-1]):
+                names.setdefault(name, region)
+    return names
+
+
+def _compile(names: dict[str, Region]) -> re.Pattern:
+    return re.compile("|".join(sorted(map(re.escape, names), key=len, reverse=True)))
+
+
+# Every spelling of every region
+REGION_NAMES = _build_names()
+_REGION_PATTERN = _compile(REGION_NAMES)
+# The spellings safe to look for in longer texts such as articles
+TEXT_REGION_NAMES = _build_names(free_text=True)
+_TEXT_REGION_PATTERN = _compile(TEXT_REGION_NAMES)
+
+
+@lru_cache(maxsize=1024)
+def normalize_location(text: str, free_text: bool = False) -> Region | None:
+    """
+    Map a place to the administrative region it names.
+
+    The first place named wins ("南投市靠台中" is 南投市). A county is narrowed
+    down to one of its districts named anywhere in the text ("新北泰山" is
+    新北市泰山區).
+
+    Arguments:
+        text (str): E.g. "新北泰山，靠近桃園龜山.林口"
+        free_text (bool): Whether the text is prose rather than a location field.
+            Only unambiguous spellings are recognised then, e.g. "中和" alone
+            is not a place but "新北中和" and "中和區" are. Defaults to False.
+
+    Returns:
+        Region | None: The region, None when the text names no known place
+    """
+    names, pattern = (
+        (TEXT_REGION_NAMES, _TEXT_REGION_PATTERN)
+        if free_text
+        else (REGION_NAMES, _REGION_PATTERN)
+    )
+    matches = [names[m.group(0)] for m in pattern.finditer(text)]
+    if not matches:
+        return None
+
+    first = matches[0]
+    if not first.district:
+        for region in matches[1:]:
+            if region.county == first.county and region.district:
+                return region
+    return first
+
+
+def clamp_radius(max_km: float) -> float:
+    """
+    Bound a search radius given by the model to `MAX_NEARBY_RADIUS_KM`.
+
+    Returns:
+        float: The radius in kilometres, from 0 to `MAX_NEARBY_RADIUS_KM`
+    """
+    if not max_km >= 0:
+        return 0.0
+    return min(max_km, MAX_NEARBY_RADIUS_KM)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two points.
+
+    Returns:
+        float: The distance in kilometres
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Points bucketed into a latitude/longitude grid, for radius queries.
+
+    A query only measures the points of the cells overlapping the circle,
+    instead of every point.
+
+    Parameters:
+        cell_deg (float): Side of a cell in degrees. Defaults to `GRID_CELL_DEG`.
+    """
+
+    def __init__(self, cell_deg: float = GRID_CELL_DEG) -> None:
+        self._cell_deg = cell_deg
+        self._cells: dict[tuple[int, int], list[tuple[int, float, float]]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self._cell_deg), math.floor(lon / self._cell_deg)
+
+    def add(self, item_id: int, lat: float, lon: float) -> None:
+        self._cells.setdefault(self._cell(lat, lon), []).append((item_id, lat, lon))
+        self._size += 1
+
+    def within(
+        self, lat: float, lon: float, radius_km: float
+    ) -> list[tuple[int, float]]:
+        """
+        Find the points within a distance of a place.
+
+        Arguments:
+            lat (float): Latitude of the place
+            lon (float): Longitude of the place
+            radius_km (float): The distance in kilometres
+
+        Returns:
+            list[tuple[int, float]]: The id and distance of each point, nearest first
+        """
+        # One degree of latitude is about 111 km, of longitude less away from the equator
+        dlat = radius_km / 111.0
+        dlon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+
+        # A circle spanning more cells than are filled is answered by
+        # measuring every point, the cells it covers are mostly empty
+        spanned = (2 * dlat / self._cell_deg + 2) * (2 * dlon / self._cell_deg + 2)
+        if spanned > len(self._cells):
+            cells = list(self._cells.values())
+        else:
+            (lat0, lon0), (lat1, lon1) = (
+                self._cell(lat - dlat, lon - dlon),
+                self._cell(lat + dlat, lon + dlon),
+            )
+            cells = [
+                self._cells.get((i, j), ())
+                for i in range(lat0, lat1 + 1)
+                for j in range(lon0, lon1 + 1)
+            ]
+
+        found = []
+        for cell in cells:
+            for item_id, item_lat, item_lon in cell:
+                km = distance_km(lat, lon, item_lat, item_lon)
+                if km <= radius_km:
+                    found.append((item_id, km))
+        return sorted(found, key=lambda item: (item[1], item[0]))
@@ -0,0 +1,322 @@
+import re
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from .locations import NEARBY_RADIUS_KM
+from .pet_records import PetRecord, PetStore, load_pet_store
+
+# Traits of a pet found in its record, with the words that reveal them
+PET_FEATURES = {
+    "needs_experience": r"有.{0,4}經驗|經驗者|不適合新手",
+    "needs_bottle_feeding": r"奶貓|餵奶|週大|周大",
+    "single_pet_home": r"單貓|單一寵物|不親貓|討厭其他|跟其他.{0,4}不合|會咬",
+    "clingy": r"黏人|撒嬌|跟屁|陪伴|活潑|貪玩",
+    "shy": r"怕生|膽小|害怕|需要.{0,4}時間",
+    "friendly": r"親人|溫和|溫馴|可以抱|讓摸",
+    "night_noise": r"晚上會叫|半夜|夜叫",
+    "window_screens": r"門窗|紗窗|防護",
+    "stable_income": r"工作穩定|經濟穩定|穩定收入",
+    "neutered": r"已結紮|已絕育",
+}
+_PET_PATTERNS = {name: re.compile(pattern) for name, pattern in PET_FEATURES.items()}
+
+# Facts about the adopter, each true (1) or not stated (0)
+ADOPTER_FEATURES = (
+    "apartment",
+    "house",
+    "lives_alone",
+    "home_all_day",
+    "away_often",
+    "first_time",
+    "experienced",
+    "has_other_pets",
+    "stable_income",
+)
+
+# How much each adopter fact weighs each pet trait, positive for a good fit
+COMPATIBILITY = {
+    ("first_time", "needs_experience"): -2.0,
+    ("experienced", "needs_experience"): 1.0,
+    ("first_time", "needs_bottle_feeding"): -2.0,
+    ("away_often", "needs_bottle_feeding"): -3.0,
+    ("home_all_day", "needs_bottle_feeding"): 1.0,
+    ("has_other_pets", "single_pet_home"): -3.0,
+    ("away_often", "clingy"): -1.0,
+    ("home_all_day", "clingy"): 1.0,
+    ("lives_alone", "shy"): 0.5,
+    ("first_time", "shy"): -0.5,
+    ("first_time", "friendly"): 1.0,
+    ("lives_alone", "friendly"): 0.5,
+    ("apartment", "night_noise"): -1.0,
+    ("apartment", "window_screens"): -0.5,
+    ("house", "window_screens"): 0.5,
+    ("stable_income", "stable_income"): 1.0,
+    ("first_time", "neutered"): 0.5,
+}
+# Weight of each characteristic tag the adopter asked for
+PREFERRED_TAG_WEIGHT = 1.5
+# Weight of a pet at the adopter's place, falling to 0 at the edge of the search radius
+NEARBY_WEIGHT = 1.0
+
+
+def _compatibility_matrix() -> np.ndarray:
+    matrix = np.zeros((len(ADOPTER_FEATURES), len(PET_FEATURES)), dtype=np.float32)
+    pet_features = list(PET_FEATURES)
+    for (adopter, pet), weight in COMPATIBILITY.items():
+        matrix[ADOPTER_FEATURES.index(adopter), pet_features.index(pet)] = weight
+    return matrix
+
+
+COMPATIBILITY_MATRIX = _compatibility_matrix()
+
+
+@dataclass(frozen=True)
+class AdopterProfile:
+    """
+    What we know about an adopter. None means the adopter did not say.
+
+    Parameters:
+        housing (str): "apartment" or "house", "" when unknown.
+        lives_alone (bool | None): Whether the adopter lives alone.
+        home_all_day (bool | None): Whether someone is home most of the day.
+        has_experience (bool | None): Whether the adopter has kept pets before.
+        has_other_pets (bool | None): Whether there are pets at home already.
+        stable_income (bool | None): Whether the adopter has a stable job or income.
+        preferred_tags (tuple[str, ...]): Characteristic tags the adopter wishes for.
+    """
+
+    housing: str = ""
+    lives_alone: bool | None = None
+    home_all_day: bool | None = None
+    has_experience: bool | None = None
+    has_other_pets: bool | None = None
+    stable_income: bool | None = None
+    preferred_tags: tuple[str, ...] = ()
+
+    def to_vector(self) -> np.ndarray:
+        """
+        Encode the profile over `ADOPTER_FEATURES`.
+
+        Returns:
+            np.ndarray: 1 for each fact that holds, 0 otherwise
+        """
+        facts = {
+            "apartment": self.housing == "apartment",
+            "house": self.housing == "house",
+            "lives_alone": self.lives_alone is True,
+            "home_all_day": self.home_all_day is True,
+            "away_often": self.home_all_day is False,
+            "first_time": self.has_experience is False,
+            "experienced": self.has_experience is True,
+            "has_other_pets": self.has_other_pets is True,
+            "stable_income": self.stable_income is True,
+        }
+        return np.array([facts[name] for name in ADOPTER_FEATURES], dtype=np.float32)
+
+
+def pet_feature_vector(record: PetRecord, tags: list[str]) -> np.ndarray:
+    """
+    Encode the traits of a pet over `PET_FEATURES`.
+
+    Arguments:
+        record (PetRecord): The pet
+        tags (list[str]): Its characteristic tags as words
+
+    Returns:
+        np.ndarray: 1 for each trait its record mentions, 0 otherwise
+    """
+    text = "\n".join(
+        [
+            *record.requirements,
+            *record.characteristics,
+            *record.health_info,
+            *tags,
+            record.age,
+            record.note,
+        ]
+    )
+    return np.array(
+        [bool(pattern.search(text)) for pattern in _PET_PATTERNS.values()],
+        dtype=np.float32,
+    )
+
+
+class CompatibilityEngine:
+    """
+    Scores every pet of a store against an adopter in one matrix pass.
+
+    Each pet is a row of trait bits and a row of tag bits. An adopter's facts
+    become one weight per trait through `COMPATIBILITY_MATRIX`, so a pet's
+    score is the sum of its traits' weights plus its wished-for tags, and
+    every term of the sum explains part of the ranking.
+
+    Parameters:
+        store (PetStore): The pets to score.
+    """
+
+    def __init__(self, store: PetStore) -> None:
+        self.store = store
+        self.features = np.zeros((len(store), len(PET_FEATURES)), dtype=np.float32)
+        for record in store.records:
+            self.features[record.pet_id] = pet_feature_vector(
+                record, [store.tags.word(tag_id) for tag_id in record.tags]
+            )
+        self.tags = np.zeros((len(store), len(store.tags)), dtype=np.float32)
+        for record in store.records:
+            self.tags[record.pet_id, list(record.tags)] = 1.0
+        self.types = np.array([record.animal_type for record in store.records])
+
+    def proximity(self, near: str, max_km: float = NEARBY_RADIUS_KM) -> np.ndarray:
+        """
+        Weigh every pet by its distance from a place.
+
+        Arguments:
+            near (str): The place, e.g. "板橋". An unknown place is matched as
+                        text contained in the pet's location.
+            max_km (float): The search radius in kilometres. Defaults to `NEARBY_RADIUS_KM`.
+
+        Returns:
+            np.ndarray: `NEARBY_WEIGHT` at the place down to 0 at `max_km`,
+                        NaN for pets farther away or of unknown location
+        """
+        weights = np.full(len(self.store), np.nan, dtype=np.float32)
+        if (nearby := self.store.nearby(near, max_km)) is None:
+            near = near.strip()
+            for record in self.store.records:
+                if near in record.location:
+                    weights[record.pet_id] = 0.0
+        elif nearby:
+            ids = np.fromiter(nearby, dtype=int, count=len(nearby))
+            km = np.fromiter(nearby.values(), dtype=np.float32, count=len(nearby))
+            weights[ids] = NEARBY_WEIGHT * (1 - km / max_km) if max_km > 0 else 0.0
+        return weights
+
+    def score(
+        self,
+        profile: AdopterProfile,
+        animal_type: str = "",
+        location: str = "",
+        near: str = "",
+        max_km: float = NEARBY_RADIUS_KM,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score every pet for an adopter.
+
+        Arguments:
+            profile (AdopterProfile): The adopter
+            animal_type (str): Only score pets of this type. Defaults to every type.
+            location (str): Only score pets whose location contains it. Defaults to anywhere.
+            near (str): Only score pets within `max_km` of this place, nearer ones
+                        higher. Defaults to anywhere.
+            max_km (float): The search radius in kilometres. Defaults to `NEARBY_RADIUS_KM`.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: The score of each pet,
+                NaN for pets left out, the contribution of each trait to it,
+                and the contribution of each tag
+        """
+        proximity = self.proximity(near, max_km) if near.strip() else None
+        return self._score(profile, animal_type, location, proximity)
+
+    def _score(
+        self,
+        profile: AdopterProfile,
+        animal_type: str,
+        location: str,
+        proximity: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        trait_weights = profile.to_vector() @ COMPATIBILITY_MATRIX
+        tag_weights = np.zeros(len(self.store.tags), dtype=np.float32)
+        for tag in profile.preferred_tags:
+            if (tag_id := self.store.tags.get(tag.strip())) is not None:
+                tag_weights[tag_id] = PREFERRED_TAG_WEIGHT
+
+        trait_contributions = self.features * trait_weights
+        tag_contributions = self.tags * tag_weights
+        scores = trait_contributions.sum(axis=1) + tag_contributions.sum(axis=1)
+        if animal_type := animal_type.strip().lower():
+            scores = np.where(self.types == animal_type, scores, np.nan)
+        if location := location.strip():
+            nearby = np.array([location in r.location for r in self.store.records])
+            scores = np.where(nearby, scores, np.nan)
+        if proximity is not None:
+            # NaN proximities leave the pet out
+            scores = scores + proximity
+
+        return scores, trait_contributions, tag_contributions
+
+    def rank(
+        self,
+        profile: AdopterProfile,
+        animal_type: str = "",
+        location: str = "",
+        k: int = 5,
+        near: str = "",
+        max_km: float = NEARBY_RADIUS_KM,
+    ) -> list[dict]:
+        """
+        Rank the pets for an adopter, best fit first.
+
+        Arguments:
+            profile (AdopterProfile): The adopter
+            animal_type (str): Only rank pets of this type. Defaults to every type.
+            location (str): Only rank pets whose location contains it. Defaults to anywhere.
+            k (int): The number of pets to return. Defaults to 5.
+            near (str): Only rank pets within `max_km` of this place, nearer ones
+                        higher. Defaults to anywhere.
+            max_km (float): The search radius in kilometres. Defaults to `NEARBY_RADIUS_KM`.
+
+        Returns:
+            list[dict]: The id, score and reasons of each pet, the reasons being
+                        the traits, tags and nearness that raised or lowered its score
+        """
+        proximity = self.proximity(near, max_km) if near.strip() else None
+        scores, traits, tags = self._score(profile, animal_type, location, proximity)
+        # Stable, so pets of equal score keep their order in the store
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+        ranked = []
+        trait_names = list(PET_FEATURES)
+        for pet_id in order[:k]:
+            if np.isnan(scores[pet_id]):
+                break
+            reasons = {
+                trait_names[i]: float(traits[pet_id, i])
+                for i in np.flatnonzero(traits[pet_id])
+            } | {
+                f"tag:{self.store.tags.word(i)}": float(tags[pet_id, i])
+                for i in np.flatnonzero(tags[pet_id])
+            }
+            if proximity is not None and proximity[pet_id]:
+                reasons["nearby"] = round(float(proximity[pet_id]), 2)
+            ranked.append(
+                {
+                    "id": int(pet_id),
+                    "score": round(float(scores[pet_id]), 2),
+                    "reasons": dict(
+                        sorted(reasons.items(), key=lambda item: -abs(item[1]))
+                    ),
+                }
+            )
+        return ranked
+
+
+_engine_lock = threading.Lock()
+_engine: CompatibilityEngine | None = None
+
+
+def load_compatibility_engine() -> CompatibilityEngine:
+    """
+    Get the scoring engine of the current pet records, encoding them only when they change.
+
+    Returns:
+        CompatibilityEngine: The engine
+    """
+    global _engine
+
+    store = load_pet_store()
+    with _engine_lock:
+        if _engine is None or _engine.store is not store:
+            _engine = CompatibilityEngine(store)
+        return _engine
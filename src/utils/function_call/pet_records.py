@@ -0,0 +1,408 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from .locations import NEARBY_RADIUS_KM, GridIndex, Region, normalize_location
+
+# Structured records of adoptable pets
+PET_INFO_PATH = "./src/static/animal_info.json"
+# Pets extracted from the crawled articles by `extraction`, when it has been run
+EXTRACTED_PETS_PATH = os.environ.get(
+    "EXTRACTED_PETS_PATH", "./.cache/extracted_pets.json"
+)
+
+# Posts listing several pets name their species in one field, e.g. "三花貓、虎斑貓"
+_SPECIES_SEPARATORS = re.compile(r"[、,，/／]+")
+
+
+class Vocabulary:
+    """
+    Interned strings, each stored once and referred to by a small integer id.
+
+    Tags are shared by many pets, so records hold their ids instead of copies.
+    """
+
+    __slots__ = ("_ids", "_words")
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._words: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._ids
+
+    def add(self, word: str) -> int:
+        """
+        Get the id of a word, adding it if it is new.
+
+        Arguments:
+            word (str): The word
+
+        Returns:
+            int: Its id
+        """
+        if (word_id := self._ids.get(word)) is None:
+            word_id = self._ids[word] = len(self._words)
+            self._words.append(sys.intern(word))
+        return word_id
+
+    def get(self, word: str) -> int | None:
+        return self._ids.get(word)
+
+    def word(self, word_id: int) -> str:
+        return self._words[word_id]
+
+
+@dataclass(frozen=True, slots=True)
+class PetRecord:
+    """
+    One adoptable pet of `animal_info.json` or of the extracted articles.
+
+    Parameters:
+        pet_id (int): Position of the pet in the store.
+        animal_type (str): E.g. "cat", "hamster".
+        name (str): The pet's name, empty when the post gives none.
+        species (str): Breed or species as written in the post.
+        age (str): Age as written in the post.
+        location (str): Where the pet is.
+        tags (tuple[int, ...]): Ids of its characteristic tags in `PetStore.tags`.
+        requirements (tuple[str, ...]): What the poster asks of adopters.
+        characteristics (tuple[str, ...]): Descriptions of its personality.
+        health_info (tuple[str, ...]): Neutering, vaccines and other health facts.
+        note (str): Anything else the poster wrote.
+        url (str): The article the pet was extracted from, empty for hand-made records.
+    """
+
+    pet_id: int
+    animal_type: str
+    name: str
+    species: str
+    age: str
+    location: str
+    tags: tuple[int, ...]
+    requirements: tuple[str, ...]
+    characteristics: tuple[str, ...]
+    health_info: tuple[str, ...]
+    note: str
+    url: str
+
+
+class PetStore:
+    """
+    The adoptable pets, indexed by tag, animal type, species and place.
+
+    Indexes map each key to the sorted ids of its pets, so structured
+    questions ("calm cats in Taipei") are answered without an LLM reading
+    the raw records. Locations are normalized to regions and put in a grid,
+    so "near 板橋" also finds pets in 土城 or 台北.
+
+    Parameters:
+        raw_records (list[dict]): The records of `animal_info.json`.
+        version (str): The file version they were loaded from. Defaults to "".
+    """
+
+    def __init__(self, raw_records: list[dict], version: str = "") -> None:
+        self.version = version
+        self.tags = Vocabulary()
+        records = []
+        by_tag: dict[int, list[int]] = {}
+        by_type: dict[str, list[int]] = {}
+        by_species: dict[str, list[int]] = {}
+        regions = []
+        self._grid = GridIndex()
+
+        for pet_id, raw in enumerate(raw_records):
+            tags = tuple(
+                dict.fromkeys(
+                    self.tags.add(tag.strip())
+                    for tag in raw.get("animal_characteristic_tags", [])
+                    if tag.strip()
+                )
+            )
+            record = PetRecord(
+                pet_id=pet_id,
+                animal_type=sys.intern(raw.get("animal_type", "").strip().lower()),
+                name=raw.get("animal_name", ""),
+                species=sys.intern(raw.get("animal_species", "").strip()),
+                age=raw.get("age", ""),
+                location=sys.intern(raw.get("location", "").strip()),
+                tags=tags,
+                requirements=tuple(raw.get("adopt_requirements", [])),
+                characteristics=tuple(raw.get("animal_characteristics", [])),
+                health_info=tuple(raw.get("health_info", [])),
+                note=raw.get("note", ""),
+                url=raw.get("url", ""),
+            )
+            records.append(record)
+            regions.append(region := normalize_location(record.location))
+            if region is not None:
+                self._grid.add(pet_id, region.lat, region.lon)
+
+            for tag_id in tags:
+                by_tag.setdefault(tag_id, []).append(pet_id)
+            if record.animal_type:
+                by_type.setdefault(record.animal_type, []).append(pet_id)
+            for species in species_names(record.species):
+                ids = by_species.setdefault(species, [])
+                if not ids or ids[-1] != pet_id:
+                    ids.append(pet_id)
+
+        self.records = tuple(records)
+        self.regions: tuple[Region | None, ...] = tuple(regions)
+        self._by_tag = {tag_id: tuple(ids) for tag_id, ids in by_tag.items()}
+        self._by_type = {key: tuple(ids) for key, ids in by_type.items()}
+        self._by_species = {key: tuple(ids) for key, ids in by_species.items()}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, pet_id: int) -> PetRecord | None:
+        """
+        Look up a pet by id.
+
+        Arguments:
+            pet_id (int): The id of the pet
+
+        Returns:
+            PetRecord | None: The pet, None for an unknown id
+        """
+        if 0 <= pet_id < len(self.records):
+            return self.records[pet_id]
+        return None
+
+    def ids_with_tag(self, tag: str) -> tuple[int, ...]:
+        tag_id = self.tags.get(tag.strip())
+        return self._by_tag.get(tag_id, ()) if tag_id is not None else ()
+
+    def ids_of_type(self, animal_type: str) -> tuple[int, ...]:
+        return self._by_type.get(animal_type.strip().lower(), ())
+
+    def ids_of_species(self, species: str) -> tuple[int, ...]:
+        species = species.strip()
+        # "三花" also finds "三花貓"
+        return tuple(
+            sorted(
+                {
+                    i
+                    for name, ids in self._by_species.items()
+                    if species and species in name
+                    for i in ids
+                }
+            )
+        )
+
+    def nearby(
+        self, near: str, max_km: float = NEARBY_RADIUS_KM
+    ) -> dict[int, float] | None:
+        """
+        Find the pets within a distance of a place.
+
+        Arguments:
+            near (str): The place, e.g. "板橋" or "新北市土城區"
+            max_km (float): The distance in kilometres. Defaults to `NEARBY_RADIUS_KM`.
+
+        Returns:
+            dict[int, float] | None: The distance of each pet nearby, nearest first,
+                                     None when the place is unknown
+        """
+        if (region := normalize_location(near.strip())) is None:
+            return None
+        return dict(self._grid.within(region.lat, region.lon, max_km))
+
+    def find(
+        self,
+        animal_type: str = "",
+        species: str = "",
+        tags: list[str] | None = None,
+        location: str = "",
+        near: str = "",
+        max_km: float = NEARBY_RADIUS_KM,
+    ) -> list[PetRecord]:
+        """
+        Find the pets matching every given condition.
+
+        Arguments:
+            animal_type (str): E.g. "cat". Defaults to any type.
+            species (str): A species or breed, e.g. "三花". Defaults to any.
+            tags (list[str] | None): Characteristic tags the pet must all have. Defaults to none.
+            location (str): Text contained in the pet's location, e.g. "台中". Defaults to anywhere.
+            near (str): A place the pet must be within `max_km` of, e.g. "板橋".
+                        An unknown place is matched as text like `location`. Defaults to anywhere.
+            max_km (float): The distance from `near` in kilometres. Defaults to `NEARBY_RADIUS_KM`.
+
+        Returns:
+            list[PetRecord]: The matching pets, nearest first when `near` is given, else by id
+        """
+        nearby = self.nearby(near, max_km) if near.strip() else None
+
+        hits = []
+        if animal_type.strip():
+            hits.append(self.ids_of_type(animal_type))
+        if species.strip():
+            hits.append(self.ids_of_species(species))
+        hits += [self.ids_with_tag(tag) for tag in tags or [] if tag.strip()]
+
+        if nearby is not None:
+            hits.append(tuple(nearby))
+
+        candidates: set[int] | None = None
+        for ids in hits:
+            candidates = set(ids) if candidates is None else candidates & set(ids)
+
+        records = (
+            self.records
+            if candidates is None
+            else [self.records[i] for i in sorted(candidates)]
+        )
+        places = [location.strip()] + ([near.strip()] if nearby is None else [])
+        for place in filter(None, places):
+            records = [record for record in records if place in record.location]
+        if nearby is not None:
+            # Stable, so pets at the same distance stay by id
+            records = sorted(records, key=lambda record: nearby[record.pet_id])
+        return list(records)
+
+    def type_counts(self) -> dict[str, int]:
+        """
+        Count the pets of each animal type.
+
+        Returns:
+            dict[str, int]: The number of pets of each type, most common first
+        """
+        return dict(
+            Counter({key: len(ids) for key, ids in self._by_type.items()}).most_common()
+        )
+
+    def tag_counts(self, animal_type: str = "") -> dict[str, int]:
+        """
+        Count the pets having each characteristic tag.
+
+        Arguments:
+            animal_type (str): Only count pets of this type. Defaults to every pet.
+
+        Returns:
+            dict[str, int]: The number of pets of each tag, most common first
+        """
+        records = (
+            [self.records[i] for i in self.ids_of_type(animal_type)]
+            if animal_type.strip()
+            else self.records
+        )
+        counts = Counter(tag_id for record in records for tag_id in record.tags)
+        return {self.tags.word(tag_id): n for tag_id, n in counts.most_common()}
+
+    def species_counts(self, animal_type: str = "") -> dict[str, int]:
+        """
+        Count the pets of each species.
+
+        Arguments:
+            animal_type (str): Only count pets of this type. Defaults to every pet.
+
+        Returns:
+            dict[str, int]: The number of pets of each species, most common first
+        """
+        allowed = set(self.ids_of_type(animal_type)) if animal_type.strip() else None
+        counts = Counter(
+            {
+                species: sum(1 for i in ids if allowed is None or i in allowed)
+                for species, ids in self._by_species.items()
+            }
+        )
+        return {species: n for species, n in counts.most_common() if n}
+
+    def to_dict(self, record: PetRecord, distance_km: float | None = None) -> dict:
+        """
+        Describe a pet for the agents, leaving out the fields the post does not give.
+
+        Arguments:
+            record (PetRecord): The pet
+            distance_km (float | None): Its distance from the place searched near. Defaults to none.
+
+        Returns:
+            dict: Its id and filled fields, with the tags as words
+        """
+        region = self.regions[record.pet_id]
+        fields = {
+            "id": record.pet_id,
+            "type": record.animal_type,
+            "name": record.name,
+            "species": record.species,
+            "age": record.age,
+            "location": record.location,
+            "region": region.name if region is not None else "",
+            "tags": [self.tags.word(tag_id) for tag_id in record.tags],
+            "requirements": list(record.requirements),
+            "characteristics": list(record.characteristics),
+            "health_info": list(record.health_info),
+            "note": record.note,
+            "url": record.url,
+        }
+        fields = {key: value for key, value in fields.items() if value or key == "id"}
+        if distance_km is not None:
+            fields["distance_km"] = round(distance_km, 1)
+        return fields
+
+
+def species_names(species: str) -> list[str]:
+    """
+    Split the species field of a post listing several pets.
+
+    Arguments:
+        species (str): E.g. "三花貓、虎斑貓、黑貓"
+
+    Returns:
+        list[str]: The species named, e.g. ["三花貓", "虎斑貓", "黑貓"]
+    """
+    return [name.strip() for name in _SPECIES_SEPARATORS.split(species) if name.strip()]
+
+
+def _file_version(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def pet_info_version() -> str:
+    """
+    Identify the current version of the pet records.
+
+    Returns:
+        str: A version string that changes whenever `PET_INFO_PATH` or `EXTRACTED_PETS_PATH` changes
+    """
+    return f"{_file_version(PET_INFO_PATH)}/{_file_version(EXTRACTED_PETS_PATH)}"
+
+
+_store_lock = threading.Lock()
+_store: PetStore | None = None
+
+
+def load_pet_store() -> PetStore:
+    """
+    Load the pet records, parsing the files only when they have changed.
+
+    The hand-made records come first, then the ones extracted from articles.
+
+    Returns:
+        PetStore: The current records
+    """
+    global _store
+
+    version = pet_info_version()
+    with _store_lock:
+        if _store is None or _store.version != version:
+            with open(PET_INFO_PATH, encoding="utf-8") as f:
+                raw_records = json.load(f)
+            if os.path.exists(EXTRACTED_PETS_PATH):
+                with open(EXTRACTED_PETS_PATH, encoding="utf-8") as f:
+                    raw_records += json.load(f)
+            _store = PetStore(raw_records, version)
+        return _store
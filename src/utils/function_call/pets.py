@@ -1,31 +1,34 @@
-import json
-
 # import random
 # import time
 # from collections import defaultdict
-import os
-
-import numpy as np
-import pandas as pd
-from google import genai
-from google.genai import types
+from typing import Literal
 
-# Calculate the cosine similarity between the query vector and each content vector
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.tracing import tracer
 
 # from selenium.webdriver.common.by import By
 # from seleniumbase import SB, Driver
 # from utils.helpers import mock_return, read_file_content
 # from utils.helpers import mock_return
 # from .wordcloud import build_word_freq_dict, draw_wordcloud_cat, test_md_draw_wordcloud
+from .embeddings import embed_text
+from .locations import NEARBY_RADIUS_KM, clamp_radius
+from .matching import AdopterProfile, load_compatibility_engine
+from .pet_records import load_pet_store
+from .projection import project_full_texts, project_results
+from .retrieval import (
+    ARTICLE_CSV_PATH,
+    active_prefetch,
+    get_articles,
+    import_pandas,
+    search_contents,
+)
 from .wordcloud import build_word_freq_dict, test_md_draw_wordcloud
 
-# Dcard URL for "送養" topic
-ADOPTION_TAG_URL = "https://www.dcard.tw/topics/%E9%80%81%E9%A4%8A"
-
 
 def mock_crawling_dcard_urls(target_url_num: int = 10) -> list[tuple[str, str]]:
-    res = pd.read_csv("./src/static/article_contents.csv")
+    pd = import_pandas()
+
+    res = pd.read_csv(ARTICLE_CSV_PATH)
     # res = pd.read_csv("../../static/article_contents.csv")
     res = res[["title", "url"]].values.tolist()
     res = [tuple(x) for x in res][:target_url_num]
@@ -158,18 +161,20 @@ def mock_crawling_dcard_urls(target_url_num: int = 10) -> list[tuple[str, str]]:
 #     # return results
 
 
-def content_wordcloud(contents: list[str]) -> str:
+def content_wordcloud(
+    contents: list[str], mode: Literal["fast", "accurate"] = "accurate"
+) -> str:
     """
     Generates a word cloud from the content of a str or a list of str.
 
     Args:
-        mode (Literal["cat", "normal", None]): The mode for generating the word cloud.
-                                                "cat" for cat-shaped word cloud,
-                                                "normal" for normal word cloud,
-                                                None for default behavior.
+        contents (list[str]): The texts to build the word cloud from.
+        mode (Literal["fast", "accurate"]): The tokenizer to use.
+                                            "fast" for a lexicon-based tokenizer, for quick answers,
+                                            "accurate" for the CKIP BERT models. Default is "accurate".
 
     Returns:
-        str: A html image string of the generated word cloud.
+        str: A handle to (or an html image of) the generated word cloud, which is shown to the user directly.
     """
     # mode = None
     # urls = cawling_dcard_urls()
@@ -178,7 +183,7 @@ def content_wordcloud(contents: list[str]) -> str:
     # for url in urls[:10]:
     #     contents.append(crawling_dcard_article_content(url[1])["content"])
 
-    word_freq = build_word_freq_dict(contents)
+    word_freq = build_word_freq_dict(contents, mode=mode)
 
     # if mode == "cat":
     #     res = draw_wordcloud_cat(word_freq)
@@ -188,72 +193,205 @@ def content_wordcloud(contents: list[str]) -> str:
     return res
 
 
-def query_top_k_match_contents(query: str, k: int = 15) -> list[dict]:
+def draw_content_wordcloud(
+    contents: list[str],
+    mode: Literal["fast", "accurate"] = "accurate",
+    profile: str | None = None,
+) -> str:
+    """
+    Draw a word cloud for a client, in the output profile that suits its display.
+
+    Unlike `content_wordcloud`, this is not a tool, the profile is not the model's to pick.
+
+    Args:
+        contents (list[str]): The texts to build the word cloud from.
+        mode (Literal["fast", "accurate"]): The tokenizer to use. Default is "accurate".
+        profile (str | None): A key of `WORDCLOUD_PROFILES`, None for `WORDCLOUD_PROFILE`.
+
+    Returns:
+        str: A handle to (or an html image of) the generated word cloud.
+    """
+    return test_md_draw_wordcloud(build_word_freq_dict(contents, mode=mode), profile)
+
+
+def query_top_k_match_contents(
+    query: str, k: int = 15, near: str = "", max_km: float = NEARBY_RADIUS_KM
+) -> list[dict]:
     """
     Queries the top k matching contents based on the provided query.
 
+    Each result is a compact summary of an article: its id, title, url,
+    similarity, key fields and an excerpt relevant to the query. Use
+    `get_article_contents` with the ids of promising articles to read them in full.
+
     Args:
         query (str): The query string to search for.
-        k (int): The number of top matching contents to return. Default is 5.
+        k (int): The number of top matching contents to return. Default is 15.
+        near (str): Where the adopter lives, e.g. "板橋". Leaves out articles placed farther
+                    than `max_km` from it. Default is anywhere.
+        max_km (float): How far from `near` to search, in kilometres, at most 400. Default is 40.
 
     Returns:
-        list[dict]: A list of dictionaries containing the top k matching contents.
+        list[dict]: A list of dictionaries summarizing the top k matching contents.
     """
 
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    # The user's message may have been searched for already, without a place
+    if (
+        not near.strip()
+        and (prefetch := active_prefetch())
+        and (top_k_contents := prefetch.take(query, k)) is not None
+    ):
+        with tracer.span("retrieval.search", kind="retrieval", k=k, warm=True):
+            return project_results(top_k_contents, query)
 
-    result = client.models.embed_content(
-        model="models/text-embedding-004",
-        contents=query,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY"),
-    )
+    query_vec = embed_text(query, task_type="RETRIEVAL_QUERY")
 
-    query_vec = result.embeddings[0].values
+    with tracer.span(
+        "retrieval.search", kind="retrieval", k=k, near=bool(near.strip())
+    ) as span:
+        top_k_contents = search_contents(query_vec, k, near, clamp_radius(max_km))
+        results = project_results(top_k_contents, query)
+        span.set(results=len(results))
 
-    # Load the CSV file containing the vectorized contents
-    df = pd.read_csv("./src/static/article_contents.csv")
+    return results
 
-    # Extract and parse raw vectorized contents
-    raw_vectors = (
-        df["vectorize"]
-        .apply(lambda x: json.loads(x) if isinstance(x, str) else x)
-        .tolist()
-    )
 
-    # Filter valid vectors matching the query embedding dimension
-    valid_indices = [
-        i
-        for i, vec in enumerate(raw_vectors)
-        if isinstance(vec, list | np.ndarray) and len(vec) == len(query_vec)
-    ]
-    if not valid_indices:
-        raise ValueError(
-            "No valid vectorized contents found matching embedding dimension"
-        )
-    vectorized_contents = np.array([raw_vectors[i] for i in valid_indices], dtype=float)
-    print(f"Number of vectorized contents: {len(vectorized_contents)}")
-
-    # Compute cosine similarities
-    similarities = cosine_similarity([query_vec], vectorized_contents)[0]
-
-    # Get the indices of the top k most similar contents within filtered set
-    top_k_indices = similarities.argsort()[-k:][::-1]
-
-    # Retrieve the top k contents and their URLs using original dataframe indices
-    top_k_contents = []
-    for idx in top_k_indices:
-        orig_idx = valid_indices[idx]
-        top_k_contents.append(
+def get_article_contents(ids: list[int]) -> list[dict]:
+    """
+    Gets the full text of articles found by `query_top_k_match_contents`.
+
+    Args:
+        ids (list[int]): The ids of the articles to read.
+
+    Returns:
+        list[dict]: The id, title, url and content of each article found.
+    """
+    with tracer.span("retrieval.full_text", kind="retrieval", ids=len(ids)):
+        return project_full_texts(get_articles(ids))
+
+
+def find_adoptable_pets(
+    animal_type: str = "",
+    species: str = "",
+    tags: list[str] | None = None,
+    location: str = "",
+    k: int = 10,
+    near: str = "",
+    max_km: float = NEARBY_RADIUS_KM,
+) -> list[dict]:
+    """
+    Finds adoptable pets by their structured records, matching every condition given.
+
+    Use `list_pet_attributes` to see the animal types, species and tags available.
+
+    Args:
+        animal_type (str): The type of animal, e.g. "cat". Default is any type.
+        species (str): A species or breed, e.g. "三花". Default is any.
+        tags (list[str] | None): Characteristic tags the pet must all have, e.g. ["親人"]. Default is none.
+        location (str): Part of the pet's location, e.g. "台中". Default is anywhere.
+        k (int): The maximum number of pets to return. Default is 10.
+        near (str): Where the adopter lives, e.g. "板橋" or "新北市土城區". Finds pets within
+                    `max_km` of it, also across county lines, nearest first. Default is anywhere.
+        max_km (float): How far from `near` to search, in kilometres, at most 400. Default is 40.
+
+    Returns:
+        list[dict]: The matching pets with their id, type, name, species, age, location, region,
+                    distance in km from `near`, tags, adoption requirements, characteristics,
+                    health info and note.
+    """
+    store = load_pet_store()
+    max_km = clamp_radius(max_km)
+    with tracer.span("pets.find", kind="retrieval", near=bool(near.strip())) as span:
+        records = store.find(animal_type, species, tags, location, near, max_km)
+        nearby = (store.nearby(near, max_km) if near.strip() else None) or {}
+        span.set(results=len(records))
+        return [
+            store.to_dict(record, nearby.get(record.pet_id)) for record in records[:k]
+        ]
+
+
+def list_pet_attributes(animal_type: str = "") -> dict:
+    """
+    Lists the animal types, species and characteristic tags of the adoptable pets, with their number of pets.
+
+    Args:
+        animal_type (str): Only count pets of this type, e.g. "cat". Default is every pet.
+
+    Returns:
+        dict: The number of pets, the number of pets of every type, and of each species and tag.
+    """
+    store = load_pet_store()
+    return {
+        "pets": len(store.find(animal_type)),
+        "types": store.type_counts(),
+        "species": store.species_counts(animal_type),
+        "tags": store.tag_counts(animal_type),
+    }
+
+
+def rank_pets_for_adopter(
+    animal_type: str = "",
+    housing: str = "",
+    lives_alone: bool | None = None,
+    home_all_day: bool | None = None,
+    has_experience: bool | None = None,
+    has_other_pets: bool | None = None,
+    stable_income: bool | None = None,
+    preferred_tags: list[str] | None = None,
+    location: str = "",
+    k: int = 5,
+    near: str = "",
+    max_km: float = NEARBY_RADIUS_KM,
+) -> list[dict]:
+    """
+    Ranks the adoptable pets by how well they fit an adopter's situation, best fit first.
+
+    Leave out what the adopter has not told. Each pet comes with its score and the reasons
+    for it: the pet's traits (e.g. needs_experience, single_pet_home), wished-for tags and
+    nearness to the adopter that raised (positive) or lowered (negative) the score.
+
+    Args:
+        animal_type (str): The type of animal, e.g. "cat". Default is any type.
+        housing (str): "apartment" or "house". Default is unknown.
+        lives_alone (bool | None): Whether the adopter lives alone. Default is unknown.
+        home_all_day (bool | None): Whether someone is home most of the day. Default is unknown.
+        has_experience (bool | None): Whether the adopter has kept pets before. Default is unknown.
+        has_other_pets (bool | None): Whether there are pets at home already. Default is unknown.
+        stable_income (bool | None): Whether the adopter has a stable job or income. Default is unknown.
+        preferred_tags (list[str] | None): Characteristic tags the adopter wishes for, e.g. ["親人"]. Default is none.
+        location (str): Part of the pet's location, e.g. "台中". Default is anywhere.
+        k (int): The number of pets to return. Default is 5.
+        near (str): Where the adopter lives, e.g. "板橋". Only ranks pets within `max_km` of it,
+                    nearer ones higher. Default is anywhere.
+        max_km (float): How far from `near` to search, in kilometres, at most 400. Default is 40.
+
+    Returns:
+        list[dict]: The best fitting pets with their score, reasons and record.
+    """
+    profile = AdopterProfile(
+        housing=housing.strip().lower(),
+        lives_alone=lives_alone,
+        home_all_day=home_all_day,
+        has_experience=has_experience,
+        has_other_pets=has_other_pets,
+        stable_income=stable_income,
+        preferred_tags=tuple(preferred_tags or ()),
+    )
+    engine = load_compatibility_engine()
+    max_km = clamp_radius(max_km)
+    with tracer.span("pets.rank", kind="retrieval", k=k) as span:
+        ranked = engine.rank(profile, animal_type, location, k, near, max_km)
+        nearby = (engine.store.nearby(near, max_km) if near.strip() else None) or {}
+        span.set(results=len(ranked))
+        return [
             {
-                "url": df.iloc[orig_idx]["url"],
-                "title": df.iloc[orig_idx]["title"],
-                "author": df.iloc[orig_idx]["author"],
-                "content": df.iloc[orig_idx]["content"],
-                "similarity": similarities[idx],
+                **ranking,
+                **engine.store.to_dict(
+                    engine.store.records[ranking["id"]], nearby.get(ranking["id"])
+                ),
             }
-        )
-
-    return top_k_contents
+            for ranking in ranked
+        ]
 
 
 if __name__ == "__main__":
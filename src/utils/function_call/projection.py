@@ -0,0 +1,203 @@
+import json
+import os
+import re
+
+from utils.bots.memory import estimate_tokens
+
+# Tokens of a whole article search result sent to the agent
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", 1500))
+# Characters of the excerpt of each article
+RETRIEVAL_SNIPPET_CHARS = int(os.environ.get("RETRIEVAL_SNIPPET_CHARS", 160))
+# Tokens of the full texts returned by `get_article_contents`
+FULL_TEXT_TOKEN_BUDGET = int(os.environ.get("FULL_TEXT_TOKEN_BUDGET", 6000))
+
+# Snippets are not shortened below this when fitting the budget
+MIN_SNIPPET_CHARS = 40
+
+# Labelled fields of adoption posts, e.g. "年齡：約兩歲"
+FIELD_LABELS = {
+    "species": "物種|種類|品種",
+    "age": "年齡|年紀|歲數",
+    "sex": "性別",
+    "location": "地區|地點|所在地|縣市",
+    "neutered": "結紮|絕育",
+    "vaccinated": "疫苗|預防針",
+    "personality": "個性|性格|特質",
+}
+_FIELDS = {
+    name: re.compile(rf"(?:{labels})\s*[:：]\s*([^\n，,。；;！!]{{1,30}})")
+    for name, labels in FIELD_LABELS.items()
+}
+# Traits the matchmaker looks for, kept even when the post has no labels
+TRAITS = (
+    "親人",
+    "黏人",
+    "安靜",
+    "活潑",
+    "怕生",
+    "溫馴",
+    "愛撒嬌",
+    "已結紮",
+    "已打疫苗",
+    "已施打疫苗",
+    "適合新手",
+    "適合初學者",
+)
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+_SENTENCE = re.compile(r"[^。！？!?\n]+[。！？!?]?")
+
+
+def extract_fields(content: str) -> dict:
+    """
+    Extract the key facts of an adoption post.
+
+    Args:
+        content (str): The text of the post.
+
+    Returns:
+        dict: Labelled fields such as age and location, and the traits mentioned.
+    """
+    fields = {
+        name: match.group(1).strip()
+        for name, pattern in _FIELDS.items()
+        if (match := pattern.search(content))
+    }
+    if traits := [trait for trait in TRAITS if trait in content]:
+        fields["traits"] = traits
+    return fields
+
+
+def _terms(text: str) -> set[str]:
+    # CJK text has no spaces, so it is compared by character pairs
+    terms = {word.casefold() for word in re.findall(r"[A-Za-z0-9]+", text)}
+    for run in _CJK.findall(text):
+        terms.update(run[i : i + 2] for i in range(max(1, len(run) - 1)))
+    return terms
+
+
+def query_snippet(content: str, query: str, max_chars: int) -> str:
+    """
+    Excerpt the sentences of a text that are most relevant to a query.
+
+    Args:
+        content (str): The text.
+        query (str): The query the text was found for.
+        max_chars (int): Maximum length of the excerpt.
+
+    Returns:
+        str: The best matching sentences in their original order, "…" marking cuts.
+    """
+    sentences = [s.strip() for s in _SENTENCE.findall(content) if s.strip()]
+    if not sentences:
+        return ""
+
+    query_terms = _terms(query)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms & _terms(sentences[i])), i),
+    )
+
+    # Sentences are joined with a one character "…"
+    chosen, length = [], -1
+    for i in ranked:
+        if length + 1 + len(sentences[i]) > max_chars and chosen:
+            break
+        chosen.append(i)
+        length += 1 + len(sentences[i])
+
+    snippet = "…".join(sentences[i] for i in sorted(chosen))
+    if len(snippet) > max_chars:
+        snippet = snippet[: max_chars - 1] + "…"
+    return snippet
+
+
+def _tokens(item: dict) -> int:
+    return estimate_tokens(json.dumps(item, ensure_ascii=False))
+
+
+def project_results(
+    results: list[dict],
+    query: str,
+    token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+    snippet_chars: int = RETRIEVAL_SNIPPET_CHARS,
+) -> list[dict]:
+    """
+    Shrink search results to what the agent needs to pick matches.
+
+    Each article is reduced to its id, title, url, similarity, key fields and
+    an excerpt relevant to the query. When the results exceed the token
+    budget, the excerpts are shortened first, then the least similar
+    articles are left out.
+
+    Args:
+        results (list[dict]): Articles with their full content, most similar first.
+        query (str): The query they were found for.
+        token_budget (int): Tokens the projected results may take.
+        snippet_chars (int): Characters of each excerpt before shortening.
+
+    Returns:
+        list[dict]: The projected articles, most similar first.
+    """
+
+    def project(result: dict, chars: int) -> dict:
+        content = str(result.get("content", ""))
+        item = {
+            "id": result["id"],
+            "title": result["title"],
+            "url": result["url"],
+            "similarity": round(float(result["similarity"]), 3),
+        }
+        if "distance_km" in result:
+            item["distance_km"] = round(float(result["distance_km"]), 1)
+        if fields := extract_fields(content):
+            item["fields"] = fields
+        item["snippet"] = query_snippet(content, query, chars)
+        return item
+
+    chars = snippet_chars
+    while True:
+        items = [project(result, chars) for result in results]
+        if chars <= MIN_SNIPPET_CHARS or sum(map(_tokens, items)) <= token_budget:
+            break
+        chars = max(MIN_SNIPPET_CHARS, chars // 2)
+
+    # Keep the most similar articles that fit, always at least one
+    total = 0
+    for n, item in enumerate(items):
+        total += _tokens(item)
+        if total > token_budget and n > 0:
+            return items[:n]
+    return items
+
+
+def _head(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    while text and estimate_tokens(text) > max_tokens:
+        text = text[: len(text) * 3 // 4]
+    return text + "…"
+
+
+def project_full_texts(
+    articles: list[dict], token_budget: int = FULL_TEXT_TOKEN_BUDGET
+) -> list[dict]:
+    """
+    Fit the full texts of articles into a token budget, shared equally.
+
+    Args:
+        articles (list[dict]): Articles with their id, title, url and content.
+        token_budget (int): Tokens all texts may take.
+
+    Returns:
+        list[dict]: The articles, each content cut to its share of the budget.
+    """
+    share = token_budget // max(1, len(articles))
+    return [
+        {
+            "id": article["id"],
+            "title": article["title"],
+            "url": article["url"],
+            "content": _head(str(article["content"]), share),
+        }
+        for article in articles
+    ]
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+WORDCLOUD_CACHE_DIR = os.environ.get("WORDCLOUD_CACHE_DIR", "./.cache/wordcloud")
+WORDCLOUD_CACHE_MEMORY_BYTES = int(
+    os.environ.get("WORDCLOUD_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+)
+WORDCLOUD_CACHE_DISK_BYTES = int(
+    os.environ.get("WORDCLOUD_CACHE_DISK_BYTES", 512 * 1024 * 1024)
+)
+
+HANDLE_PREFIX = "wordcloud://"
+
+MIME_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+}
+
+# The key and format of a handle, anything else never names a cached image
+_HANDLE_PATTERN = re.compile(rf"([0-9a-f]{{64}})\.({'|'.join(MIME_TYPES)})")
+
+
+class RenderCache:
+    """
+    A two-tier LRU cache for rendered images, bounded by total bytes.
+
+    The in-memory tier holds the most recently used entries. Every entry is also
+    written to the on-disk tier, so it survives restarts and is shared between
+    server processes. Entries read from disk are promoted back to memory.
+
+    The lock only guards the indexes of the tiers, files are read and written
+    without it, so a slow disk does not hold up the lookups served from memory.
+
+    Parameters:
+        max_memory_bytes (int): Total size of the in-memory tier.
+        disk_dir (str | None): Directory of the on-disk tier, None to disable it.
+        max_disk_bytes (int): Total size of the on-disk tier.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = WORDCLOUD_CACHE_MEMORY_BYTES,
+        disk_dir: str | None = WORDCLOUD_CACHE_DIR,
+        max_disk_bytes: int = WORDCLOUD_CACHE_DISK_BYTES,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._max_memory_bytes = max_memory_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+
+        self._disk_dir = disk_dir
+        self._max_disk_bytes = max_disk_bytes
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        if disk_dir:
+            self._scan_disk()
+
+    @staticmethod
+    def make_key(word_freq: dict, options: dict) -> str:
+        """
+        Build a stable key from the word frequencies and the render options.
+
+        Arguments:
+            word_freq (dict): The word frequencies to render
+            options (dict): The options that affect the rendered output
+
+        Returns:
+            str: A hex digest identifying the rendered output
+        """
+        payload = json.dumps(
+            [sorted(word_freq.items()), options],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Look up an entry, first in memory, then on disk.
+
+        Arguments:
+            key (str): The cache key
+
+        Returns:
+            bytes | None: The cached value, or None on a miss
+        """
+        with self._lock:
+            if (value := self._memory.get(key)) is not None:
+                self._memory.move_to_end(key)
+                return value
+
+        if not self._disk_dir:
+            return None
+
+        # Entries written by other processes are not indexed yet, so the
+        # file is checked even if the key is unknown
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                value = f.read()
+            # Keep the on-disk recency order across restarts
+            os.utime(self._disk_path(key))
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+            return None
+
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = len(value)
+            self._disk_bytes += len(value)
+            self._put_memory(key, value)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Store an entry in both tiers, evicting least recently used entries.
+
+        Arguments:
+            key (str): The cache key
+            value (bytes): The value to cache
+        """
+        with self._lock:
+            self._put_memory(key, value)
+        if self._disk_dir:
+            self._put_disk(key, value)
+
+    def clear(self) -> None:
+        """
+        Remove every entry from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            keys = list(self._disk)
+            self._disk.clear()
+            self._disk_bytes = 0
+        for key in keys:
+            self._remove_file(key)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    def _put_memory(self, key: str, value: bytes) -> None:
+        if len(value) > self._max_memory_bytes:
+            return
+
+        if (old := self._memory.pop(key, None)) is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+
+        while self._memory_bytes > self._max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _put_disk(self, key: str, value: bytes) -> None:
+        if len(value) > self._max_disk_bytes:
+            return
+
+        # Each write goes through its own temporary file, as other threads
+        # and processes may write the same entry at once
+        tmp_path = None
+        try:
+            os.makedirs(self._disk_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self._disk_dir, prefix=f"{key}.", suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
+                f.write(value)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"Failed to write render cache entry {key}: {e}")
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        evicted = []
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = len(value)
+            self._disk_bytes += len(value)
+
+            while self._disk_bytes > self._max_disk_bytes:
+                evicted.append(next(iter(self._disk)))
+                self._forget_disk(evicted[-1])
+        for old_key in evicted:
+            self._remove_file(old_key)
+
+    def _scan_disk(self) -> None:
+        """
+        Index existing on-disk entries, oldest first.
+        """
+        if not os.path.isdir(self._disk_dir):
+            return
+
+        entries = []
+        for name in os.listdir(self._disk_dir):
+            if not name.endswith(".bin"):
+                continue
+            stat = os.stat(os.path.join(self._disk_dir, name))
+            entries.append((stat.st_mtime, name.removesuffix(".bin"), stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._disk_dir, f"{key}.bin")
+
+    def _forget_disk(self, key: str) -> None:
+        if (size := self._disk.pop(key, None)) is not None:
+            self._disk_bytes -= size
+
+    def _remove_file(self, key: str) -> None:
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+
+render_cache = RenderCache()
+
+
+def make_handle(key: str, fmt: str) -> str:
+    """
+    Build a lightweight handle that refers to a cached rendered image.
+
+    Arguments:
+        key (str): The render cache key
+        fmt (str): The image format, e.g. "webp"
+
+    Returns:
+        str: The handle, e.g. "wordcloud://<key>.webp"
+    """
+    return f"{HANDLE_PREFIX}{key}.{fmt}"
+
+
+def is_handle(value: str) -> bool:
+    """
+    Check whether a string is a rendered image handle.
+
+    Arguments:
+        value (str): The string to check
+
+    Returns:
+        bool: True if the string is a handle
+    """
+    return value.strip().startswith(HANDLE_PREFIX)
+
+
+def resolve_handle(handle: str) -> tuple[bytes, str] | None:
+    """
+    Look up the image a handle refers to.
+
+    Arguments:
+        handle (str): A handle returned by `make_handle`
+
+    Returns:
+        tuple[bytes, str] | None: The image and its MIME type, or None if it was
+                                  evicted or the handle is malformed
+    """
+    # Handles come from clients too, e.g. the path of GET /wordcloud/{name}
+    match = _HANDLE_PATTERN.fullmatch(handle.strip().removeprefix(HANDLE_PREFIX))
+    if match is None:
+        return None
+    key, fmt = match.groups()
+    if (img := render_cache.get(key)) is None:
+        return None
+    return img, MIME_TYPES[fmt]
@@ -0,0 +1,417 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from utils.tracing import tracer
+
+from .embeddings import embed_text
+from .locations import NEARBY_RADIUS_KM, GridIndex, Region, normalize_location
+
+# pandas is imported when the articles are first loaded, not at page load
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Crawled articles and their embeddings
+ARTICLE_CSV_PATH = "./src/static/article_contents.csv"
+# Search for the user's message while the agents decide whether to search at all
+RETRIEVAL_PREFETCH = os.environ.get("RETRIEVAL_PREFETCH", "1").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+# Seconds a retrieval call waits for a prefetch still in flight
+RETRIEVAL_PREFETCH_WAIT = float(os.environ.get("RETRIEVAL_PREFETCH_WAIT", 30))
+# Share of a query's terms found in the user's message for the prefetch to answer it
+RETRIEVAL_PREFETCH_OVERLAP = float(os.environ.get("RETRIEVAL_PREFETCH_OVERLAP", 0.5))
+# Characters at the start of an article searched for its place, after its title
+LOCATION_SCAN_CHARS = 500
+
+
+def import_pandas():
+    """
+    Import pandas, with the options the app relies on.
+
+    pandas is imported on first use rather than at start, so every module
+    reading the articles imports it through here.
+
+    Returns:
+        module: The pandas module
+    """
+    import pandas as pd
+
+    pd.set_option("future.no_silent_downcasting", True)
+    return pd
+
+
+def article_index_version() -> str:
+    """
+    Identify the current version of the article index.
+
+    Answers derived from the articles are only valid for the index version
+    they were produced with.
+
+    Returns:
+        str: A version string that changes whenever the article CSV changes
+    """
+    try:
+        stat = os.stat(ARTICLE_CSV_PATH)
+    except OSError:
+        return "missing"
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+@dataclass(frozen=True)
+class ArticleIndex:
+    """
+    The articles and their embeddings, ready to be searched.
+
+    Parameters:
+        version (str): The `article_index_version()` it was loaded from.
+        articles (pd.DataFrame): The articles.
+        vectors (np.ndarray): Unit-length embeddings, one row per searchable article.
+        rows (np.ndarray): The row in `articles` of each embedding.
+        located (np.ndarray): Whether the place of each embedding's article is known.
+        grid (GridIndex): The embeddings of the located articles, by place.
+    """
+
+    version: str
+    articles: "pd.DataFrame"
+    vectors: np.ndarray
+    rows: np.ndarray
+    located: np.ndarray
+    grid: GridIndex
+
+
+def article_region(title: str, content: str) -> Region | None:
+    """
+    Find the place of an article, named in its title or else at its start.
+
+    Args:
+        title (str): The title of the article.
+        content (str): The text of the article.
+
+    Returns:
+        Region | None: The region, None when the article names no known place.
+    """
+    return normalize_location(title, free_text=True) or normalize_location(
+        content[:LOCATION_SCAN_CHARS], free_text=True
+    )
+
+
+_index_lock = threading.Lock()
+_index: ArticleIndex | None = None
+
+
+def load_article_index() -> ArticleIndex:
+    """
+    Load the article index, parsing the CSV only when it has changed.
+
+    Returns:
+        ArticleIndex: The current index
+    """
+    pd = import_pandas()
+
+    global _index
+
+    version = article_index_version()
+    with _index_lock:
+        if _index is not None and _index.version == version:
+            return _index
+
+        with tracer.span("retrieval.load_index", kind="retrieval"):
+            df = pd.read_csv(ARTICLE_CSV_PATH)
+
+            # Extract and parse raw vectorized contents
+            raw_vectors = (
+                df["vectorize"]
+                .apply(lambda x: json.loads(x) if isinstance(x, str) else x)
+                .tolist()
+            )
+
+            # Keep the vectors of the embedding model's dimension
+            sizes = Counter(
+                len(vec) for vec in raw_vectors if isinstance(vec, list | np.ndarray)
+            )
+            size = sizes.most_common(1)[0][0] if sizes else 0
+            rows = np.array(
+                [
+                    i
+                    for i, vec in enumerate(raw_vectors)
+                    if isinstance(vec, list | np.ndarray) and len(vec) == size
+                ],
+                dtype=int,
+            )
+            vectors = np.array([raw_vectors[i] for i in rows], dtype=float).reshape(
+                len(rows), size
+            )
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+
+            # Place the articles, for searches near a place
+            titles = df["title"].fillna("").astype(str).tolist()
+            contents = df["content"].fillna("").astype(str).tolist()
+            grid = GridIndex()
+            located = np.zeros(len(rows), dtype=bool)
+            for i, row in enumerate(rows):
+                region = article_region(titles[row], contents[row])
+                if region is not None:
+                    grid.add(i, region.lat, region.lon)
+                    located[i] = True
+
+        _index = ArticleIndex(version, df, vectors, rows, located, grid)
+        return _index
+
+
+def search_contents(
+    query_vec: list[float],
+    k: int,
+    near: str = "",
+    max_km: float = NEARBY_RADIUS_KM,
+) -> list[dict]:
+    """
+    Find the articles most similar to a query embedding.
+
+    Args:
+        query_vec (list[float]): The query embedding.
+        k (int): The number of articles to return.
+        near (str): Leave out the articles placed farther than `max_km` from this
+            place. Articles of unknown place are kept. Default is anywhere.
+        max_km (float): The distance from `near` in kilometres. Default is `NEARBY_RADIUS_KM`.
+
+    Returns:
+        list[dict]: The top k articles, most similar first.
+    """
+    index = load_article_index()
+    if index.vectors.shape[1] != len(query_vec):
+        raise ValueError(
+            "No valid vectorized contents found matching embedding dimension"
+        )
+    print(f"Number of vectorized contents: {len(index.vectors)}")
+
+    # Only the articles near the place are scored
+    candidates = np.arange(len(index.vectors))
+    distances: dict[int, float] = {}
+    if near.strip() and (region := normalize_location(near.strip())) is not None:
+        distances = dict(index.grid.within(region.lat, region.lon, max_km))
+        nearby = np.zeros(len(index.vectors), dtype=bool)
+        nearby[list(distances)] = True
+        candidates = np.flatnonzero(nearby | ~index.located)
+
+    # Cosine similarities, the index vectors have unit length
+    query = np.asarray(query_vec, dtype=float)
+    similarities = np.full(len(index.vectors), -np.inf)
+    similarities[candidates] = index.vectors[candidates] @ (
+        query / (np.linalg.norm(query) or 1)
+    )
+
+    # Get the indices of the top k most similar contents within filtered set
+    # (a slice from -0 would keep every article)
+    top_k_indices = candidates[similarities[candidates].argsort()[::-1][: max(k, 0)]]
+
+    # Retrieve the top k contents and their URLs using original dataframe indices
+    top_k_contents = []
+    for idx in top_k_indices:
+        row = int(index.rows[idx])
+        article = index.articles.iloc[row]
+        top_k_contents.append(
+            {
+                "id": row,
+                "url": article["url"],
+                "title": article["title"],
+                "author": article["author"],
+                "content": article["content"],
+                "similarity": float(similarities[idx]),
+            }
+        )
+        if idx in distances:
+            top_k_contents[-1]["distance_km"] = distances[idx]
+
+    return top_k_contents
+
+
+def get_articles(ids: list[int]) -> list[dict]:
+    """
+    Look up articles by the ids returned with search results.
+
+    Args:
+        ids (list[int]): The article ids.
+
+    Returns:
+        list[dict]: The id, title, url and content of each article found.
+    """
+    articles = load_article_index().articles
+    return [
+        {
+            "id": int(i),
+            "title": articles.iloc[int(i)]["title"],
+            "url": articles.iloc[int(i)]["url"],
+            "content": articles.iloc[int(i)]["content"],
+        }
+        for i in dict.fromkeys(ids)
+        if 0 <= int(i) < len(articles)
+    ]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _terms(text: str) -> set[str]:
+    # Words of latin text, character pairs of Chinese text
+    terms = set()
+    for word in re.findall(r"\w+", _normalize(text)):
+        if word.isascii() or len(word) == 1:
+            terms.add(word)
+        else:
+            terms.update(word[i : i + 2] for i in range(len(word) - 1))
+    return terms
+
+
+def term_overlap(query: str, text: str) -> float:
+    """
+    Measure how much of a query a text covers.
+
+    Args:
+        query (str): The query.
+        text (str): The text, e.g. the user's message.
+
+    Returns:
+        float: The share of the query's terms found in the text, from 0 to 1.
+    """
+    if not (query_terms := _terms(query)):
+        return 0.0
+    text = _normalize(text)
+    return sum(term in text for term in query_terms) / len(query_terms)
+
+
+class RetrievalPrefetch:
+    """
+    The search results for a user's message, computed in the background.
+
+    The agents reach the retrieval tool only after two model calls, by which
+    time the results for the message are usually ready. The first retrieval
+    call of the turn is answered with them if its query is mostly made of the
+    message's terms (see `RETRIEVAL_PREFETCH_OVERLAP`), as are calls searching
+    for the message itself. Other queries, e.g. about an earlier message or
+    refining the search, are searched for again.
+
+    Args:
+        prompt (str): The user's message.
+        k (int): The number of results prefetched.
+        future (Future[list[dict]]): Completes with the results.
+    """
+
+    def __init__(self, prompt: str, k: int, future: Future) -> None:
+        self.prompt = prompt
+        self.k = k
+        self.future = future
+        self._served = False
+        self._lock = threading.Lock()
+
+    def take(self, query: str, k: int) -> list[dict] | None:
+        """
+        Answer a retrieval call with the prefetched results, if they apply.
+
+        Args:
+            query (str): The query of the call.
+            k (int): The number of results asked for.
+
+        Returns:
+            list[dict] | None: The results, or None to search for the query instead.
+        """
+        with self._lock:
+            if k > self.k:
+                return None
+            if _normalize(query) != _normalize(self.prompt) and (
+                self._served
+                or term_overlap(query, self.prompt) < RETRIEVAL_PREFETCH_OVERLAP
+            ):
+                return None
+            self._served = True
+
+        try:
+            return self.future.result(timeout=RETRIEVAL_PREFETCH_WAIT)[:k]
+        except Exception as e:
+            print(f"Retrieval prefetch failed, searching again: {e!r}")
+            return None
+
+
+class RetrievalPrefetcher:
+    """
+    Run prefetches on a small pool of threads shared by all sessions.
+
+    Args:
+        max_workers (int): Prefetches that run at the same time.
+    """
+
+    def __init__(self, max_workers: int = 2) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="retrieval-prefetch"
+        )
+
+    @staticmethod
+    def _search(prompt: str, k: int) -> list[dict]:
+        with tracer.span("retrieval.prefetch", kind="retrieval", k=k):
+            query_vec = embed_text(prompt, task_type="RETRIEVAL_QUERY")
+            return search_contents(query_vec, k)
+
+    def start(self, prompt: str, k: int = 15) -> RetrievalPrefetch:
+        """
+        Start searching for a user's message.
+
+        Args:
+            prompt (str): The user's message.
+            k (int): The number of results to prefetch. Default is 15.
+
+        Returns:
+            RetrievalPrefetch: The pending results.
+        """
+        return RetrievalPrefetch(
+            prompt, k, self._executor.submit(self._search, prompt, k)
+        )
+
+
+retrieval_prefetcher = RetrievalPrefetcher()
+
+_active_prefetch: ContextVar[RetrievalPrefetch | None] = ContextVar(
+    "active_prefetch", default=None
+)
+
+
+@contextmanager
+def warm_retrieval(prefetch: RetrievalPrefetch | None) -> Iterator[None]:
+    """
+    Let the retrieval calls made inside the block use a prefetch.
+
+    Args:
+        prefetch (RetrievalPrefetch | None): The prefetch of the turn, None for none.
+    """
+    token = _active_prefetch.set(prefetch)
+    try:
+        yield
+    finally:
+        try:
+            _active_prefetch.reset(token)
+        except ValueError:
+            # An async generator closed from another context
+            _active_prefetch.set(None)
+
+
+def active_prefetch() -> RetrievalPrefetch | None:
+    """
+    Get the prefetch of the current turn.
+
+    Returns:
+        RetrievalPrefetch | None: The prefetch, None outside of a prefetched turn.
+    """
+    return _active_prefetch.get()
@@ -1,31 +1,56 @@
 import base64
+import os
 import re
 from collections import Counter
+from functools import cache
 from io import BytesIO
+from typing import TYPE_CHECKING, Literal
 
-# import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
+from utils.tracing import tracer
 
-# import numpy as np
-import torch
-from ckip_transformers.nlp import CkipPosTagger, CkipWordSegmenter
+from .lexicon import lexicon
+from .render_cache import MIME_TYPES, make_handle, render_cache
 
-# from matplotlib.figure import Figure
-# from PIL import Image
-# from scipy.ndimage import gaussian_gradient_magnitude
-# from wordcloud import ImageColorGenerator, WordCloud
-from wordcloud import WordCloud
+# torch, CKIP, wordcloud and Pillow take seconds to import, so they are
+# imported when a word cloud is first drawn rather than at page load
+if TYPE_CHECKING:
+    from ckip_transformers.nlp import CkipPosTagger, CkipWordSegmenter
 
+# Threads used by torch for CPU inference. Several sessions may segment text at
+# the same time, so we keep this small instead of using every core per call.
+CKIP_NUM_THREADS = int(os.environ.get("CKIP_NUM_THREADS", min(4, os.cpu_count() or 1)))
 
-def build_word_freq_dict(content: str | list[str]) -> dict:
-    if isinstance(content, list):
-        content = " ".join(content)
 
-    # Text Cleaning
-    content = re.sub(r"\s+", "", content)  # Remove multiple spaces & newlines
-    content = re.sub(r"[^\w\s]", "", content)  # Remove punctuation
+def cpu_optimized_default() -> bool:
+    """
+    Whether the CPU-optimized CKIP mode is enabled by the environment.
+
+    Returns:
+        bool: True if `CKIP_CPU_OPTIMIZED` is set to a truthy value
+    """
+    return os.environ.get("CKIP_CPU_OPTIMIZED", "").lower() in ("1", "true", "yes")
+
+
+@cache
+def get_ckip_drivers(
+    cpu_optimized: bool = False,
+) -> tuple["CkipWordSegmenter", "CkipPosTagger"]:
+    """
+    Load the CKIP word segmenter and POS tagger once per process.
+
+    In CPU-optimized mode (ignored when CUDA is available), the linear layers of
+    both BERT models are dynamically quantized to int8 and torch is limited to
+    `CKIP_NUM_THREADS` intra-op threads.
+
+    Arguments:
+        cpu_optimized (bool): Whether to quantize the models for CPU inference
+
+    Returns:
+        tuple[CkipWordSegmenter, CkipPosTagger]: The shared segmenter and tagger
+    """
+    import torch
+    from ckip_transformers.nlp import CkipPosTagger, CkipWordSegmenter
 
-    # Tokenization with CKIP tagger
     device = 0 if torch.cuda.is_available() else -1
     print(f"Using device: {'CUDA' if device == 0 else 'CPU'}")
 
@@ -33,14 +58,86 @@ def build_word_freq_dict(content: str | list[str]) -> dict:
     ws = CkipWordSegmenter(model="bert-base", device=device)
     pos = CkipPosTagger(model="bert-base", device=device)
 
-    # Process the text with CKIP
-    ws_results = ws([content])  # No recommend_dictionary in newer versions
-    pos_results = pos(ws_results)
+    if cpu_optimized and device == -1:
+        torch.set_num_threads(CKIP_NUM_THREADS)
+        for driver in (ws, pos):
+            driver.model = torch.ao.quantization.quantize_dynamic(
+                driver.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            driver.model.eval()
+        print(f"CKIP models quantized to int8, using {CKIP_NUM_THREADS} threads")
+
+    return ws, pos
+
+
+def ckip_tokenize(
+    contents: list[str], cpu_optimized: bool | None = None
+) -> tuple[list[list[str]], list[list[str]]]:
+    """
+    Segment and POS-tag sentences with the shared CKIP drivers.
+
+    Arguments:
+        contents (list[str]): Sentences to process
+        cpu_optimized (bool | None): Use the quantized CPU models. Defaults to
+                                     the `CKIP_CPU_OPTIMIZED` environment variable.
+
+    Returns:
+        tuple[list[list[str]], list[list[str]]]: Tokens and POS tags per sentence
+    """
+    import torch
+
+    if cpu_optimized is None:
+        cpu_optimized = cpu_optimized_default()
+
+    ws, pos = get_ckip_drivers(cpu_optimized)
+
+    with torch.inference_mode():
+        ws_results = ws(contents, show_progress=False)
+        pos_results = pos(ws_results, show_progress=False)
+
+    return ws_results, pos_results
+
+
+def build_word_freq_dict(
+    content: str | list[str],
+    mode: Literal["fast", "accurate"] = "accurate",
+    cpu_optimized: bool | None = None,
+) -> dict:
+    if isinstance(content, list):
+        content = " ".join(content)
+
+    # Text Cleaning
+    content = re.sub(r"\s+", "", content)  # Remove multiple spaces & newlines
+    content = re.sub(r"[^\w\s]", "", content)  # Remove punctuation
+
+    if mode == "fast" and len(lexicon) == 0:
+        print("Lexicon is empty, falling back to accurate mode")
+        mode = "accurate"
+
+    with tracer.span(
+        "wordcloud.tokenize", kind="tokenize", mode=mode, chars=len(content)
+    ):
+        if mode == "fast":
+            # Tokenization with the lexicon harvested from previous CKIP runs
+            ws_results, pos_results = lexicon.tokenize([content])
+        else:
+            # Tokenization with CKIP tagger
+            ws_results, pos_results = ckip_tokenize(
+                [content], cpu_optimized=cpu_optimized
+            )
 
     # Extract tokens and their POS tags
     tokens = ws_results[0]  # Get the tokens from the first (and only) sentence
     pos_tags = pos_results[0]  # Get the POS tags from the first sentence
 
+    if mode == "accurate":
+        # Harvest the CKIP output so the fast mode keeps improving
+        lexicon.update(tokens, pos_tags)
+        try:
+            lexicon.save_if_due()
+        except OSError as e:
+            print(f"Failed to save lexicon: {e}")
+
     # Extract nouns, verbs, and adjectives
     desired_tags = {"Na", "Nb", "Nc", "VA", "VB", "VH", "VK", "VL"}
     filtered_tokens = [
@@ -204,28 +301,148 @@ def build_word_freq_dict(content: str | list[str]) -> dict:
 #     return plt.gcf()
 
 
-def test_md_draw_wordcloud(word_freq: dict) -> str:
-    wordcloud = WordCloud(
-        font_path="./src/static/font/Noto_Sans_TC/static/NotoSansTC-Regular.ttf",
-        width=1600,
-        height=800,
-        background_color="white",
-        max_words=150,
-        scale=2,
-        max_font_size=400,
-        prefer_horizontal=0.7,
-        collocations=False,
-    ).generate_from_frequencies(word_freq)
-
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation="bilinear")
-    plt.axis("off")
-    plt.tight_layout(pad=0)
+WORDCLOUD_OPTIONS = {
+    "font_path": "./src/static/font/Noto_Sans_TC/static/NotoSansTC-Regular.ttf",
+    "width": 1600,
+    "height": 800,
+    "background_color": "white",
+    "max_words": 150,
+    "scale": 2,
+    "max_font_size": 400,
+    "prefer_horizontal": 0.7,
+    "collocations": False,
+}
+
+
+# The size the word cloud used to be rasterized to by pyplot (figsize=(10, 5) at 100 dpi)
+WORDCLOUD_OUTPUT_SIZE = (1000, 500)
+
+# Output profiles: image format and target width in pixels
+WORDCLOUD_PROFILES = {
+    "compact": {"fmt": "webp", "width": 640},
+    "standard": {"fmt": "webp", "width": 1000},
+    "retina": {"fmt": "webp", "width": 2000},
+    "vector": {"fmt": "svg", "width": 1000},
+    "legacy": {"fmt": "png", "width": 1000},
+}
+WORDCLOUD_PROFILE = os.environ.get("WORDCLOUD_PROFILE", "standard")
+
+# "handle" returns a short reference to the cached image instead of inline base64
+WORDCLOUD_OUTPUT = os.environ.get("WORDCLOUD_OUTPUT", "handle")
+
+
+def profile_for_display_width(
+    display_width: int, device_pixel_ratio: float = 1.0
+) -> str:
+    """
+    Pick the smallest raster profile that covers the client's display width.
+
+    Arguments:
+        display_width (int): The width of the client's display area in CSS pixels
+        device_pixel_ratio (float): The client's device pixel ratio. Default is 1.0.
+
+    Returns:
+        str: The name of the profile in `WORDCLOUD_PROFILES`
+    """
+    target_width = display_width * device_pixel_ratio
+    for name in ("compact", "standard", "retina"):
+        if WORDCLOUD_PROFILES[name]["width"] >= target_width:
+            return name
+    return "retina"
+
+
+def render_wordcloud(
+    word_freq: dict,
+    fmt: Literal["png", "webp", "svg"] = "png",
+    size: tuple[int, int] | None = WORDCLOUD_OUTPUT_SIZE,
+) -> bytes:
+    """
+    Render a word cloud and encode it directly with Pillow.
+
+    Nothing goes through pyplot, so there is no global figure state to leak and
+    the function is safe to call from several sessions at once.
+
+    Arguments:
+        word_freq (dict): The word frequencies to render
+        fmt (Literal["png", "webp", "svg"]): The image format. Default is "png".
+        size (tuple[int, int] | None): Resize the image to (width, height),
+                                       None to keep the full rendered resolution.
+
+    Returns:
+        bytes: The encoded image
+    """
+    from PIL import Image
+    from wordcloud import WordCloud
+
+    wordcloud = WordCloud(**WORDCLOUD_OPTIONS).generate_from_frequencies(word_freq)
+
+    if fmt == "svg":
+        # The font is not embedded, browsers fall back to a local CJK font
+        svg = wordcloud.to_svg(embed_font=False)
+        if size is not None:
+            width, height = (
+                wordcloud.width * wordcloud.scale,
+                wordcloud.height * wordcloud.scale,
+            )
+            svg = svg.replace(
+                f'width="{width}" height="{height}"',
+                f'width="{size[0]}" height="{size[1]}" viewBox="0 0 {width} {height}"',
+                1,
+            )
+        return svg.encode("utf-8")
+
+    image = wordcloud.to_image()
+    if size is not None and image.size != size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
 
     figfile = BytesIO()
-    plt.savefig(figfile, format="png")
-    figfile.seek(0)
-    figdata_png = base64.b64encode(figfile.getvalue())  # 将图片转为base64
-    figdata_str = str(figdata_png, "utf-8")  # 提取base64的字符串，不然是b'xxx'
+    if fmt == "webp":
+        image.save(figfile, format="WEBP", quality=80, method=4)
+    else:
+        image.save(figfile, format="PNG", optimize=True)
+    image.close()
+
+    return figfile.getvalue()
+
+
+def test_md_draw_wordcloud(
+    word_freq: dict,
+    profile: str | None = None,
+    output: Literal["inline", "handle"] | None = None,
+) -> str:
+    """
+    Render a word cloud for the chat, using the render cache.
+
+    Arguments:
+        word_freq (dict): The word frequencies to render
+        profile (str | None): A key of `WORDCLOUD_PROFILES`. Defaults to `WORDCLOUD_PROFILE`.
+        output (Literal["inline", "handle"] | None): "inline" for a base64 html image,
+                                                     "handle" for a reference to the cached image.
+                                                     Defaults to `WORDCLOUD_OUTPUT`.
+
+    Returns:
+        str: A html image string or an image handle
+    """
+    settings = WORDCLOUD_PROFILES[profile or WORDCLOUD_PROFILE]
+    fmt, width = settings["fmt"], settings["width"]
+    size = (width, width * WORDCLOUD_OPTIONS["height"] // WORDCLOUD_OPTIONS["width"])
+
+    # Identical frequencies are often rendered for different users, so the
+    # rendered image is cached by a fingerprint of the frequencies and options
+    key = render_cache.make_key(
+        word_freq, {**WORDCLOUD_OPTIONS, "fmt": fmt, "size": size}
+    )
+    with tracer.span("wordcloud.render", kind="render", fmt=fmt, width=width) as span:
+        if (img := render_cache.get(key)) is None:
+            img = render_wordcloud(word_freq, fmt=fmt, size=size)
+            render_cache.put(key, img)
+        else:
+            span.set(cache_hit=True)
+
+    if (output or WORDCLOUD_OUTPUT) == "handle":
+        return make_handle(key, fmt)
+
+    figdata_img = base64.b64encode(img)  # 将图片转为base64
+    figdata_str = str(figdata_img, "utf-8")  # 提取base64的字符串，不然是b'xxx'
 
-    return f'<img class="wordcloud" src="data:image/png;base64,{figdata_str}"/>'
+    return f'<img class="wordcloud" src="data:{MIME_TYPES[fmt]};base64,{figdata_str}"/>'
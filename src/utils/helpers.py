@@ -1,9 +1,9 @@
-import time
 from collections.abc import Callable, Generator
 
 import streamlit as st
 
 from utils.i18n import i18n
+from utils.streaming import split_chunks
 
 
 # [Files]
@@ -88,18 +88,17 @@ class st_spinner:
 # [IO]
 def str_stream(text: str) -> Generator:
     """
-    Stream the provided text by yielding one character at a time with a brief delay
-    to simulate typing.
+    Stream the provided text in word-sized chunks.
+
+    Pacing is left to `utils.streaming.StreamPacer`, so no thread is blocked here.
 
     Arguments:
-        text (str): Text to stream character by character
+        text (str): Text to stream
 
     Yields:
-        str: Individual characters of the text
+        str: Word-sized chunks of the text
     """
-    for char in text:
-        yield char
-        time.sleep(0.005)
+    yield from split_chunks(text)
 
 
 # [General]
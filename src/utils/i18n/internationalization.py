@@ -1,3 +1,25 @@
+import json
+import os
+from functools import cache
+
+
+@cache
+def load_messages(path: str) -> dict:
+    """
+    Load a translation file, once per process.
+
+    Every `I18n` instance reading the same file shares its messages.
+
+    Arguments:
+        path (str): Path of a `messages.json` file
+
+    Returns:
+        dict: The messages of the file
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
 class I18n:
     """
     A class to handle internationalization (i18n) for application.
@@ -19,7 +41,9 @@ class I18n:
         i18n_folder_path: str = "./_locales",
     ) -> None:
         self._i18n_folder_path = i18n_folder_path
-        self._translations = self._build_translations()
+        # Translation files are found up front but only parsed when a message
+        # of their language is first asked for
+        self._locale_files = self._find_locale_files()
         self._validate_translations()
 
         self._lang = ""
@@ -53,7 +77,7 @@ class I18n:
         Returns:
             None
         """
-        if not self._translations:
+        if not self._locale_files:
             raise FileNotFoundError(
                 f"Could not find any translation files in {self._i18n_folder_path}"
             )
@@ -61,28 +85,49 @@ class I18n:
         # TODO: Implement validation logic for translations
         pass
 
-    def _build_translations(self) -> dict:
+    def _find_locale_files(self) -> dict[str, str]:
         """
-        Build a dictionary of translations from JSON files in the i18n folder.
+        Find the translation files in the i18n folder.
 
-        Scans the i18n folder path for `messages.json` files and loads them into a dictionary
-        where keys are language codes.
+        Scans the i18n folder path for `messages.json` files, one per language
+        folder, without reading them.
 
         Returns:
-            dict: Dictionary of translations with language codes as keys
+            dict[str, str]: Path of the translation file of each language code
         """
-        import json
-        import os
-
-        translations = {}
+        locale_files = {}
         for root, _dirs, files in os.walk(self._i18n_folder_path):
-            print(f"Checking {root}...")
             if "messages.json" in files:
-                lang = os.path.basename(root)
-                with open(os.path.join(root, "messages.json"), encoding="utf-8") as f:
-                    translations[lang] = json.load(f)
+                locale_files[os.path.basename(root)] = os.path.join(
+                    root, "messages.json"
+                )
+
+        return locale_files
+
+    def _get_translations(self, lang: str) -> dict:
+        """
+        Get the translations of a language, loading its file on first use.
+
+        Arguments:
+            lang (str): Language code
+
+        Returns:
+            dict: The messages of the language, empty if it has no translation file
+        """
+        if lang not in self._locale_files:
+            return {}
 
-        return translations
+        return load_messages(self._locale_files[lang])
+
+    def preload(self) -> None:
+        """
+        Load the translation files of every available language.
+
+        Returns:
+            None
+        """
+        for lang in self._locale_files:
+            self._get_translations(lang)
 
     def is_valid_lang(self, lang: str) -> bool:
         """
@@ -123,7 +168,7 @@ class I18n:
         Returns:
             list[str]: List of available language codes
         """
-        return list(self._translations.keys())
+        return list(self._locale_files.keys())
 
     def set_lang(self, lang: str) -> None:
         """
@@ -207,7 +252,7 @@ class I18n:
         possible_langs = [self._lang, self._default_lang, "en"]
 
         for lang in possible_langs:
-            if res := self._translations.get(lang, {}).get(key, {}).get("message"):
+            if res := self._get_translations(lang).get(key, {}).get("message"):
                 return res
 
         raise KeyError(
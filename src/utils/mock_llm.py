@@ -0,0 +1,257 @@
+import json
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+@dataclass
+class MockReply:
+    """
+    A scripted reply of the mock model.
+
+    Parameters:
+        content (str): The text of the reply.
+        tool_calls (list[tuple[str, dict]]): Tool calls as (tool name, arguments).
+    """
+
+    content: str = ""
+    tool_calls: list[tuple[str, dict]] = field(default_factory=list)
+
+
+Script = Callable[[dict], MockReply]
+
+MOCK_ANSWER = (
+    "Thanks for your question! Based on what you told me, a calm adult cat "
+    "would suit an apartment where someone is home most of the day. "
+    "Budget for food, litter, vaccinations and a yearly check-up. "
+)
+
+
+def make_script(
+    tools: tuple[str, ...] = ("budget_assistant",), answer: str = MOCK_ANSWER
+) -> Script:
+    """
+    Create a script that calls the offered tools once per user turn, then answers.
+
+    Arguments:
+        tools (tuple[str, ...]): Tools to call, when the request offers them
+        answer (str): The text of every answer
+
+    Returns:
+        Script: Maps a chat completion request to a reply
+    """
+
+    def script(request: dict) -> MockReply:
+        messages = request.get("messages", [])
+        last = messages[-1] if messages else {}
+        if last.get("role") == "tool":
+            return MockReply(content=answer)
+
+        offered = {tool["function"]["name"] for tool in request.get("tools", [])}
+        calls = [
+            (name, {"task": str(last.get("content", ""))})
+            for name in tools
+            if name in offered
+        ]
+        if calls:
+            return MockReply(tool_calls=calls)
+        return MockReply(content=answer)
+
+    return script
+
+
+def _estimate_tokens(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False)) // 4 + 1
+
+
+class MockLLMServer:
+    """
+    A local stand-in for an OpenAI-compatible chat completions endpoint.
+
+    Replies come from a script, as whole completions or as server-sent event
+    streams, after a configurable latency. It lets the agents run without
+    network access or an API key, e.g. in tests and load tests.
+
+    Parameters:
+        script (Script | None): Maps a request to a reply. Defaults to `make_script()`.
+        latency (float): Seconds before the first token.
+        chunk_delay (float): Seconds between streamed chunks.
+        chunk_chars (int): Characters per streamed chunk.
+        host (str): The host to listen on.
+        port (int): The port to listen on, 0 for any free port.
+    """
+
+    def __init__(
+        self,
+        script: Script | None = None,
+        latency: float = 0.0,
+        chunk_delay: float = 0.0,
+        chunk_chars: int = 16,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.script = script or make_script()
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+
+        self._lock = threading.Lock()
+        self.requests: list[dict] = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _record(self, request: dict) -> int:
+        with self._lock:
+            self.requests.append(request)
+            return len(self.requests)
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                number = server._record(request)
+                reply = server.script(request)
+
+                time.sleep(server.latency)
+                if request.get("stream"):
+                    server._stream(self, request, reply, number)
+                else:
+                    server._complete(self, request, reply, number)
+
+        return Handler
+
+    def _usage(self, request: dict, reply: MockReply) -> dict:
+        prompt_tokens = _estimate_tokens(request.get("messages", []))
+        completion_tokens = _estimate_tokens([reply.content, reply.tool_calls])
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    @staticmethod
+    def _tool_calls(reply: MockReply, number: int) -> list[dict]:
+        return [
+            {
+                "index": i,
+                "id": f"call_{number}_{i}",
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "arguments": json.dumps(arguments, ensure_ascii=False),
+                },
+            }
+            for i, (name, arguments) in enumerate(reply.tool_calls)
+        ]
+
+    def _complete(
+        self,
+        handler: BaseHTTPRequestHandler,
+        request: dict,
+        reply: MockReply,
+        number: int,
+    ) -> None:
+        message = {"role": "assistant", "content": reply.content or None}
+        if reply.tool_calls:
+            message["tool_calls"] = [
+                {k: v for k, v in call.items() if k != "index"}
+                for call in self._tool_calls(reply, number)
+            ]
+
+        body = json.dumps(
+            {
+                "id": f"chatcmpl-mock-{number}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if reply.tool_calls else "stop",
+                    }
+                ],
+                "usage": self._usage(request, reply),
+            }
+        ).encode("utf-8")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _stream(
+        self,
+        handler: BaseHTTPRequestHandler,
+        request: dict,
+        reply: MockReply,
+        number: int,
+    ) -> None:
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+        def chunk(delta: dict | None, finish_reason: str | None = None, **extra):
+            payload = {
+                "id": f"chatcmpl-mock-{number}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": []
+                if delta is None
+                else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            handler.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            handler.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for start in range(0, len(reply.content), self.chunk_chars):
+            time.sleep(self.chunk_delay)
+            chunk({"content": reply.content[start : start + self.chunk_chars]})
+        if reply.tool_calls:
+            chunk({"tool_calls": self._tool_calls(reply, number)})
+        chunk({}, "tool_calls" if reply.tool_calls else "stop")
+
+        if request.get("stream_options", {}).get("include_usage"):
+            chunk(None, usage=self._usage(request, reply))
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
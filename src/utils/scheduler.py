@@ -0,0 +1,430 @@
+import asyncio
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, TypeVar
+
+from utils.tracing import tracer
+
+# Budgets of the Gemini API key, 0 for no limit. The defaults are the free tier's.
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", 10))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", 250_000))
+GEMINI_EMBED_RPM = float(os.environ.get("GEMINI_EMBED_RPM", 100))
+GEMINI_EMBED_TPM = float(os.environ.get("GEMINI_EMBED_TPM", 30_000))
+# Share the budgets with other processes through this SQLite file, unset for this process only
+SCHEDULER_DB = os.environ.get("SCHEDULER_DB")
+# Share of each budget batch requests leave to interactive ones
+SCHEDULER_BATCH_RESERVE = float(os.environ.get("SCHEDULER_BATCH_RESERVE", 0.2))
+# Times a rate-limited request is queued again before its error is raised
+SCHEDULER_MAX_RETRIES = int(os.environ.get("SCHEDULER_MAX_RETRIES", 3))
+# Seconds every request of a model waits after the API answered 429
+SCHEDULER_BACKOFF = float(os.environ.get("SCHEDULER_BACKOFF", 10))
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """
+    Requests of a lower value are served first.
+    """
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    The budgets of one model, 0 for no limit.
+
+    Parameters:
+        requests_per_minute (float): Requests per minute.
+        tokens_per_minute (float): Prompt and completion tokens per minute.
+    """
+
+    requests_per_minute: float
+    tokens_per_minute: float = 0
+
+
+SCHEDULER_LIMITS = {
+    "chat": RateLimit(GEMINI_RPM, GEMINI_TPM),
+    "embedding": RateLimit(GEMINI_EMBED_RPM, GEMINI_EMBED_TPM),
+}
+
+_priority: ContextVar[Priority] = ContextVar(
+    "request_priority", default=Priority.INTERACTIVE
+)
+
+
+@contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """
+    Schedule the requests made inside the block with a priority.
+
+    Arguments:
+        priority (Priority): The priority, e.g. `Priority.BATCH` for offline jobs
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """
+    Whether an error of the OpenAI or Gemini SDK is a 429 Too Many Requests.
+    """
+    return 429 in (getattr(error, "status_code", None), getattr(error, "code", None))
+
+
+# Bucket name -> (level, unix time of the level)
+Buckets = dict[str, tuple[float, float]]
+
+
+class MemoryBucketStore:
+    """
+    Token bucket levels shared by the threads of this process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Buckets = {}
+
+    @contextmanager
+    def transaction(self) -> Iterator[Buckets]:
+        with self._lock:
+            yield self._buckets
+
+
+class SqliteBucketStore:
+    """
+    Token bucket levels shared by every process using the same SQLite file.
+
+    Each transaction holds SQLite's write lock, so updates of concurrent
+    processes never interleave.
+
+    Parameters:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections may only be used by the thread that opened them
+        if (conn := getattr(self._local, "conn", None)) is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None
+            )
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[Buckets]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            buckets = {
+                name: (level, updated)
+                for name, level, updated in conn.execute(
+                    "SELECT name, level, updated FROM buckets"
+                )
+            }
+            before = dict(buckets)
+            yield buckets
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                [
+                    (name, level, updated)
+                    for name, (level, updated) in buckets.items()
+                    if before.get(name) != (level, updated)
+                ],
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _refill(buckets: Buckets, name: str, capacity: float, now: float) -> float:
+    level, updated = buckets.get(name, (capacity, now))
+    return min(capacity, level + capacity / 60 * max(0.0, now - updated))
+
+
+class RequestScheduler:
+    """
+    Pace the requests of the whole process to the budgets of the API key.
+
+    Every request takes one request and its tokens from per-minute token
+    buckets of its model, which refill continuously. Requests that do not
+    fit wait in a queue instead of failing, interactive requests ahead of
+    batch ones, and in arrival order within a priority. Batch requests also
+    leave a share of each budget to interactive ones, which holds across
+    processes sharing the buckets, whose queues are separate.
+
+    Waiting is done by polling with `asyncio.sleep` or `time.sleep`, so
+    sessions on different threads and event loops share one queue.
+
+    Parameters:
+        limits (Mapping[str, RateLimit]): Budgets by model. Defaults to `SCHEDULER_LIMITS`.
+        store (MemoryBucketStore | SqliteBucketStore | None): Where bucket levels are kept.
+                                                             Defaults to `SCHEDULER_DB` or this process.
+        batch_reserve (float): Share of each budget batch requests may not use.
+        poll_interval (float): Longest sleep between two attempts of a queued request.
+        backoff (float): Seconds the requests of a model are held after the API answered 429.
+    """
+
+    def __init__(
+        self,
+        limits: Mapping[str, RateLimit] = SCHEDULER_LIMITS,
+        store: MemoryBucketStore | SqliteBucketStore | None = None,
+        batch_reserve: float = SCHEDULER_BATCH_RESERVE,
+        poll_interval: float = 0.25,
+        backoff: float = SCHEDULER_BACKOFF,
+    ) -> None:
+        self.limits = dict(limits)
+        if store is None:
+            store = (
+                SqliteBucketStore(SCHEDULER_DB) if SCHEDULER_DB else MemoryBucketStore()
+            )
+        self.store = store
+        self.batch_reserve = batch_reserve
+        self.poll_interval = poll_interval
+        self.backoff_seconds = backoff
+
+        self._lock = threading.Lock()
+        self._tickets = itertools.count()
+        self._queues: dict[str, set[tuple[int, int]]] = {}
+        self._waits: dict[str, deque[float]] = {}
+        self._counts: dict[str, int] = {}
+
+    def _capacities(self, model: str, tokens: float) -> dict[str, tuple[float, float]]:
+        # Bucket name -> (capacity, cost)
+        limit = self.limits.get(model)
+        if limit is None:
+            return {}
+        buckets = {}
+        if limit.requests_per_minute > 0:
+            buckets[f"{model}.requests"] = (limit.requests_per_minute, 1)
+        if limit.tokens_per_minute > 0:
+            buckets[f"{model}.tokens"] = (limit.tokens_per_minute, tokens)
+        return buckets
+
+    def _take(self, model: str, tokens: float, priority: Priority) -> float:
+        capacities = self._capacities(model, tokens)
+        if not capacities:
+            return 0.0
+
+        now = time.time()
+        with self.store.transaction() as buckets:
+            levels, wait = {}, 0.0
+            for name, (capacity, cost) in capacities.items():
+                level = levels[name] = _refill(buckets, name, capacity, now)
+                # A request larger than the budget would never fit otherwise
+                cost = min(cost, capacity)
+                reserve = (
+                    self.batch_reserve * capacity if priority >= Priority.BATCH else 0.0
+                )
+                needed = min(capacity, cost + reserve)
+                if level < needed:
+                    wait = max(wait, (needed - level) / (capacity / 60))
+            if wait > 0:
+                return wait
+
+            for name, (capacity, cost) in capacities.items():
+                buckets[name] = (levels[name] - min(cost, capacity), now)
+            return 0.0
+
+    def _attempt(
+        self, model: str, ticket: tuple[int, int], tokens: float, priority: Priority
+    ) -> float:
+        with self._lock:
+            if ticket != min(self._queues[model]):
+                return self.poll_interval
+        return self._take(model, tokens, priority)
+
+    def _enqueue(self, model: str, priority: Priority) -> tuple[int, int]:
+        ticket = (int(priority), next(self._tickets))
+        with self._lock:
+            self._queues.setdefault(model, set()).add(ticket)
+        return ticket
+
+    def _dequeue(
+        self, model: str, ticket: tuple[int, int], priority: Priority, waited: float
+    ) -> None:
+        key = f"{model}.{priority.name.lower()}"
+        with self._lock:
+            self._queues[model].discard(ticket)
+            self._waits.setdefault(key, deque(maxlen=1000)).append(waited)
+            self._counts[key] = self._counts.get(key, 0) + 1
+        if span := tracer.current_span():
+            span.set(queue_wait_s=waited, priority=priority.name.lower())
+
+    async def acquire(
+        self, model: str, tokens: float = 0, priority: Priority | None = None
+    ) -> float:
+        """
+        Wait until a request fits the budgets of its model, then take it from them.
+
+        Arguments:
+            model (str): A key of `limits`, models without limits are not paced
+            tokens (float): Estimated tokens of the request
+            priority (Priority | None): Defaults to the priority of the current context
+
+        Returns:
+            float: Seconds the request waited in the queue
+        """
+        priority = _priority.get() if priority is None else priority
+        ticket = self._enqueue(model, priority)
+        start = time.monotonic()
+        try:
+            while (wait := self._attempt(model, ticket, tokens, priority)) > 0:
+                await asyncio.sleep(min(wait, self.poll_interval))
+        finally:
+            waited = time.monotonic() - start
+            self._dequeue(model, ticket, priority, waited)
+        return waited
+
+    def acquire_sync(
+        self, model: str, tokens: float = 0, priority: Priority | None = None
+    ) -> float:
+        """
+        Blocking `acquire`, for code that does not run on an event loop.
+        """
+        priority = _priority.get() if priority is None else priority
+        ticket = self._enqueue(model, priority)
+        start = time.monotonic()
+        try:
+            while (wait := self._attempt(model, ticket, tokens, priority)) > 0:
+                time.sleep(min(wait, self.poll_interval))
+        finally:
+            waited = time.monotonic() - start
+            self._dequeue(model, ticket, priority, waited)
+        return waited
+
+    def settle(self, model: str, estimated: float, actual: float) -> None:
+        """
+        Correct the tokens taken for a request once its usage is known.
+
+        Arguments:
+            model (str): The model of the request
+            estimated (float): Tokens taken when it was scheduled
+            actual (float): Tokens it used
+        """
+        capacity, _ = self._capacities(model, 0).get(f"{model}.tokens", (0, 0))
+        if not capacity or actual == estimated:
+            return
+        self._adjust(f"{model}.tokens", capacity, actual - estimated)
+
+    def backoff(self, model: str, seconds: float | None = None) -> None:
+        """
+        Hold every request of a model for a while, after the API answered 429.
+
+        Arguments:
+            model (str): The rate-limited model
+            seconds (float | None): How long to hold the requests. Defaults to `backoff_seconds`.
+        """
+        seconds = self.backoff_seconds if seconds is None else seconds
+        capacity, _ = self._capacities(model, 0).get(f"{model}.requests", (0, 0))
+        if capacity:
+            with self.store.transaction() as buckets:
+                buckets[f"{model}.requests"] = (-capacity / 60 * seconds, time.time())
+
+    def _adjust(self, name: str, capacity: float, amount: float) -> None:
+        now = time.time()
+        with self.store.transaction() as buckets:
+            level = _refill(buckets, name, capacity, now)
+            buckets[name] = (max(-capacity, min(capacity, level - amount)), now)
+
+    def should_retry(self, model: str, error: BaseException, attempt: int) -> bool:
+        """
+        Whether to queue a failed request again, holding the model's requests if it was rate limited.
+
+        Arguments:
+            model (str): The model of the request
+            error (BaseException): The error of the request
+            attempt (int): Attempts made so far, starting at 0
+
+        Returns:
+            bool: True for a 429 and attempts left
+        """
+        if not is_rate_limited(error) or attempt >= SCHEDULER_MAX_RETRIES:
+            return False
+        print(f"Rate limited by the {model} API, queueing the request again: {error}")
+        self.backoff(model)
+        return True
+
+    async def run(
+        self, model: str, tokens: float, call: Callable[[], Awaitable[T]]
+    ) -> T:
+        """
+        Schedule a request, queueing it again when the API answers 429.
+
+        Arguments:
+            model (str): The model of the request
+            tokens (float): Estimated tokens of the request
+            call (Callable[[], Awaitable[T]]): Sends the request
+
+        Returns:
+            T: The response
+        """
+        for attempt in itertools.count():
+            await self.acquire(model, tokens)
+            try:
+                return await call()
+            except Exception as e:
+                if not self.should_retry(model, e, attempt):
+                    raise
+
+    def run_sync(self, model: str, tokens: float, call: Callable[[], T]) -> T:
+        """
+        Blocking `run`, for code that does not run on an event loop.
+        """
+        for attempt in itertools.count():
+            self.acquire_sync(model, tokens)
+            try:
+                return call()
+            except Exception as e:
+                if not self.should_retry(model, e, attempt):
+                    raise
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Queue lengths and wait times, by model and priority.
+
+        Returns:
+            dict[str, Any]: e.g. {"chat.interactive": {"requests": 12, "wait_p95": 0.4, ...}, "queued": {...}}
+        """
+        with self._lock:
+            stats: dict[str, Any] = {
+                "queued": {model: len(queue) for model, queue in self._queues.items()}
+            }
+            for key, waits in self._waits.items():
+                ordered = sorted(waits)
+                stats[key] = {
+                    "requests": self._counts[key],
+                    "wait_mean": sum(ordered) / len(ordered),
+                    "wait_p95": ordered[
+                        min(len(ordered) - 1, int(len(ordered) * 0.95))
+                    ],
+                    "wait_max": ordered[-1],
+                }
+        return stats
+
+
+gemini_scheduler = RequestScheduler()
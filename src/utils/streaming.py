@@ -0,0 +1,106 @@
+import asyncio
+import os
+import re
+from collections.abc import AsyncGenerator, AsyncIterable
+from typing import Any
+
+# Typing speed of streamed text, 0 to show text as soon as it arrives
+STREAM_CHARS_PER_SECOND = float(os.environ.get("STREAM_CHARS_PER_SECOND", 300))
+# Pacing stops while more characters than this are waiting to be shown
+STREAM_MAX_BACKLOG = int(os.environ.get("STREAM_MAX_BACKLOG", 200))
+
+_CJK = "\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+# CJK text has no spaces, so it is split into runs of a few characters instead
+# of words. Status badges are kept whole so their markup is never shown.
+_CHUNK = re.compile(
+    rf":[\w-]+-badge\[[^\]\n]*\]\s*|[{_CJK}]{{1,3}}|[^\s{_CJK}]+\s*|\s+"
+)
+
+_DONE = object()
+
+
+def split_chunks(text: str) -> list[str]:
+    """
+    Split a text into word-sized chunks.
+
+    Arguments:
+        text (str): The text
+
+    Returns:
+        list[str]: The chunks, which join back into the text
+    """
+    return _CHUNK.findall(text)
+
+
+class StreamPacer:
+    """
+    Stream text in word-sized chunks at a steady pace.
+
+    The source is read in a background task as fast as it produces, so the
+    model is never held up by the pacing. Text is released chunk by chunk at
+    `chars_per_second`, waiting with `asyncio.sleep` so no thread is blocked.
+    While more than `max_backlog` characters are waiting, e.g. when a whole
+    answer arrives at once, chunks are released without waiting until the
+    display has caught up. Items that are not text are passed through in order.
+
+    Parameters:
+        chars_per_second (float): Typing speed, 0 to disable pacing.
+        max_backlog (int): Waiting characters above which pacing stops.
+    """
+
+    def __init__(
+        self,
+        chars_per_second: float = STREAM_CHARS_PER_SECOND,
+        max_backlog: int = STREAM_MAX_BACKLOG,
+    ) -> None:
+        self._chars_per_second = chars_per_second
+        self._max_backlog = max_backlog
+
+    async def stream(self, source: AsyncIterable[Any]) -> AsyncGenerator[Any, None]:
+        """
+        Pace the text items of a stream.
+
+        Arguments:
+            source (AsyncIterable[Any]): Text pieces, mixed with other items
+
+        Yields:
+            Any: Text chunks and the other items of the source, in order
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = 0
+
+        async def pump() -> None:
+            nonlocal backlog
+            try:
+                async for item in source:
+                    if isinstance(item, str):
+                        backlog += len(item)
+                    queue.put_nowait((item, None))
+            except Exception as e:
+                queue.put_nowait((_DONE, e))
+                return
+            queue.put_nowait((_DONE, None))
+
+        task = asyncio.create_task(pump())
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is _DONE:
+                    if error is not None:
+                        raise error
+                    return
+
+                if not isinstance(item, str):
+                    yield item
+                    continue
+
+                for chunk in split_chunks(item):
+                    yield chunk
+                    backlog -= len(chunk)
+                    if self._chars_per_second > 0 and backlog <= self._max_backlog:
+                        await asyncio.sleep(len(chunk) / self._chars_per_second)
+        finally:
+            task.cancel()
+
+
+stream_pacer = StreamPacer()
@@ -0,0 +1,426 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from asyncio import CancelledError
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+from uuid import uuid4
+
+# Comma-separated exporters of finished spans: "jsonl", "otlp" or "" to disable tracing
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", "")
+TRACE_PATH = os.environ.get("TRACE_PATH", "./.cache/traces.jsonl")
+# An OpenTelemetry collector accepting OTLP/HTTP JSON, e.g. `static/run_trace_collector.py`
+TRACE_OTLP_ENDPOINT = os.environ.get(
+    "TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces"
+)
+
+SERVICE_NAME = "pet-adoption-matching-agent"
+TOKEN_ATTRIBUTES = ("prompt_tokens", "completion_tokens")
+# OTLP span kinds, every stage of a turn runs inside the process
+_OTLP_KIND_INTERNAL = 1
+
+
+@dataclass
+class Span:
+    """
+    A timed stage of a turn, nested under the stage that started it.
+
+    Parameters:
+        name (str): What the stage does, e.g. "model.stream" or "tool.content_wordcloud".
+        kind (str): The kind of stage, e.g. "turn", "model", "tool", "agent", "embedding" or "render".
+        trace_id (str): Shared by every span of one turn.
+        span_id (str): Unique id of the span.
+        parent (Span | None): The enclosing span, None for the root of a trace.
+        attributes (dict[str, Any]): Details such as token counts.
+    """
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent: "Span | None" = field(default=None, repr=False)
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    start: float = field(default_factory=time.time)
+    end: float | None = None
+    _start_perf: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def parent_id(self) -> str | None:
+        return self.parent.span_id if self.parent else None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def set(self, **attributes: Any) -> None:
+        """
+        Set attributes of the span.
+        """
+        self.attributes.update(attributes)
+
+    def mark(self, name: str) -> None:
+        """
+        Record the seconds since the start of the span, the first time only.
+
+        Arguments:
+            name (str): The attribute, e.g. "first_token_s"
+        """
+        self.attributes.setdefault(name, time.perf_counter() - self._start_perf)
+
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """
+        Count tokens on the span and on every enclosing span, so a turn and
+        each sub-agent carry the total of the model calls they made.
+
+        Arguments:
+            prompt_tokens (int): Tokens sent to the model
+            completion_tokens (int): Tokens generated by the model
+        """
+        span = self
+        while span is not None:
+            for key, value in zip(
+                TOKEN_ATTRIBUTES, (prompt_tokens, completion_tokens), strict=True
+            ):
+                span.attributes[key] = span.attributes.get(key, 0) + value
+            span = span.parent
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Exporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+    def flush(self) -> None: ...
+
+
+class MemoryExporter:
+    """
+    Keep finished spans in a list, e.g. for tests.
+    """
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def flush(self) -> None:
+        pass
+
+
+class JsonlExporter:
+    """
+    Append finished spans to a JSON Lines file, one span per line.
+
+    Parameters:
+        path (str): The file. Defaults to `TRACE_PATH`.
+    """
+
+    def __init__(self, path: str = TRACE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def flush(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value: dict) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def _otlp_span(span: Span) -> dict:
+    status = {"code": 1} if span.status == "ok" else {"code": 2, "message": span.status}
+    attributes = {"span.kind": span.kind, **span.attributes}
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent_id or "",
+        "name": span.name,
+        "kind": _OTLP_KIND_INTERNAL,
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int((span.end or span.start) * 1e9)),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in attributes.items()
+        ],
+        "status": status,
+    }
+
+
+def to_otlp(spans: list[Span]) -> dict:
+    """
+    Convert spans to an OTLP/HTTP JSON export request.
+
+    Arguments:
+        spans (list[Span]): Finished spans
+
+    Returns:
+        dict: The request body
+    """
+    resource = {
+        "attributes": [{"key": "service.name", "value": _otlp_value(SERVICE_NAME)}]
+    }
+    return {
+        "resourceSpans": [
+            {
+                "resource": resource,
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [_otlp_span(span) for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def from_otlp(body: dict) -> list[dict]:
+    """
+    Convert an OTLP/HTTP JSON export request to span dicts, as written by `JsonlExporter`.
+
+    Arguments:
+        body (dict): The request body
+
+    Returns:
+        list[dict]: The spans
+    """
+    spans = []
+    for resource_spans in body.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for otlp in scope_spans.get("spans", []):
+                attributes = {
+                    attribute["key"]: _from_otlp_value(attribute["value"])
+                    for attribute in otlp.get("attributes", [])
+                }
+                start = int(otlp["startTimeUnixNano"]) / 1e9
+                end = int(otlp["endTimeUnixNano"]) / 1e9
+                status = otlp.get("status", {})
+                spans.append(
+                    {
+                        "trace_id": otlp["traceId"],
+                        "span_id": otlp["spanId"],
+                        "parent_id": otlp.get("parentSpanId") or None,
+                        "name": otlp["name"],
+                        "kind": attributes.pop("span.kind", "internal"),
+                        "start": start,
+                        "end": end,
+                        "duration": end - start,
+                        "status": status.get("message", "error")
+                        if status.get("code") == 2
+                        else "ok",
+                        "attributes": attributes,
+                    }
+                )
+    return spans
+
+
+class OtlpExporter:
+    """
+    Send finished spans to an OpenTelemetry collector over OTLP/HTTP JSON.
+
+    Spans are batched and posted by a background thread, so a slow or missing
+    collector never holds up a turn. Batches that cannot be delivered are dropped.
+
+    Parameters:
+        endpoint (str): The collector's traces endpoint. Defaults to `TRACE_OTLP_ENDPOINT`.
+        batch_size (int): Spans per request.
+        interval (float): Seconds to wait for a batch to fill up.
+        timeout (float): Seconds a request may take.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = TRACE_OTLP_ENDPOINT,
+        batch_size: int = 64,
+        interval: float = 1.0,
+        timeout: float = 5.0,
+    ) -> None:
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="otlp-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def flush(self) -> None:
+        """
+        Wait until every exported span has been sent or dropped.
+        """
+        self._queue.join()
+
+    def _post(self, spans: list[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(to_otlp(spans), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as e:
+            self.dropped += len(spans)
+            print(f"Failed to export {len(spans)} spans to {self.endpoint}: {e}")
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                    )
+                except queue.Empty:
+                    break
+            self._post(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+
+def create_exporters(export: str = TRACE_EXPORT) -> list[Exporter]:
+    """
+    Create the exporters named in a comma-separated list.
+
+    Arguments:
+        export (str): "jsonl", "otlp" or both. Defaults to `TRACE_EXPORT`.
+
+    Returns:
+        list[Exporter]: The exporters, empty to disable tracing
+    """
+    factories = {"jsonl": JsonlExporter, "otlp": OtlpExporter}
+    names = [name.strip().lower() for name in export.split(",") if name.strip()]
+    return [factories[name]() for name in names]
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Record nested, timed spans of the agent pipeline.
+
+    The current span is kept in a context variable, so spans opened in tasks
+    and `asyncio.to_thread` calls nest under the span that started them.
+    Finished spans are passed to every exporter, without exporters spans are
+    still timed but nothing is recorded.
+
+    Parameters:
+        exporters (list[Exporter] | None): Where finished spans go. Defaults to `create_exporters()`.
+    """
+
+    def __init__(self, exporters: list[Exporter] | None = None) -> None:
+        self.exporters = create_exporters() if exporters is None else exporters
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    @contextmanager
+    def span(
+        self, name: str, kind: str = "internal", **attributes: Any
+    ) -> Iterator[Span]:
+        """
+        Time a stage as a child of the current span.
+
+        Arguments:
+            name (str): What the stage does
+            kind (str): The kind of stage. Defaults to "internal".
+            **attributes (Any): Details of the stage
+
+        Yields:
+            Span: The span, to add attributes while the stage runs
+        """
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else uuid4().hex,
+            span_id=uuid4().hex[:16],
+            parent=parent,
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except (CancelledError, GeneratorExit):
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=repr(e))
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # An async generator closed from another context, e.g. by the
+                # garbage collector
+                _current_span.set(parent)
+            span.end = span.start + (time.perf_counter() - span._start_perf)
+            # A failing exporter must not fail, or mask the error of, the stage
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    print(f"Failed to export span {span.name} to {exporter!r}: {e!r}")
+
+    def flush(self) -> None:
+        """
+        Wait until every exporter has sent its spans.
+        """
+        for exporter in self.exporters:
+            exporter.flush()
+
+
+tracer = Tracer()
@@ -0,0 +1,231 @@
+import importlib
+import os
+import threading
+import time
+from collections.abc import Callable
+
+# Stages run at process start, in order. Set to "" to disable the warm-up.
+WARMUP_STEPS = tuple(
+    step.strip()
+    for step in os.environ.get(
+        "WARMUP_STEPS", "imports,translations,agents,retrieval,pets,ckip"
+    ).split(",")
+    if step.strip()
+)
+# Also answer a synthetic search and draw a word cloud. The search calls the
+# Gemini embedding API, so it is off by default.
+WARMUP_SYNTHETIC = os.environ.get("WARMUP_SYNTHETIC", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Imported on first use by the tools, slowest first
+HEAVY_MODULES = (
+    "torch",
+    "ckip_transformers.nlp",
+    "google.genai",
+    "pandas",
+    "wordcloud",
+    "PIL.Image",
+)
+
+SYNTHETIC_QUERY = "適合新手的親人貓咪"
+SYNTHETIC_TEXTS = ["這隻貓咪很親人，已經結紮也打過預防針，希望找到愛牠的新家。"]
+
+
+def import_heavy_modules(modules: tuple[str, ...] = HEAVY_MODULES) -> dict[str, float]:
+    """
+    Import the modules the tools load lazily, so their first call does not wait for them.
+
+    Arguments:
+        modules (tuple[str, ...]): The modules to import. Defaults to `HEAVY_MODULES`.
+
+    Returns:
+        dict[str, float]: Seconds spent importing each module, 0 for ones already imported
+    """
+    import_times = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Warm-up could not import {name}: {e!r}")
+            continue
+        import_times[name] = time.perf_counter() - start
+
+    return import_times
+
+
+def warm_translations() -> None:
+    from utils.i18n import i18n
+
+    i18n.preload()
+
+
+def warm_agents() -> None:
+    from utils.bots.agent_pool import agent_pool
+    from utils.function_call.embeddings import get_genai_client
+
+    # The model client, prompt files and tool schemas, and the embedding client
+    agent_pool.warm_up()
+    get_genai_client()
+
+
+def warm_retrieval() -> None:
+    from utils.function_call.retrieval import load_article_index
+
+    load_article_index()
+
+
+def warm_pets() -> None:
+    from utils.function_call.matching import load_compatibility_engine
+
+    # Loads the pet records and encodes them for scoring
+    load_compatibility_engine()
+
+
+def warm_ckip() -> None:
+    from utils.function_call.wordcloud import cpu_optimized_default, get_ckip_drivers
+
+    get_ckip_drivers(cpu_optimized_default())
+
+
+def warm_synthetic() -> None:
+    from utils.function_call import query_top_k_match_contents
+    from utils.function_call.wordcloud import build_word_freq_dict, render_wordcloud
+
+    query_top_k_match_contents(SYNTHETIC_QUERY, k=5)
+    # Rendered without the render cache, which should only hold users' images
+    render_wordcloud(build_word_freq_dict(SYNTHETIC_TEXTS))
+
+
+STEPS: dict[str, Callable[[], object]] = {
+    "imports": import_heavy_modules,
+    "translations": warm_translations,
+    "agents": warm_agents,
+    "retrieval": warm_retrieval,
+    "pets": warm_pets,
+    "ckip": warm_ckip,
+    "synthetic": warm_synthetic,
+}
+
+
+class WarmUp:
+    """
+    Load everything the first user would otherwise wait for, once per process.
+
+    The API runs it before accepting requests, the Streamlit app in a
+    background thread while the first page renders. A failed stage is
+    reported but does not stop the others, what it loads is then loaded on
+    first use as usual.
+
+    Parameters:
+        steps (tuple[str, ...]): Keys of `STEPS` to run, in order. Defaults to `WARMUP_STEPS`.
+        synthetic (bool): Also run the "synthetic" stage. Defaults to `WARMUP_SYNTHETIC`.
+    """
+
+    def __init__(
+        self,
+        steps: tuple[str, ...] = WARMUP_STEPS,
+        synthetic: bool = WARMUP_SYNTHETIC,
+    ) -> None:
+        unknown = [step for step in steps if step not in STEPS]
+        if unknown:
+            raise ValueError(f"Unknown warm-up steps: {', '.join(unknown)}")
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._started = False
+        self.steps = steps + (("synthetic",) if synthetic else ())
+        # Seconds taken by each finished stage, and the error of each failed one
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the warm-up has finished, and the process answers at steady-state speed.
+        """
+        return self._ready.is_set()
+
+    def _claim(self) -> bool:
+        # Only the first call of `run` or `start` runs the stages
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def _run_steps(self) -> None:
+        for step in self.steps:
+            start = time.perf_counter()
+            try:
+                STEPS[step]()
+            except Exception as e:
+                self.errors[step] = repr(e)
+                print(f"Warm-up step {step} failed: {e!r}")
+            else:
+                self.timings[step] = time.perf_counter() - start
+
+        if self.timings:
+            print(
+                "Warm-up finished: "
+                + ", ".join(
+                    f"{step} {secs:.2f}s" for step, secs in self.timings.items()
+                )
+            )
+        self._ready.set()
+
+    def run(self) -> bool:
+        """
+        Run the warm-up stages, or wait for the run already in progress.
+
+        Returns:
+            bool: Whether every stage succeeded
+        """
+        if self._claim():
+            self._run_steps()
+        else:
+            self._ready.wait()
+        return not self.errors
+
+    def start(self) -> bool:
+        """
+        Run the warm-up in a daemon thread.
+
+        Returns:
+            bool: Whether the thread was started by this call
+        """
+        if not self._claim():
+            return False
+        threading.Thread(target=self._run_steps, name="warmup", daemon=True).start()
+        return True
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait for the warm-up to finish.
+
+        Arguments:
+            timeout (float | None): Seconds to wait at most. Defaults to no limit.
+
+        Returns:
+            bool: Whether it has finished
+        """
+        return self._ready.wait(timeout)
+
+    def status(self) -> dict:
+        """
+        Report the warm-up for health checks.
+
+        Returns:
+            dict: Whether it is ready, the stages run so far and the failed ones
+        """
+        return {
+            "ready": self.ready,
+            "steps": {step: round(secs, 3) for step, secs in self.timings.items()},
+            "errors": dict(self.errors),
+        }
+
+
+warmup = WarmUp()
@@ -0,0 +1,126 @@
+import json
+from functools import partial
+
+import pytest
+from autogen_core.tools import FunctionTool
+from pytest_mock import MockFixture
+from starlette.testclient import TestClient
+
+from api_app import app
+from utils.bots.agent_pool import agent_pool
+from utils.bots.model_client import SharedModelClient, create_model_client
+from utils.bots.sessions import MemorySessionStore, SessionManager
+from utils.function_call import content_wordcloud
+from utils.mock_llm import MOCK_ANSWER, MockLLMServer
+from utils.warmup import WarmUp
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def client(mocker: MockFixture):
+    mocker.patch("api_app.SEMANTIC_CACHE_ENABLED", False)
+    mocker.patch("api_app.RETRIEVAL_PREFETCH", False)
+    mocker.patch("api_app.session_manager", SessionManager(MemorySessionStore()))
+    # The tests do not need the CKIP models or the article index
+    mocker.patch("api_app.warmup", WarmUp(steps=("translations",)))
+
+    with MockLLMServer() as server:
+        agent_pool.model_client = SharedModelClient(
+            partial(create_model_client, base_url=server.base_url, api_key="mock"),
+            scheduler=None,
+        )
+        try:
+            with TestClient(app) as client:
+                yield client
+        finally:
+            agent_pool.model_client = None
+
+
+def test_chat_streams_events(client: TestClient) -> None:
+    response = client.post("/sessions", json={"lang": "zh-TW"})
+    assert response.status_code == 201
+    session_id = response.json()["session_id"]
+    assert response.json()["lang"] == "zh-TW"
+
+    response = client.post(
+        f"/sessions/{session_id}/messages",
+        json={"message": "How much does a cat cost per year?"},
+    )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    types = [event for event, _ in events]
+    assert types[-1] == "done"
+    assert "tool_call" in types and "tool_result" in types
+    call = next(data for event, data in events if event == "tool_call")
+    assert call["name"] == "budget_assistant"
+    # Labels are translated into the language of the session
+    assert "budget_assistant" in call["label"] and "呼叫" in call["label"]
+    text = "".join(data["text"] for event, data in events if event == "text")
+    assert MOCK_ANSWER.strip() in text
+
+
+def test_unknown_sessions_and_bad_requests(client: TestClient) -> None:
+    assert client.get("/health").json()["status"] == "ok"
+    assert (
+        client.post("/sessions/nope/messages", json={"message": "hi"}).status_code
+        == 404
+    )
+    session_id = client.post("/sessions").json()["session_id"]
+    assert client.post(f"/sessions/{session_id}/messages", json={}).status_code == 400
+    assert client.delete(f"/sessions/{session_id}").status_code == 204
+    assert client.get("/retrieval").status_code == 400
+    for k in ("0", "-3", "51", "ten"):
+        assert (
+            client.get("/retrieval", params={"query": "貓", "k": k}).status_code == 400
+        )
+    assert client.post("/wordcloud", json={"contents": "text"}).status_code == 400
+    assert client.get("/wordcloud/missing.webp").status_code == 404
+
+
+def test_retrieval(client: TestClient, mocker: MockFixture) -> None:
+    search = mocker.patch(
+        "api_app.query_top_k_match_contents",
+        return_value=[{"id": 3, "title": "橘貓", "similarity": 0.9}],
+    )
+
+    response = client.get("/retrieval", params={"query": "親人的貓", "k": 3})
+
+    assert response.json()["results"][0]["title"] == "橘貓"
+    search.assert_called_once_with("親人的貓", 3)
+
+
+def test_wordcloud_for_display_width(client: TestClient, mocker: MockFixture) -> None:
+    draw = mocker.patch(
+        "api_app.draw_content_wordcloud", return_value="wordcloud://abc.webp"
+    )
+
+    response = client.post(
+        "/wordcloud", json={"contents": ["橘貓"], "width": 360, "dpr": 2}
+    )
+
+    assert response.json() == {"url": "/wordcloud/abc.webp"}
+    draw.assert_called_once_with(["橘貓"], "accurate", "standard")
+    # The profile is the client's to pick, not the model's
+    assert (
+        "profile"
+        not in FunctionTool(content_wordcloud, "").schema["parameters"]["properties"]
+    )
+    assert (
+        client.post(
+            "/wordcloud", json={"contents": ["橘貓"], "width": "wide"}
+        ).status_code
+        == 400
+    )
+
+
+def test_wordcloud_image_rejects_paths(client: TestClient) -> None:
+    assert client.get("/wordcloud/..%2F..%2Fsessions.db").status_code == 404
+    assert client.get(f"/wordcloud/{'0' * 64}.html").status_code == 404
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import ToolCallExecutionEvent
+from autogen_agentchat.tools import AgentTool
+from autogen_core.models import FunctionExecutionResult
+from autogen_ext.models.replay import ReplayChatCompletionClient
+from pytest_mock import MockFixture
+
+from utils.bots.cached_tool import (
+    CachedAgentTool,
+    CachedTaskArgs,
+    is_error,
+    normalize_task,
+    response_cache,
+    session_language,
+)
+from utils.cache import SingleFlight, TTLCache
+
+
+def test_ttl_cache_expiry(mocker: MockFixture) -> None:
+    now = 1000.0
+    mocker.patch("utils.cache.time.monotonic", side_effect=lambda: now)
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    now += 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_lru_eviction() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_single_flight_across_threads() -> None:
+    flight = SingleFlight()
+    calls = 0
+
+    async def slow_call() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return "answer"
+
+    def run_in_new_loop(_) -> str:
+        return asyncio.run(flight.run("key", slow_call))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(run_in_new_loop, i) for i in range(4)]
+        time.sleep(0.05)
+        results = [future.result() for future in futures]
+
+    assert results == ["answer"] * 4
+    assert calls == 1
+
+
+def test_single_flight_error() -> None:
+    async def failing_call():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(SingleFlight().run("key", failing_call))
+
+
+def test_normalize_task() -> None:
+    assert normalize_task("  養貓，每個月要花多少錢？ ") == normalize_task(
+        "養貓 每個月要花多少錢"
+    )
+    assert normalize_task("Monthly COST of a Cat?") == "monthly cost of a cat"
+
+
+def test_cached_agent_tool() -> None:
+    response_cache.clear()
+    model_client = ReplayChatCompletionClient(["每月約 3000 元", "每月約 3500 元"])
+    agent = AssistantAgent("budget_assistant", model_client=model_client)
+    tool = CachedAgentTool(agent, version="v1")
+
+    assert "use_cache" in tool.schema["parameters"]["properties"]
+
+    async def ask(task: str, use_cache: bool = True) -> str:
+        result = await tool.run_json(
+            CachedTaskArgs(task=task, use_cache=use_cache).model_dump(), None
+        )
+        return tool.return_value_as_string(result)
+
+    first = asyncio.run(ask("養一隻貓每個月要多少錢？"))
+    cached = asyncio.run(ask("養一隻貓每個月要多少錢"))
+    fresh = asyncio.run(ask("養一隻貓每個月要多少錢", use_cache=False))
+
+    assert "3000" in first
+    assert cached == first
+    assert "3500" in fresh
+
+
+def test_cached_agent_tool_session_language() -> None:
+    response_cache.clear()
+    model_client = ReplayChatCompletionClient(["每月約 3000 元", "About 3000 a month"])
+    agent = AssistantAgent("budget_assistant", model_client=model_client)
+    tool = CachedAgentTool(agent, version="v1")
+
+    async def ask(lang: str) -> str:
+        with session_language(lang):
+            result = await tool.run_json(
+                CachedTaskArgs(task="養貓的花費").model_dump(), None
+            )
+        return tool.return_value_as_string(result)
+
+    # Sessions in different languages do not share answers, whatever the UI language
+    assert "3000 元" in asyncio.run(ask("zh-TW"))
+    assert "a month" in asyncio.run(ask("en"))
+    assert "3000 元" in asyncio.run(ask("zh-TW"))
+
+
+def test_cached_agent_tool_skips_errors(mocker: MockFixture) -> None:
+    response_cache.clear()
+    failed = TaskResult(
+        messages=[
+            ToolCallExecutionEvent(
+                source="budget_assistant",
+                content=[
+                    FunctionExecutionResult(
+                        content="timeout", name="search", call_id="1", is_error=True
+                    )
+                ],
+            )
+        ]
+    )
+    run = mocker.patch.object(AgentTool, "run", return_value=failed)
+    agent = AssistantAgent(
+        "budget_assistant", model_client=ReplayChatCompletionClient([])
+    )
+    tool = CachedAgentTool(agent, version="v1")
+
+    for _ in range(2):
+        asyncio.run(tool.run(CachedTaskArgs(task="養貓的花費"), None))
+
+    # The failed run is not served to the next caller
+    assert is_error(failed)
+    assert run.call_count == 2
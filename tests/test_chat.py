@@ -9,9 +9,6 @@ from streamlit.testing.v1 import AppTest
 
 
 def test_chat(mocker: MockFixture) -> None:
-    # Avoid 429 Too Many Requests error
-    time.sleep(60)
-
     # patch the property on the class
     mocker.patch.object(
         type(st.context), "locale", new_callable=PropertyMock, return_value="en"
@@ -41,9 +38,6 @@ def test_chat(mocker: MockFixture) -> None:
 
 @pytest.mark.timeout(180 + 60)
 def test_chat_autogen(mocker: MockFixture) -> None:
-    # Avoid 429 Too Many Requests error
-    time.sleep(60)
-
     # patch the property on the class
     mocker.patch.object(
         type(st.context), "locale", new_callable=PropertyMock, return_value="en"
@@ -62,8 +56,6 @@ def test_chat_autogen(mocker: MockFixture) -> None:
     assert len(at.chat_message) >= 2
     assert at.chat_message[1].children[0].value == prompt
 
-    # Avoid 429 Too Many Requests error
-    time.sleep(60)
     # check history print
     prompt = "請根據我的需求整理一下預算和照護的建議。"
     at.chat_input(key="chat_bot").set_value(prompt).run()
@@ -75,9 +67,6 @@ def test_chat_autogen(mocker: MockFixture) -> None:
 
 @pytest.mark.timeout(180 + 60)
 def test_chat_autogen_word_cloud(mocker: MockFixture) -> None:
-    # Avoid 429 Too Many Requests error
-    time.sleep(60)
-
     # patch the property on the class
     mocker.patch.object(
         type(st.context), "locale", new_callable=PropertyMock, return_value="en"
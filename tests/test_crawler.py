@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from utils.function_call.crawler import (
+    CrawlCache,
+    DcardCrawler,
+    merge_articles,
+    parse_article,
+    parse_post_links,
+)
+
+# The posts the original crawler collected, served by the fixture server
+POSTS = json.loads(
+    (Path(__file__).parents[1] / "dcard_article_urls.json").read_text(encoding="utf-8")
+)
+TOPIC_PATH = "/topics/%E9%80%81%E9%A4%8A"
+
+
+def post_page(title: str, content: str) -> str:
+    post = {
+        "@context": "https://schema.org",
+        "@type": "DiscussionForumPosting",
+        "headline": title,
+        "articleBody": content,
+        "author": {"@type": "Person", "name": "國立臺灣大學"},
+        "datePublished": "2025-05-01T08:00:00.000Z",
+    }
+    return (
+        f"<html><head><title>{title} - 寵物板 | Dcard</title>"
+        f'<meta property="og:title" content="{title}">'
+        f'<script type="application/ld+json">{json.dumps(post, ensure_ascii=False)}</script>'
+        f"</head><body><h1>{title}</h1><article><p>{content}</p></article></body></html>"
+    )
+
+
+def topic_page(posts: list[list[str]]) -> str:
+    links = "".join(
+        f'<a href="{url.removeprefix("https://www.dcard.tw")}?ref=topic">{title}</a>'
+        f'<a href="{url.removeprefix("https://www.dcard.tw")}#comments">留言</a>'
+        for title, url in posts
+    )
+    return f'<html><body><a href="/f/pet">寵物板</a>{links}</body></html>'
+
+
+class FixtureServer:
+    """
+    A stand-in for Dcard serving recorded pages, with ETags, a slow response
+    and a 429 on request.
+    """
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.pages = {TOPIC_PATH: topic_page(POSTS)}
+        for i, (title, url) in enumerate(POSTS):
+            self.pages[url.removeprefix("https://www.dcard.tw")] = post_page(
+                title, f"{title}\n年齡：約{i + 1}個月\n地區：台中市"
+            )
+        self.throttle: set[str] = set()
+        self.lock = threading.Lock()
+        self.statuses: list[int] = []
+        self.starts: list[float] = []
+        self.connections: set[int] = set()
+        self.in_flight = self.max_in_flight = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                with server.lock:
+                    server.starts.append(time.monotonic())
+                    server.connections.add(self.client_address[1])
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    self.respond()
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def respond(self) -> None:
+                path = self.path.split("?")[0]
+                if path in server.throttle:
+                    server.throttle.discard(path)
+                    return self.send(429, b"", {"Retry-After": "0"})
+                if (page := server.pages.get(path)) is None:
+                    return self.send(404, b"not found")
+                body = page.encode()
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304, b"", {"ETag": etag})
+                self.send(200, body, {"ETag": etag, "Content-Type": "text/html"})
+
+            def send(
+                self, status: int, body: bytes, headers: dict | None = None
+            ) -> None:
+                with server.lock:
+                    server.statuses.append(status)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def url(self, dcard_url: str) -> str:
+        return dcard_url.replace("https://www.dcard.tw", self.base)
+
+
+@pytest.fixture
+def server() -> Iterator[FixtureServer]:
+    server = FixtureServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+def crawl(server: FixtureServer, crawler: DcardCrawler) -> list[dict]:
+    async def run() -> list[dict]:
+        async with crawler:
+            posts = await crawler.crawl_post_urls(server.base + TOPIC_PATH, limit=100)
+            return await crawler.crawl_articles([url for _, url in posts])
+
+    return asyncio.run(run())
+
+
+def test_parse_article() -> None:
+    article = parse_article(post_page("高雄橘貓送養", "很親人\n\n\n已結紮"), "u")
+
+    assert article == {
+        "url": "u",
+        "title": "高雄橘貓送養",
+        "author": "國立臺灣大學",
+        "createdAt": "2025-05-01T08:00:00.000Z",
+        "content": "很親人\n\n已結紮",
+    }
+    # Without JSON-LD, the heading, <time> and <article> are read
+    fallback = parse_article(
+        '<h1>送養 黑貓</h1><time datetime="2025-05-02">5月2日</time>'
+        "<article><p>兩歲</p><p>台北市</p></article>",
+        "u",
+    )
+    assert fallback["title"] == "送養 黑貓"
+    assert fallback["createdAt"] == "2025-05-02"
+    assert fallback["content"] == "兩歲\n台北市"
+    assert parse_article("<html><body></body></html>", "u") is None
+
+
+def test_parse_post_links() -> None:
+    links = parse_post_links(topic_page(POSTS[:2]), "https://www.dcard.tw" + TOPIC_PATH)
+
+    # Other pages and duplicate links to a post are left out
+    assert links == [tuple(post) for post in POSTS[:2]]
+
+
+def test_crawl_concurrently(server: FixtureServer) -> None:
+    crawler = DcardCrawler(concurrency=3, host_interval=0)
+
+    articles = crawl(server, crawler)
+
+    assert [a["title"] for a in articles] == [title for title, _ in POSTS]
+    assert articles[0]["url"] == server.url(POSTS[0][1])
+    assert "地區：台中市" in articles[0]["content"]
+    # Requests overlap but stay within the limit, over pooled connections
+    assert 1 < server.max_in_flight <= 3
+    assert len(server.connections) <= 3
+    assert crawler.stats == {"fetched": len(POSTS) + 1, "not_modified": 0, "failed": 0}
+
+
+def test_conditional_requests(server: FixtureServer, tmp_path) -> None:
+    cache = CrawlCache(str(tmp_path / "crawler.db"))
+    first = crawl(server, DcardCrawler(cache, host_interval=0))
+    edited = POSTS[0][1].removeprefix("https://www.dcard.tw")
+    server.pages[edited] = post_page(POSTS[0][0], "已送養，謝謝大家")
+    server.statuses.clear()
+
+    crawler = DcardCrawler(cache, host_interval=0)
+    second = crawl(server, crawler)
+
+    # The topic page and the unchanged posts answer 304 and are served from the cache
+    assert server.statuses.count(304) == len(POSTS)
+    assert crawler.stats == {"fetched": 1, "not_modified": len(POSTS), "failed": 0}
+    assert second[0]["content"] == "已送養，謝謝大家"
+    assert second[1:] == first[1:]
+
+
+def test_host_rate_limit_and_retry(server: FixtureServer) -> None:
+    server.delay = 0
+    server.throttle.add(POSTS[0][1].removeprefix("https://www.dcard.tw"))
+    crawler = DcardCrawler(concurrency=4, host_interval=0.05)
+
+    async def run() -> list[dict]:
+        async with crawler:
+            return await crawler.crawl_articles(
+                [server.url(url) for _, url in POSTS[:3]] + [server.base + "/f/pet/p/1"]
+            )
+
+    articles = asyncio.run(run())
+
+    # The 429 is retried, the missing page is left out
+    assert [a["title"] for a in articles] == [title for title, _ in POSTS[:3]]
+    assert server.statuses.count(429) == 1 and crawler.stats["failed"] == 1
+    gaps = [b - a for a, b in zip(server.starts, server.starts[1:], strict=False)]
+    assert min(gaps) >= 0.045
+
+
+def test_merge_articles(tmp_path) -> None:
+    path = tmp_path / "articles.csv"
+    pd.DataFrame(
+        [
+            {
+                "url": "a",
+                "title": "A",
+                "author": "",
+                "createdAt": "",
+                "content": "舊",
+                "vectorize": "[1.0]",
+            },
+            {
+                "url": "b",
+                "title": "B",
+                "author": "",
+                "createdAt": "",
+                "content": "不變",
+                "vectorize": "[2.0]",
+            },
+        ]
+    ).to_csv(path, index=False)
+    articles = [
+        {"url": "a", "title": "A", "author": "", "createdAt": "", "content": "新"},
+        {"url": "b", "title": "B", "author": "", "createdAt": "", "content": "不變"},
+        {"url": "c", "title": "C", "author": "", "createdAt": "", "content": "新文章"},
+    ]
+
+    counts = merge_articles(articles, str(path))
+
+    df = pd.read_csv(path)
+    assert counts == {"added": 1, "updated": 1, "unchanged": 1}
+    assert df["content"].tolist() == ["新", "不變", "新文章"]
+    # The edited and new posts are embedded again, the unchanged one keeps its vector
+    assert df["vectorize"].isna().tolist() == [True, False, True]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from autogen_ext.models.replay import ReplayChatCompletionClient
+from pytest_mock import MockFixture
+
+from utils.function_call import pet_records
+from utils.function_call.extraction import (
+    ExtractionCache,
+    extract_pets,
+    parse_model_records,
+    rule_extract,
+    save_extracted_pets,
+)
+from utils.function_call.pet_records import load_pet_store
+
+COMPLETE = {
+    "url": "https://www.dcard.tw/f/pet/p/1",
+    "title": "【送養】親人橘貓",
+    "content": "品種：米克斯\n年齡：約2歲\n地區：台中市北屯區\n已結紮，很親人。希望領養人家人同意。",
+}
+INCOMPLETE = {
+    "url": "https://www.dcard.tw/f/pet/p/2",
+    "title": "撿到小狗",
+    "content": "在路邊撿到一隻小狗，很活潑，有興趣請私訊。",
+}
+MODEL_ANSWER = json.dumps(
+    [{"index": 0, "animal_type": "dog", "age": "約3個月", "location": "高雄市"}],
+    ensure_ascii=False,
+)
+
+
+def test_rule_extract() -> None:
+    record = rule_extract(COMPLETE["title"], COMPLETE["content"])
+
+    assert record["animal_type"] == "cat"
+    assert record["animal_species"] == "米克斯"
+    assert record["age"] == "約2歲"
+    assert record["location"] == "台中市北屯區"
+    assert record["health_info"] == ["已結紮"]
+    assert record["animal_characteristic_tags"] == ["親人"]
+    assert record["adopt_requirements"] == ["希望領養人家人同意"]
+
+    record = rule_extract(INCOMPLETE["title"], INCOMPLETE["content"])
+    assert record["animal_type"] == "dog" and "location" not in record
+
+
+def test_parse_model_records() -> None:
+    records = parse_model_records(f"```json\n{MODEL_ANSWER}\n```")
+
+    assert records == {
+        0: {"animal_type": "dog", "age": "約3個月", "location": "高雄市"}
+    }
+
+
+def test_only_incomplete_articles_reach_the_model(tmp_path) -> None:
+    cache = ExtractionCache(str(tmp_path / "extraction.db"))
+    model_client = ReplayChatCompletionClient([MODEL_ANSWER])
+
+    records, stats = asyncio.run(
+        extract_pets([COMPLETE, INCOMPLETE], model_client, cache)
+    )
+
+    assert stats == {"cached": 0, "rules": 1, "model": 1, "incomplete": 0}
+    assert len(model_client.create_calls) == 1
+    assert "撿到小狗" in model_client.create_calls[0]["messages"][1].content
+    assert "親人橘貓" not in model_client.create_calls[0]["messages"][1].content
+    # What the rules found is kept, the model fills the gaps
+    assert records[1]["animal_type"] == "dog"
+    assert records[1]["animal_characteristic_tags"] == ["活潑"]
+    assert records[1]["location"] == "高雄市"
+    assert records[1]["url"] == INCOMPLETE["url"]
+
+    # A second run is answered from the cache, without the model
+    records_again, stats = asyncio.run(
+        extract_pets([COMPLETE, INCOMPLETE], None, cache)
+    )
+    assert stats == {"cached": 2, "rules": 0, "model": 0, "incomplete": 0}
+    assert records_again == records
+
+
+def test_model_failure_keeps_rule_records(tmp_path) -> None:
+    cache = ExtractionCache(str(tmp_path / "extraction.db"))
+    model_client = ReplayChatCompletionClient(["not json"])
+
+    records, stats = asyncio.run(extract_pets([INCOMPLETE], model_client, cache))
+
+    assert stats["incomplete"] == 1
+    assert records[0]["animal_type"] == "dog"
+    # Not cached, so the next run tries again
+    _, stats = asyncio.run(extract_pets([INCOMPLETE], None, cache))
+    assert stats["cached"] == 0
+
+
+def test_extracted_pets_join_the_store(tmp_path, mocker: MockFixture) -> None:
+    info_path = tmp_path / "animal_info.json"
+    info_path.write_text(json.dumps([{"animal_type": "cat"}]), encoding="utf-8")
+    extracted_path = tmp_path / "extracted_pets.json"
+    mocker.patch.object(pet_records, "PET_INFO_PATH", str(info_path))
+    mocker.patch.object(pet_records, "EXTRACTED_PETS_PATH", str(extracted_path))
+    mocker.patch.object(pet_records, "_store", None)
+    assert len(load_pet_store()) == 1
+
+    record = rule_extract(COMPLETE["title"], COMPLETE["content"])
+    count = save_extracted_pets(
+        [record | {"url": COMPLETE["url"]}, {}], str(extracted_path)
+    )
+
+    store = load_pet_store()
+    assert count == 1 and len(store) == 2
+    assert [r.url for r in store.find(location="台中")] == [COMPLETE["url"]]
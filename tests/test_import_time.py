@@ -0,0 +1,45 @@
+import pytest
+
+from static.run_import_report import (
+    first_paint_seconds,
+    heavy_imports,
+    measure_imports,
+    parse_importtime,
+    slowest_imports,
+)
+from static.run_trace_report import format_table
+
+
+def test_parse_importtime() -> None:
+    imports = parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     numpy.core\n"
+        "import time:      2000 |       2120 |   numpy\n"
+        "import time:        80 |       2200 | app\n"
+    )
+
+    assert [entry["module"] for entry in imports] == ["numpy.core", "numpy", "app"]
+    assert imports[1]["cumulative_s"] == pytest.approx(0.00212)
+    assert [entry["depth"] for entry in imports] == [2, 1, 0]
+    assert [entry["module"] for entry in slowest_imports(imports, depth=1)] == [
+        "app",
+        "numpy",
+    ]
+
+
+@pytest.mark.performance
+@pytest.mark.timeout(300)
+def test_cold_start(record_property) -> None:
+    imports = measure_imports("pages.pets_autogen")
+    page = next(entry for entry in imports if entry["module"] == "pages.pets_autogen")
+    print(f"\nImporting the chat page took {page['cumulative_s']:.3f}s")
+    print(format_table(slowest_imports(imports, top=10)))
+
+    first_paint = first_paint_seconds()
+    print(f"First paint: {first_paint:.3f}s")
+    record_property("page_import_s", page["cumulative_s"])
+    record_property("first_paint_s", first_paint)
+
+    # torch, CKIP, pandas and the Gemini SDK load on first use
+    assert heavy_imports(imports) == []
+    assert page["cumulative_s"] < 5
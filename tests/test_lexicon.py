@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from utils.function_call.lexicon import UNKNOWN_TAG, Lexicon
+
+
+@pytest.fixture
+def sample_lexicon() -> Lexicon:
+    lexicon = Lexicon()
+    lexicon.update(
+        ["我", "想", "領養", "一", "隻", "親人", "的", "橘貓"],
+        ["Nh", "VE", "VC", "Neu", "Nf", "VH", "DE", "Na"],
+    )
+    lexicon.update(["橘貓", "很", "親人"], ["Na", "Dfa", "VH"])
+    lexicon.update(["領養", "貓咪"], ["VC", "Na"])
+    return lexicon
+
+
+def test_segment_known_words(sample_lexicon: Lexicon) -> None:
+    assert sample_lexicon.segment("我想領養親人的橘貓") == [
+        "我",
+        "想",
+        "領養",
+        "親人",
+        "的",
+        "橘貓",
+    ]
+
+
+def test_segment_unknown_characters(sample_lexicon: Lexicon) -> None:
+    assert sample_lexicon.segment("領養狗狗") == ["領養", "狗", "狗"]
+    assert sample_lexicon.segment("") == []
+
+
+def test_tokenize_tags(sample_lexicon: Lexicon) -> None:
+    tokens, tags = sample_lexicon.tokenize(["領養橘貓", "汪汪"])
+
+    assert tokens == [["領養", "橘貓"], ["汪", "汪"]]
+    assert tags == [["VC", "Na"], [UNKNOWN_TAG, UNKNOWN_TAG]]
+
+
+def test_save_and_load(sample_lexicon: Lexicon, tmp_path) -> None:
+    path = tmp_path / "lexicon.json"
+    sample_lexicon.save(str(path))
+
+    loaded = Lexicon(str(path))
+
+    assert len(loaded) == len(sample_lexicon)
+    assert loaded.tag("親人") == "VH"
+    assert loaded.segment("我想領養親人的橘貓") == sample_lexicon.segment(
+        "我想領養親人的橘貓"
+    )
+
+
+def test_save_without_path(sample_lexicon: Lexicon) -> None:
+    with pytest.raises(ValueError):
+        sample_lexicon.save()
+
+
+def test_save_if_due(tmp_path) -> None:
+    path = tmp_path / "lexicon.json"
+    lexicon = Lexicon(str(path))
+
+    # Nothing changed, nothing is written
+    assert not lexicon.save_if_due(interval=0)
+    lexicon.update(["橘貓"], ["Na"])
+    # Changed but saved too recently
+    assert lexicon.dirty and not lexicon.save_if_due(interval=60)
+    assert lexicon.save_if_due(interval=0)
+    assert not lexicon.dirty and Lexicon(str(path)).tag("橘貓") == "Na"
+
+
+def test_concurrent_saves(sample_lexicon: Lexicon, tmp_path) -> None:
+    path = tmp_path / "lexicon.json"
+
+    threads = [
+        threading.Thread(target=sample_lexicon.save, args=(str(path),))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every save went through its own temporary file, none is left behind
+    assert len(Lexicon(str(path))) == len(sample_lexicon)
+    assert [p.name for p in tmp_path.iterdir()] == ["lexicon.json"]
+
+
+@pytest.mark.performance
+def test_fast_tokenizer_throughput(sample_lexicon: Lexicon) -> None:
+    posts = ["我想領養親人的橘貓，橘貓很親人，領養貓咪" * 15] * 1000
+
+    start = time.perf_counter()
+    sample_lexicon.tokenize(posts)
+    elapsed = time.perf_counter() - start
+
+    # Thousands of posts per second on one core
+    assert len(posts) / elapsed > 1000
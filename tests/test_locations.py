@@ -0,0 +1,159 @@
+import json
+import math
+import time
+
+import pandas as pd
+import pytest
+from pytest_mock import MockFixture
+
+from utils.function_call import retrieval
+from utils.function_call.locations import (
+    MAX_NEARBY_RADIUS_KM,
+    GridIndex,
+    clamp_radius,
+    distance_km,
+    normalize_location,
+)
+from utils.function_call.matching import AdopterProfile, CompatibilityEngine
+from utils.function_call.pet_records import PetStore
+from utils.function_call.retrieval import search_contents
+
+RECORDS = [
+    {
+        "animal_type": "cat",
+        "animal_name": "泰山",
+        "location": "新北泰山，靠近桃園龜山.林口",
+    },
+    {"animal_type": "cat", "animal_name": "土城", "location": "新北市土城區"},
+    {"animal_type": "cat", "animal_name": "台中", "location": "台中市"},
+    {"animal_type": "cat", "animal_name": "學校", "location": "學校附近"},
+    {"animal_type": "cat", "animal_name": "南投", "location": "南投市靠台中"},
+]
+
+
+@pytest.mark.parametrize(
+    ("text", "name"),
+    [
+        ("新北泰山，靠近桃園龜山.林口", "新北市泰山區"),
+        ("臺北市大安區", "台北市大安區"),
+        ("台中北屯", "台中市北屯區"),
+        # The first place named wins
+        ("南投市靠台中", "南投市"),
+        # The longer name is matched, not 嘉義市
+        ("嘉義縣", "嘉義縣"),
+        ("竹北", "新竹縣竹北市"),
+        ("學校附近", None),
+    ],
+)
+def test_normalize_location(text: str, name: str | None) -> None:
+    region = normalize_location(text)
+
+    assert (region.name if region else None) == name
+
+
+@pytest.mark.parametrize(
+    ("text", "name"),
+    [
+        ("湖北市場的貓", None),
+        ("希望能夠中和一下，高雄", "高雄市"),
+        ("地區：新北中和", "新北市中和區"),
+        ("台北市信義區", "台北市信義區"),
+        ("目前在永康區", "台南市永康區"),
+    ],
+)
+def test_normalize_location_free_text(text: str, name: str | None) -> None:
+    region = normalize_location(text, free_text=True)
+
+    assert (region.name if region else None) == name
+
+
+def test_grid_index() -> None:
+    taipei = normalize_location("台北")
+    grid = GridIndex()
+    for i, place in enumerate(["板橋", "土城", "台中", "高雄"]):
+        region = normalize_location(place)
+        grid.add(i, region.lat, region.lon)
+
+    nearby = grid.within(taipei.lat, taipei.lon, 40)
+
+    assert [i for i, _ in nearby] == [0, 1]
+    assert nearby[0][1] == pytest.approx(
+        distance_km(taipei.lat, taipei.lon, *_coords("板橋"))
+    )
+    assert len(grid.within(taipei.lat, taipei.lon, 400)) == 4
+
+
+def test_grid_index_large_radius() -> None:
+    grid = GridIndex()
+    for i, place in enumerate(["板橋", "高雄"]):
+        grid.add(i, *_coords(place))
+
+    # A radius spanning far more cells than are filled measures every point
+    start = time.perf_counter()
+    assert [i for i, _ in grid.within(*_coords("台北"), 200000)] == [0, 1]
+    assert [i for i, _ in grid.within(*_coords("台北"), math.inf)] == [0, 1]
+    assert time.perf_counter() - start < 0.1
+    assert clamp_radius(20000) == MAX_NEARBY_RADIUS_KM
+    assert clamp_radius(-5) == clamp_radius(math.nan) == 0
+
+
+def _coords(place: str) -> tuple[float, float]:
+    region = normalize_location(place)
+    return region.lat, region.lon
+
+
+def test_find_near() -> None:
+    store = PetStore(RECORDS)
+
+    # Across the county line, nearest first
+    assert [r.pet_id for r in store.find(near="板橋")] == [1, 0]
+    assert [r.pet_id for r in store.find(near="板橋", max_km=6)] == [1]
+    assert [r.pet_id for r in store.find(near="霧峰")] == [2, 4]
+    # An unknown place is matched as text
+    assert [r.pet_id for r in store.find(near="學校")] == [3]
+    assert store.to_dict(store.records[0], 12.34)["region"] == "新北市泰山區"
+    assert store.to_dict(store.records[0], 12.34)["distance_km"] == 12.3
+    assert "region" not in store.to_dict(store.records[3])
+
+
+def test_rank_near() -> None:
+    engine = CompatibilityEngine(PetStore(RECORDS))
+
+    ranked = engine.rank(AdopterProfile(), near="台中", k=10)
+
+    # The nearer pet is boosted, and the boost is a reason
+    assert [r["id"] for r in ranked] == [2, 4]
+    assert ranked[0]["reasons"]["nearby"] == pytest.approx(1.0)
+    assert 0 < ranked[1]["reasons"]["nearby"] < 1
+
+
+def test_search_near(tmp_path, mocker: MockFixture) -> None:
+    path = tmp_path / "articles.csv"
+    pd.DataFrame(
+        [
+            {
+                "url": f"https://www.dcard.tw/f/pet/p/{i}",
+                "title": title,
+                "author": "shelter",
+                "content": content,
+                "vectorize": json.dumps(vector),
+            }
+            for i, (title, content, vector) in enumerate(
+                [
+                    ("高雄橘貓送養", "等待領養", [1.0, 0.0]),
+                    ("虎斑貓", "地區：新北板橋", [0.9, 0.1]),
+                    ("黑貓", "請私訊", [0.5, 0.5]),
+                ]
+            )
+        ]
+    ).to_csv(path, index=False)
+    mocker.patch.object(retrieval, "ARTICLE_CSV_PATH", str(path))
+    mocker.patch.object(retrieval, "_index", None)
+
+    results = search_contents([1.0, 0.0], k=3, near="台北")
+
+    # The article in 高雄 is left out, the one of unknown place kept
+    assert [result["title"] for result in results] == ["虎斑貓", "黑貓"]
+    assert 0 < results[0]["distance_km"] < 40
+    assert "distance_km" not in results[1]
+    assert len(search_contents([1.0, 0.0], k=3)) == 3
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import pytest
+from pytest_mock import MockFixture
+
+from utils.function_call import matching, pet_records, rank_pets_for_adopter
+from utils.function_call.matching import (
+    PET_FEATURES,
+    AdopterProfile,
+    CompatibilityEngine,
+)
+from utils.function_call.pet_records import PetStore
+
+RECORDS = [
+    {
+        "animal_type": "cat",
+        "animal_name": "小奶貓",
+        "age": "約2週大",
+        "location": "新北泰山",
+        "note": "希望有餵奶經驗的人可以接手",
+    },
+    {
+        "animal_type": "cat",
+        "animal_name": "冰塊",
+        "animal_characteristic_tags": ["親人"],
+        "health_info": ["已結紮"],
+        "location": "台中市",
+    },
+    {
+        "animal_type": "cat",
+        "animal_name": "大黑",
+        "animal_characteristic_tags": ["親人"],
+        "note": "黑貓會咬橘貓，適合單貓家庭",
+        "location": "台中市",
+    },
+    {"animal_type": "hamster", "animal_name": "鼠寶", "location": "新竹市"},
+]
+
+
+def test_pet_features() -> None:
+    engine = CompatibilityEngine(PetStore(RECORDS))
+    names = list(PET_FEATURES)
+
+    assert engine.features.shape == (4, len(PET_FEATURES))
+    assert engine.features[0, names.index("needs_bottle_feeding")] == 1
+    assert engine.features[0, names.index("needs_experience")] == 1
+    assert engine.features[2, names.index("single_pet_home")] == 1
+    assert engine.features[3].sum() == 0
+
+
+def test_rank_first_time_adopter_with_a_cat() -> None:
+    engine = CompatibilityEngine(PetStore(RECORDS))
+    profile = AdopterProfile(
+        housing="apartment",
+        home_all_day=False,
+        has_experience=False,
+        has_other_pets=True,
+        preferred_tags=("親人",),
+    )
+
+    ranked = engine.rank(profile, animal_type="cat", k=10)
+
+    assert [pet["id"] for pet in ranked] == [1, 2, 0]
+    best = ranked[0]
+    assert best["reasons"]["tag:親人"] == pytest.approx(1.5)
+    assert best["reasons"]["friendly"] == pytest.approx(1.0)
+    assert best["score"] == pytest.approx(sum(best["reasons"].values()), abs=0.01)
+    assert ranked[1]["reasons"]["single_pet_home"] < 0
+    assert ranked[2]["reasons"]["needs_bottle_feeding"] < 0
+
+
+def test_scores_are_one_pass_over_all_pets() -> None:
+    engine = CompatibilityEngine(PetStore(RECORDS))
+
+    scores, traits, tags = engine.score(AdopterProfile(), animal_type="hamster")
+
+    # An adopter who told nothing scores every pet alike
+    assert np.isnan(scores[:3]).all() and scores[3] == 0
+    assert traits.shape == (4, len(PET_FEATURES)) and tags.shape == (4, 1)
+    assert engine.rank(AdopterProfile(), location="台中") == [
+        {"id": 1, "score": 0.0, "reasons": {}},
+        {"id": 2, "score": 0.0, "reasons": {}},
+    ]
+
+
+def test_tool(tmp_path, mocker: MockFixture) -> None:
+    path = tmp_path / "animal_info.json"
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False), encoding="utf-8")
+    mocker.patch.object(pet_records, "PET_INFO_PATH", str(path))
+    mocker.patch.object(
+        pet_records, "EXTRACTED_PETS_PATH", str(tmp_path / "extracted_pets.json")
+    )
+    mocker.patch.object(pet_records, "_store", None)
+    mocker.patch.object(matching, "_engine", None)
+
+    pets = rank_pets_for_adopter(
+        animal_type="cat", has_experience=True, home_all_day=True, k=1
+    )
+
+    assert len(pets) == 1
+    assert pets[0]["name"] == "小奶貓" and pets[0]["score"] > 0
@@ -0,0 +1,126 @@
+import asyncio
+
+from autogen_core import FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    UserMessage,
+)
+
+from utils.bots.ctx_mgr import CtxMgr
+from utils.bots.memory import (
+    SUMMARY_HEADER,
+    SummarizingChatCompletionContext,
+    estimate_tokens,
+    strip_payloads,
+)
+
+
+def test_strip_payloads() -> None:
+    blob = "A" * 40000
+    text = (
+        f'看看這張圖 <img class="wordcloud" src="data:image/webp;base64,{blob}">\n'
+        ":green-badge[:material/check: Function content_wordcloud called]"
+    )
+
+    stripped = strip_payloads(text)
+    assert stripped == (
+        "看看這張圖 [image/webp, 29 KB]\n[Function content_wordcloud called]"
+    )
+    assert estimate_tokens(stripped) < 30
+
+
+def test_estimate_tokens() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("領養貓咪") == 4
+    assert estimate_tokens("adopt a cat") == 3
+
+
+def turn(i: int) -> list[LLMMessage]:
+    return [
+        UserMessage(content=f"question {i} " + "貓" * 100, source="user"),
+        AssistantMessage(
+            content=[FunctionCall(id=f"{i}", name="query", arguments="{}")],
+            source="head_assistant",
+        ),
+        FunctionExecutionResultMessage(
+            content=[
+                FunctionExecutionResult(
+                    call_id=f"{i}", name="query", content="狗" * 200, is_error=False
+                )
+            ]
+        ),
+        AssistantMessage(content=f"answer {i} " + "狗" * 100, source="head_assistant"),
+    ]
+
+
+def test_context_stays_under_budget() -> None:
+    calls = []
+
+    async def summarize(summary: str, messages: list[LLMMessage]) -> str:
+        calls.append(len(messages))
+        return f"{summary} +{len(messages)}"
+
+    async def run() -> None:
+        context = SummarizingChatCompletionContext(
+            summarizer=summarize, token_budget=1000, summary_tokens=100
+        )
+        for i in range(20):
+            for message in turn(i):
+                await context.add_message(message)
+            messages = await context.get_messages()
+            assert sum(estimate_tokens(str(m.content)) for m in messages) < 1500
+
+        messages = await context.get_messages()
+        assert messages[0].content.startswith(SUMMARY_HEADER)
+        # Whole turns are folded, so the kept messages start with a question
+        assert isinstance(messages[1], UserMessage)
+        assert messages[-1].content.startswith("answer 19")
+        # Only the dropped turns are summarized each time
+        assert all(n % 4 == 0 for n in calls)
+        assert sum(calls) + len(messages) - 1 == 80
+
+        state = await context.save_state()
+        restored = SummarizingChatCompletionContext(summarizer=summarize)
+        await restored.load_state(state)
+        assert restored.summary == context.summary
+
+    asyncio.run(run())
+
+
+def test_context_falls_back_to_extractive_summary() -> None:
+    async def summarize(summary: str, messages: list[LLMMessage]) -> str:
+        raise RuntimeError("quota exceeded")
+
+    async def run() -> None:
+        context = SummarizingChatCompletionContext(
+            summarizer=summarize, token_budget=1000, summary_tokens=200
+        )
+        for i in range(5):
+            for message in turn(i):
+                await context.add_message(message)
+            await context.get_messages()
+
+        assert context.summary.startswith("head_assistant: answer")
+        assert estimate_tokens(context.summary) <= 200
+        assert context.token_count() < 1000
+
+    asyncio.run(run())
+
+
+def test_ctx_mgr_token_budget() -> None:
+    ctx = CtxMgr("test_memory_history", [], token_budget=300)
+    ctx.clear_context()
+    blob = "A" * 40000
+    ctx.add_context(
+        {"role": "assistant", "content": f'<img src="data:image/png;base64,{blob}">'}
+    )
+    assert ctx.get_context()[0]["content"] == "[image/png, 29 KB]"
+
+    for i in range(10):
+        ctx.add_context({"role": "user", "content": f"{i} " + "貓" * 100})
+
+    assert ctx.token_count() <= 300
+    assert ctx.get_context()[-1]["content"].startswith("9 ")
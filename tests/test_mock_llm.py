@@ -0,0 +1,109 @@
+import asyncio
+import time
+from functools import partial
+from unittest.mock import PropertyMock
+
+import pytest
+import streamlit as st
+from autogen_core.models import CreateResult, UserMessage
+from autogen_core.tools import FunctionTool
+from pytest_mock import MockFixture
+from streamlit.testing.v1 import AppTest
+
+from static.run_load_test import run_load_test
+from utils.bots.agent_pool import agent_pool
+from utils.bots.model_client import SharedModelClient, create_model_client
+from utils.mock_llm import MOCK_ANSWER, MockLLMServer, MockReply
+
+
+def budget_assistant(task: str) -> str:
+    """Answer budget questions."""
+    return task
+
+
+def test_mock_llm_tool_calls() -> None:
+    tool = FunctionTool(budget_assistant, description="Answer budget questions.")
+
+    async def run(server: MockLLMServer) -> None:
+        client = create_model_client(base_url=server.base_url, api_key="mock")
+        messages = [UserMessage(content="How much is a cat?", source="user")]
+
+        result = await client.create(messages, tools=[tool])
+        assert result.finish_reason == "function_calls"
+        assert result.content[0].name == "budget_assistant"
+        assert result.content[0].arguments == '{"task": "How much is a cat?"}'
+
+        result = await client.create(messages)
+        assert result.content == MOCK_ANSWER
+        assert result.usage.prompt_tokens > 0
+
+    with MockLLMServer() as server:
+        asyncio.run(run(server))
+        assert len(server.requests) == 2
+
+
+def test_mock_llm_streaming() -> None:
+    async def run(server: MockLLMServer) -> list:
+        client = create_model_client(base_url=server.base_url, api_key="mock")
+        return [
+            chunk
+            async for chunk in client.create_stream(
+                [UserMessage(content="hi", source="user")]
+            )
+        ]
+
+    script = partial(MockReply, "streamed answer")
+    with MockLLMServer(
+        script=lambda request: script(), latency=0.2, chunk_chars=4
+    ) as server:
+        start = time.perf_counter()
+        chunks = asyncio.run(run(server))
+        elapsed = time.perf_counter() - start
+
+    assert chunks[:-1] == ["stre", "amed", " ans", "wer"]
+    assert isinstance(chunks[-1], CreateResult)
+    assert chunks[-1].content == "streamed answer"
+    assert elapsed >= 0.2
+
+
+def test_chat_offline(mocker: MockFixture) -> None:
+    mocker.patch.object(
+        type(st.context), "locale", new_callable=PropertyMock, return_value="en"
+    )
+    mocker.patch("utils.bots.semantic_cache.SEMANTIC_CACHE_ENABLED", False)
+    mocker.patch("utils.function_call.retrieval.RETRIEVAL_PREFETCH", False)
+
+    with MockLLMServer() as server:
+        agent_pool.model_client = SharedModelClient(
+            partial(create_model_client, base_url=server.base_url, api_key="mock"),
+            scheduler=None,
+        )
+        try:
+            at = AppTest.from_file("../src/streamlit_app.py", default_timeout=60).run()
+            at.switch_page("./pages/pets_autogen.py").run()
+
+            prompt = "How much does a cat cost per year?"
+            at.chat_input(key="chat_bot").set_value(prompt).run()
+        finally:
+            agent_pool.model_client = None
+
+    assert not at.exception
+    assert at.chat_message[1].children[0].value == prompt
+    assert MOCK_ANSWER.strip() in at.chat_message[2].markdown[-1].value
+    # The head agent called the budget agent with the prompt
+    assert any(
+        "tools" not in request and request["messages"][-1]["content"] == prompt
+        for request in server.requests
+    )
+
+
+@pytest.mark.performance
+@pytest.mark.timeout(300)
+def test_load_concurrent_sessions() -> None:
+    report = run_load_test(sessions=4, turns=2, latency=0.05, chunk_delay=0.005)
+
+    assert report["turns"] == 4 * 3
+    # Each turn asks the head agent twice and the budget agent once, unless
+    # the budget agent's answer was cached
+    assert 4 * 2 * 3 <= report["model_requests"] <= 4 * 3 * 3
+    assert report["latency_p95"] < 30
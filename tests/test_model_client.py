@@ -0,0 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from autogen_core.models import CreateResult, UserMessage
+from autogen_ext.models.replay import ReplayChatCompletionClient
+
+from utils.bots.model_client import SharedModelClient
+
+MESSAGES = [UserMessage(content="你好", source="user")]
+
+
+def test_shared_client_across_event_loops() -> None:
+    client = SharedModelClient(
+        lambda: ReplayChatCompletionClient(["你好！"] * 8), scheduler=None
+    )
+
+    def run_in_new_loop(_) -> str:
+        # Like Streamlit, every call runs on its own thread and event loop
+        return asyncio.run(client.create(MESSAGES)).content
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(run_in_new_loop, range(8)))
+
+    assert results == ["你好！"] * 8
+    assert client.total_usage().completion_tokens > 0
+
+
+def test_shared_client_stream() -> None:
+    client = SharedModelClient(
+        lambda: ReplayChatCompletionClient(["領養 一隻 貓"]), scheduler=None
+    )
+
+    async def collect() -> list:
+        return [chunk async for chunk in client.create_stream(MESSAGES)]
+
+    chunks = asyncio.run(collect())
+
+    assert all(isinstance(chunk, str) for chunk in chunks[:-1])
+    assert isinstance(chunks[-1], CreateResult)
+    assert chunks[-1].content == "領養 一隻 貓"
+
+    asyncio.run(client.close())
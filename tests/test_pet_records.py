@@ -0,0 +1,89 @@
+import json
+
+import pytest
+from pytest_mock import MockFixture
+
+from utils.function_call import find_adoptable_pets, list_pet_attributes, pet_records
+from utils.function_call.pet_records import PetStore, load_pet_store, species_names
+
+RECORDS = [
+    {
+        "animal_type": "cat",
+        "animal_name": "goya",
+        "animal_species": "米克斯混美短",
+        "animal_characteristic_tags": ["活潑", "親人"],
+        "health_info": ["已結紮"],
+        "location": "南投市",
+    },
+    {
+        "animal_type": "cat",
+        "animal_species": "三花貓、虎斑貓",
+        "animal_characteristic_tags": ["親人"],
+        "location": "台中市",
+    },
+    {
+        "animal_type": "Hamster",
+        "animal_species": "一線鼠",
+        "location": "新竹市",
+    },
+]
+
+
+@pytest.fixture
+def pet_file(tmp_path, mocker: MockFixture):
+    path = tmp_path / "animal_info.json"
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False), encoding="utf-8")
+    mocker.patch.object(pet_records, "PET_INFO_PATH", str(path))
+    mocker.patch.object(
+        pet_records, "EXTRACTED_PETS_PATH", str(tmp_path / "extracted_pets.json")
+    )
+    mocker.patch.object(pet_records, "_store", None)
+    return path
+
+
+def test_indexes() -> None:
+    store = PetStore(RECORDS)
+
+    assert len(store) == 3 and store.get(3) is None
+    # Tags are stored once and shared by the records
+    assert len(store.tags) == 2
+    assert store.get(0).tags == (store.tags.get("活潑"), store.tags.get("親人"))
+    assert store.ids_with_tag("親人") == (0, 1)
+    assert store.ids_of_type("hamster") == (2,)
+    assert store.ids_of_species("虎斑貓") == (1,)
+    assert store.ids_of_species("貓") == (1,)
+    assert species_names("三花貓、虎斑貓") == ["三花貓", "虎斑貓"]
+
+
+def test_find() -> None:
+    store = PetStore(RECORDS)
+
+    assert [r.pet_id for r in store.find(animal_type="cat", tags=["親人"])] == [0, 1]
+    assert [r.pet_id for r in store.find(tags=["親人", "活潑"])] == [0]
+    assert [r.pet_id for r in store.find(animal_type="cat", location="台中")] == [1]
+    assert store.find(tags=["不存在"]) == []
+    assert len(store.find()) == 3
+
+    pet = store.to_dict(store.get(0))
+    assert pet["tags"] == ["活潑", "親人"] and pet["health_info"] == ["已結紮"]
+    # Fields the post does not give are left out
+    assert "requirements" not in pet and "note" not in pet
+
+
+def test_store_is_loaded_once(pet_file) -> None:
+    store = load_pet_store()
+    assert load_pet_store() is store
+
+    pet_file.write_text(json.dumps(RECORDS[:1]), encoding="utf-8")
+    assert len(load_pet_store()) == 1
+
+
+def test_tools(pet_file) -> None:
+    pets = find_adoptable_pets(animal_type="cat", tags=["親人"], k=1)
+    assert [pet["id"] for pet in pets] == [0]
+
+    attributes = list_pet_attributes("cat")
+    assert attributes["pets"] == 2
+    assert attributes["types"] == {"cat": 2, "hamster": 1}
+    assert attributes["tags"] == {"親人": 2, "活潑": 1}
+    assert "一線鼠" not in attributes["species"]
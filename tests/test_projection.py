@@ -0,0 +1,72 @@
+from utils.bots.memory import estimate_tokens
+from utils.function_call.projection import (
+    extract_fields,
+    project_full_texts,
+    project_results,
+    query_snippet,
+)
+
+POST = (
+    "送養一隻橘貓。年齡：約兩歲，性別：公。地區：台北市。"
+    "個性很親人，也很愛撒嬌。已結紮，已打疫苗。"
+    "平常喜歡在窗邊曬太陽。希望領養人能有穩定的收入。"
+)
+
+
+def result(i: int, content: str = POST) -> dict:
+    return {
+        "id": i,
+        "url": f"https://www.dcard.tw/f/pet/p/{i}",
+        "title": f"送養橘貓 {i}",
+        "author": "shelter",
+        "content": content,
+        "similarity": 0.9 - i / 100,
+    }
+
+
+def test_extract_fields() -> None:
+    fields = extract_fields(POST)
+
+    assert fields["age"] == "約兩歲"
+    assert fields["sex"] == "公"
+    assert fields["location"] == "台北市"
+    assert {"親人", "愛撒嬌", "已結紮", "已打疫苗"} <= set(fields["traits"])
+    assert extract_fields("今天天氣很好") == {}
+
+
+def test_snippet_follows_the_query() -> None:
+    snippet = query_snippet(POST, "喜歡曬太陽的貓", max_chars=30)
+
+    assert "曬太陽" in snippet
+    assert len(snippet) <= 30
+
+
+def test_results_fit_the_budget() -> None:
+    results = [result(i, POST * 5) for i in range(15)]
+
+    projected = project_results(results, "親人的貓", token_budget=600)
+
+    assert 0 < len(projected) < 15
+    # The most similar articles are kept
+    assert [item["id"] for item in projected] == list(range(len(projected)))
+    assert set(projected[0]) == {
+        "id",
+        "title",
+        "url",
+        "similarity",
+        "fields",
+        "snippet",
+    }
+    assert sum(estimate_tokens(str(item)) for item in projected) <= 700
+    # A single article is kept even when it is over budget
+    assert len(project_results(results[:1], "貓", token_budget=1)) == 1
+
+
+def test_full_texts_share_the_budget() -> None:
+    articles = [result(i, POST * 50) for i in range(3)]
+
+    texts = project_full_texts(articles, token_budget=600)
+
+    assert [text["id"] for text in texts] == [0, 1, 2]
+    assert all(estimate_tokens(text["content"]) <= 201 for text in texts)
+    assert project_full_texts(articles[:1])[0]["content"] == POST * 50
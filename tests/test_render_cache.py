@@ -0,0 +1,95 @@
+import builtins
+import os
+
+from pytest_mock import MockFixture
+
+from utils.function_call import render_cache
+from utils.function_call.render_cache import RenderCache, make_handle, resolve_handle
+
+
+def test_make_key_is_stable() -> None:
+    options = {"width": 1600, "height": 800}
+
+    key = RenderCache.make_key({"貓咪": 3, "領養": 2}, options)
+
+    assert key == RenderCache.make_key({"領養": 2, "貓咪": 3}, dict(options))
+    assert key != RenderCache.make_key({"貓咪": 3, "領養": 1}, options)
+    assert key != RenderCache.make_key({"貓咪": 3, "領養": 2}, {"width": 800})
+
+
+def test_memory_eviction_by_bytes() -> None:
+    cache = RenderCache(max_memory_bytes=10, disk_dir=None)
+
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"  # "a" is now the most recently used
+
+    cache.put("c", b"1234")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+    assert cache.memory_bytes == 8
+
+
+def test_disk_tier(tmp_path) -> None:
+    cache = RenderCache(max_memory_bytes=4, disk_dir=str(tmp_path), max_disk_bytes=8)
+
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+
+    # "a" was evicted from memory but is still on disk
+    assert cache.get("a") == b"1234"
+
+    cache.put("c", b"1234")
+
+    # The disk tier evicts the least recently used entry
+    assert cache.disk_bytes == 8
+    assert not (tmp_path / "b.bin").exists()
+
+    # A new instance picks up the existing entries
+    reloaded = RenderCache(max_memory_bytes=4, disk_dir=str(tmp_path), max_disk_bytes=8)
+    assert reloaded.disk_bytes == 8
+    assert reloaded.get("c") == b"1234"
+
+    reloaded.clear()
+    assert reloaded.disk_bytes == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_io_outside_the_lock(tmp_path, mocker: MockFixture) -> None:
+    cache = RenderCache(max_memory_bytes=4, disk_dir=str(tmp_path), max_disk_bytes=8)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    locked = []
+
+    def spy(call):
+        def wrapper(*args, **kwargs):
+            locked.append(cache._lock.locked())
+            return call(*args, **kwargs)
+
+        return wrapper
+
+    mocker.patch.object(render_cache, "open", spy(builtins.open), create=True)
+    mocker.patch.object(render_cache.os, "replace", spy(os.replace))
+    mocker.patch.object(render_cache.os, "remove", spy(os.remove))
+
+    # "a" is read from disk, "c" written to it and "b" evicted, then all removed
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    cache.clear()
+
+    assert locked == [False] * 5
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_resolve_handle_rejects_malformed_handles(mocker: MockFixture) -> None:
+    cache = RenderCache(disk_dir=None)
+    mocker.patch.object(render_cache, "render_cache", cache)
+    key = RenderCache.make_key({"貓咪": 3}, {})
+    cache.put(key, b"image")
+
+    assert resolve_handle(make_handle(key, "webp")) == (b"image", "image/webp")
+    assert resolve_handle(make_handle(key, "exe")) is None
+    assert resolve_handle(make_handle("../../etc/passwd", "png")) is None
+    assert resolve_handle(make_handle(key.upper(), "png")) is None
@@ -0,0 +1,134 @@
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from pytest_mock import MockFixture
+
+from utils.function_call import query_top_k_match_contents, retrieval
+from utils.function_call.retrieval import (
+    RetrievalPrefetcher,
+    load_article_index,
+    search_contents,
+    term_overlap,
+    warm_retrieval,
+)
+
+VECTORS = {
+    "我想領養貓": [1.0, 0.0, 0.0],
+    "領養 貓": [0.95, 0.05, 0.0],
+    "安靜的成貓": [0.9, 0.1, 0.0],
+    "活潑的狗": [0.0, 1.0, 0.0],
+}
+
+
+@pytest.fixture
+def articles(tmp_path, mocker: MockFixture) -> MagicMock:
+    path = tmp_path / "articles.csv"
+    pd.DataFrame(
+        [
+            {
+                "url": f"https://www.dcard.tw/f/pet/p/{i}",
+                "title": title,
+                "author": "shelter",
+                "content": f"{title} 等待領養",
+                "vectorize": json.dumps(vector),
+            }
+            for i, (title, vector) in enumerate(
+                [
+                    ("橘貓", [1.0, 0.0, 0.0]),
+                    ("黑狗", [0.0, 1.0, 0.0]),
+                    ("虎斑貓", [0.8, 0.2, 0.0]),
+                    ("壞掉的向量", [1.0]),
+                ]
+            )
+        ]
+    ).to_csv(path, index=False)
+
+    mocker.patch.object(retrieval, "ARTICLE_CSV_PATH", str(path))
+    mocker.patch.object(retrieval, "_index", None)
+    return mocker.patch(
+        "utils.function_call.retrieval.embed_text",
+        side_effect=lambda text, task_type: VECTORS[text],
+    )
+
+
+def test_index_is_loaded_once(articles: MagicMock, mocker: MockFixture) -> None:
+    read_csv = mocker.spy(pd, "read_csv")
+
+    results = search_contents([1.0, 0.0, 0.0], k=2)
+    search_contents([0.0, 1.0, 0.0], k=2)
+
+    assert [result["title"] for result in results] == ["橘貓", "虎斑貓"]
+    assert results[0]["similarity"] == pytest.approx(1.0)
+    assert read_csv.call_count == 1
+    assert search_contents([1.0, 0.0, 0.0], k=0) == []
+    # The vector of another dimension is left out
+    assert len(load_article_index().vectors) == 3
+
+
+def test_prefetch_serves_the_first_search(
+    articles: MagicMock, mocker: MockFixture
+) -> None:
+    mocker.patch(
+        "utils.function_call.pets.embed_text",
+        side_effect=lambda text, task_type: VECTORS[text],
+    )
+    prefetch = RetrievalPrefetcher().start("我想領養貓", k=3)
+    prefetch.future.result()
+
+    with warm_retrieval(prefetch):
+        # The agent's own wording of the message is served warm
+        warm = query_top_k_match_contents("領養 貓", k=2)
+        # A refined search is searched for again
+        refined = query_top_k_match_contents("活潑的狗", k=1)
+        # The user's message is always served warm
+        again = query_top_k_match_contents("我想領養貓", k=1)
+
+    assert [result["id"] for result in warm] == [
+        result["id"] for result in prefetch.future.result()[:2]
+    ]
+    assert refined[0]["title"] == "黑狗"
+    assert again[0]["title"] == "橘貓"
+    assert articles.call_count == 1
+
+
+def test_prefetch_skips_unrelated_searches(
+    articles: MagicMock, mocker: MockFixture
+) -> None:
+    embed = mocker.patch(
+        "utils.function_call.pets.embed_text",
+        side_effect=lambda text, task_type: VECTORS[text],
+    )
+    prefetch = RetrievalPrefetcher().start("我想領養貓", k=3)
+    prefetch.future.result()
+
+    with warm_retrieval(prefetch):
+        # The first search of the turn is about something else than the message
+        query_top_k_match_contents("安靜的成貓", k=1)
+
+    assert term_overlap("安靜的成貓", "我想領養貓") == 0
+    assert term_overlap("領養 貓", "我想領養貓") == 1
+    embed.assert_called_once_with("安靜的成貓", task_type="RETRIEVAL_QUERY")
+
+
+def test_failed_prefetch_falls_back(articles: MagicMock, mocker: MockFixture) -> None:
+    articles.side_effect = RuntimeError("quota")
+    mocker.patch(
+        "utils.function_call.pets.embed_text",
+        side_effect=lambda text, task_type: VECTORS[text],
+    )
+    prefetch = RetrievalPrefetcher().start("我想領養貓")
+
+    with warm_retrieval(prefetch):
+        results = query_top_k_match_contents("活潑的狗", k=1)
+
+    assert results[0]["title"] == "黑狗"
+
+
+def test_pandas_options_are_set_on_first_use(articles: MagicMock) -> None:
+    pd.reset_option("future.no_silent_downcasting")
+
+    load_article_index()
+
+    assert pd.get_option("future.no_silent_downcasting")
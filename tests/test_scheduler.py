@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.scheduler import (
+    Priority,
+    RateLimit,
+    RequestScheduler,
+    SqliteBucketStore,
+    request_priority,
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_waits_for_the_bucket_to_refill() -> None:
+    # 600 tokens per minute refill at 10 tokens per second
+    scheduler = RequestScheduler(
+        {"chat": RateLimit(0, tokens_per_minute=600)}, poll_interval=0.01
+    )
+
+    assert scheduler.acquire_sync("chat", tokens=600) < 0.05
+    waited = scheduler.acquire_sync("chat", tokens=5)
+
+    assert 0.4 <= waited < 1.5
+    stats = scheduler.stats()["chat.interactive"]
+    assert stats["requests"] == 2
+    assert stats["wait_max"] == waited
+
+
+def test_unlimited_models_are_not_paced() -> None:
+    scheduler = RequestScheduler({"chat": RateLimit(1)})
+    start = time.perf_counter()
+    for _ in range(100):
+        scheduler.acquire_sync("embedding")
+    assert time.perf_counter() - start < 1
+
+
+def test_interactive_requests_go_first() -> None:
+    scheduler = RequestScheduler(
+        {"chat": RateLimit(120)}, batch_reserve=0, poll_interval=0.01
+    )
+    for _ in range(120):
+        scheduler.acquire_sync("chat")
+
+    async def run() -> list[str]:
+        served = []
+
+        async def request(name: str, priority: Priority) -> None:
+            await scheduler.acquire("chat", priority=priority)
+            served.append(name)
+
+        batch = asyncio.create_task(request("batch", Priority.BATCH))
+        await asyncio.sleep(0.05)
+        with request_priority(Priority.INTERACTIVE):
+            interactive = asyncio.create_task(request("interactive", None))
+        await asyncio.gather(batch, interactive)
+        return served
+
+    assert asyncio.run(run()) == ["interactive", "batch"]
+
+
+def test_batch_requests_leave_a_reserve() -> None:
+    scheduler = RequestScheduler({"chat": RateLimit(120)}, batch_reserve=0.5)
+    for _ in range(60):
+        scheduler.acquire_sync("chat")
+
+    async def run() -> None:
+        with request_priority(Priority.BATCH), pytest.raises(TimeoutError):
+            await asyncio.wait_for(scheduler.acquire("chat"), timeout=0.2)
+        assert await scheduler.acquire("chat") < 0.1
+
+    asyncio.run(run())
+
+
+def test_processes_share_the_buckets(tmp_path) -> None:
+    path = str(tmp_path / "scheduler.db")
+    limits = {"chat": RateLimit(60)}
+    first = RequestScheduler(limits, store=SqliteBucketStore(path))
+    second = RequestScheduler(limits, store=SqliteBucketStore(path))
+
+    for _ in range(60):
+        first.acquire_sync("chat")
+
+    async def run() -> None:
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(second.acquire("chat"), timeout=0.2)
+
+    asyncio.run(run())
+
+
+def test_rate_limited_requests_are_queued_again() -> None:
+    scheduler = RequestScheduler(
+        {"chat": RateLimit(600)}, poll_interval=0.01, backoff=0.2
+    )
+    calls = []
+
+    def call() -> str:
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            raise RateLimitError("Too Many Requests")
+        return "ok"
+
+    assert scheduler.run_sync("chat", 0, call) == "ok"
+    # The retry waited out the backoff
+    assert calls[1] - calls[0] >= 0.2
+
+    def fail() -> str:
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.run_sync("chat", 0, fail)
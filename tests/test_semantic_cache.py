@@ -0,0 +1,86 @@
+from pytest_mock import MockFixture
+
+from utils.bots.semantic_cache import SemanticCache
+
+VECTORS = {
+    "我想領養貓": [1.0, 0.0, 0.0],
+    "我想要領養一隻貓": [0.99, 0.1, 0.0],
+    "養狗要花多少錢": [0.0, 1.0, 0.0],
+}
+
+
+def make_cache(version: list[str], **kwargs) -> SemanticCache:
+    return SemanticCache(
+        embed=lambda prompt: VECTORS[prompt],
+        index_version=lambda: version[0],
+        threshold=0.95,
+        **kwargs,
+    )
+
+
+def add(cache: SemanticCache, prompt: str, lang: str = "zh-TW") -> None:
+    cache.add(cache.embed(prompt), lang, prompt, f"answer to {prompt}", prompt)
+
+
+def test_semantic_cache_hit_and_miss() -> None:
+    cache = make_cache(["v1"])
+    add(cache, "我想領養貓")
+
+    hit = cache.lookup(cache.embed("我想要領養一隻貓"), "zh-TW")
+    assert hit is not None and hit.answer == "answer to 我想領養貓"
+
+    assert cache.lookup(cache.embed("養狗要花多少錢"), "zh-TW") is None
+    # Answers are only served in the language they were written in
+    assert cache.lookup(cache.embed("我想領養貓"), "en") is None
+
+    assert cache.stats() == {
+        "entries": 1,
+        "hits": 1,
+        "misses": 2,
+        "errors": 0,
+        "hit_rate": 1 / 3,
+    }
+
+
+def test_semantic_cache_freshness(mocker: MockFixture) -> None:
+    version = ["v1"]
+    cache = make_cache(version, ttl=60)
+    now = mocker.patch("utils.bots.semantic_cache.time.time", return_value=1000.0)
+    add(cache, "我想領養貓")
+
+    now.return_value = 1059.0
+    assert cache.lookup(cache.embed("我想領養貓"), "zh-TW") is not None
+    now.return_value = 1061.0
+    assert cache.lookup(cache.embed("我想領養貓"), "zh-TW") is None
+    assert len(cache) == 0
+
+    # Re-crawling the articles invalidates every answer
+    add(cache, "我想領養貓")
+    version[0] = "v2"
+    assert cache.lookup(cache.embed("我想領養貓"), "zh-TW") is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_evicts_least_recently_used(mocker: MockFixture) -> None:
+    cache = make_cache(["v1"], maxsize=2)
+    now = mocker.patch("utils.bots.semantic_cache.time.time", return_value=1000.0)
+    add(cache, "我想領養貓")
+    now.return_value = 1001.0
+    add(cache, "養狗要花多少錢")
+
+    now.return_value = 1002.0
+    assert cache.lookup(cache.embed("我想領養貓"), "zh-TW") is not None
+    now.return_value = 1003.0
+    add(cache, "我想要領養一隻貓")
+
+    assert len(cache) == 2
+    assert cache.lookup(cache.embed("養狗要花多少錢"), "zh-TW") is None
+
+
+def test_semantic_cache_embedding_failure_is_a_miss() -> None:
+    def embed(prompt: str) -> list[float]:
+        raise RuntimeError("quota exceeded")
+
+    cache = SemanticCache(embed=embed, index_version=lambda: "v1")
+    assert cache.embed("我想領養貓") is None
+    assert cache.stats()["errors"] == 1
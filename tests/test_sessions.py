@@ -0,0 +1,133 @@
+import asyncio
+from functools import partial
+
+import pytest
+from autogen_core.models import UserMessage
+
+from utils.bots.agent_pool import agent_pool
+from utils.bots.model_client import SharedModelClient, create_model_client
+from utils.bots.sessions import (
+    MemorySessionStore,
+    SessionConflict,
+    SessionManager,
+    SqliteSessionStore,
+)
+
+
+@pytest.fixture(autouse=True)
+def model_client():
+    # The agents are created but never run
+    agent_pool.model_client = SharedModelClient(
+        partial(create_model_client, base_url="http://127.0.0.1:9", api_key="mock"),
+        scheduler=None,
+    )
+    yield
+    agent_pool.model_client = None
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_store(kind: str, tmp_path) -> None:
+    store = (
+        MemorySessionStore()
+        if kind == "memory"
+        else SqliteSessionStore(str(tmp_path / "sessions.db"))
+    )
+
+    assert store.version("a") is None
+    assert store.save("a", {"history": ["領養"]}, 0) == 1
+    assert store.save("a", {"history": ["領養", "貓"]}, 1) == 2
+    # Saved over a version that is no longer the stored one
+    with pytest.raises(SessionConflict):
+        store.save("a", {"history": ["領養", "狗"]}, 1)
+    with pytest.raises(SessionConflict):
+        store.save("a", {"history": []}, 0)
+    assert store.load("a") == (2, {"history": ["領養", "貓"]})
+    assert store.purge(max_age=60) == 0
+    assert store.delete("a")
+    assert not store.delete("a")
+    assert store.load("a") is None
+
+
+def test_idle_sessions_are_reloaded() -> None:
+    manager = SessionManager(MemorySessionStore(), idle_ttl=60)
+
+    async def run() -> None:
+        session = await manager.create("zh-TW")
+        await session.head_agent.model_context.add_message(
+            UserMessage(content="我想領養貓", source="user")
+        )
+        session.state["history"] = [{"role": "user", "content": "我想領養貓"}]
+        await manager.save(session)
+
+        # Still in memory
+        assert await manager.get(session.session_id) is session
+        session.last_used -= 61
+        assert manager.evict_idle() == 1
+        assert len(manager) == 0
+
+        reloaded = await manager.get(session.session_id)
+        assert reloaded is not session
+        assert reloaded.lang == "zh-TW"
+        assert reloaded.state == session.state
+        messages = await reloaded.head_agent.model_context.get_messages()
+        assert [message.content for message in messages] == ["我想領養貓"]
+        assert manager.loads == 1
+
+        assert await manager.delete(session.session_id)
+        assert await manager.get(session.session_id) is None
+
+    asyncio.run(run())
+
+
+def test_processes_share_sessions(tmp_path) -> None:
+    path = str(tmp_path / "sessions.db")
+    first = SessionManager(SqliteSessionStore(path))
+    second = SessionManager(SqliteSessionStore(path))
+
+    async def run() -> None:
+        session = await first.create("en")
+
+        other = await second.get(session.session_id)
+        await other.head_agent.model_context.add_message(
+            UserMessage(content="Is a cat quiet?", source="user")
+        )
+        await second.save(other)
+
+        # The first process sees that the session was continued elsewhere
+        current = await first.get(session.session_id)
+        assert current is not session
+        messages = await current.head_agent.model_context.get_messages()
+        assert messages[0].content == "Is a cat quiet?"
+
+    asyncio.run(run())
+
+
+def test_concurrent_turns_are_merged(tmp_path) -> None:
+    path = str(tmp_path / "sessions.db")
+    first = SessionManager(SqliteSessionStore(path))
+    second = SessionManager(SqliteSessionStore(path))
+
+    async def run() -> None:
+        session = await first.create("en")
+        other = await second.get(session.session_id)
+
+        # Both processes run a turn of the session at once
+        await session.head_agent.model_context.add_message(
+            UserMessage(content="Is a cat quiet?", source="user")
+        )
+        await other.head_agent.model_context.add_message(
+            UserMessage(content="Is a dog loud?", source="user")
+        )
+        await second.save(other)
+        await first.save(session)
+
+        # The later save is replayed onto the earlier one instead of overwriting it
+        assert session.version == 3
+        current = await second.get(session.session_id)
+        messages = await current.head_agent.model_context.get_messages()
+        assert [message.content for message in messages] == [
+            "Is a dog loud?",
+            "Is a cat quiet?",
+        ]
+
+    asyncio.run(run())
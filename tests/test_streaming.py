@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.streaming import StreamPacer, split_chunks
+
+
+def test_split_chunks() -> None:
+    text = (
+        "你好，我想領養一隻貓。 Hello world!\n:green-badge[:material/check: done]\n\n"
+    )
+
+    chunks = split_chunks(text)
+    assert "".join(chunks) == text
+    assert "Hello " in chunks
+    assert ":green-badge[:material/check: done]\n\n" in chunks
+    assert "你好，" in chunks
+
+
+async def collect(pacer: StreamPacer, items: list) -> list:
+    async def source():
+        for item in items:
+            yield item
+
+    return [item async for item in pacer.stream(source())]
+
+
+def test_pacer_keeps_order() -> None:
+    marker = object()
+    out = asyncio.run(collect(StreamPacer(0), ["hello world", marker, "貓咪"]))
+    assert out == ["hello ", "world", marker, "貓咪"]
+
+
+def test_pacer_paces_small_backlog() -> None:
+    pacer = StreamPacer(chars_per_second=1000, max_backlog=1000)
+
+    start = time.perf_counter()
+    out = asyncio.run(collect(pacer, ["word " * 40]))
+    elapsed = time.perf_counter() - start
+
+    assert "".join(out) == "word " * 40
+    # 200 characters at 1000 characters per second
+    assert elapsed >= 0.15
+
+
+def test_pacer_stops_pacing_large_backlog() -> None:
+    pacer = StreamPacer(chars_per_second=100, max_backlog=50)
+
+    start = time.perf_counter()
+    out = asyncio.run(collect(pacer, ["word " * 400]))
+    elapsed = time.perf_counter() - start
+
+    assert "".join(out) == "word " * 400
+    # Only the last 50 characters are paced, instead of 20 seconds for all of them
+    assert elapsed < 1.5
+
+
+def test_pacer_does_not_hold_up_the_source() -> None:
+    received = []
+
+    async def source():
+        for i in range(5):
+            received.append(time.perf_counter())
+            yield f"chunk{i} "
+            await asyncio.sleep(0)
+
+    async def run() -> None:
+        pacer = StreamPacer(chars_per_second=10, max_backlog=1000)
+        stream = pacer.stream(source())
+        await anext(stream)
+        # The source is read ahead while the first chunk is being paced
+        await asyncio.sleep(0.05)
+        assert len(received) == 5
+        await stream.aclose()
+
+    asyncio.run(run())
+
+
+def test_pacer_raises_source_errors() -> None:
+    async def source():
+        yield "hello"
+        raise RuntimeError("model failed")
+
+    async def run() -> None:
+        async for _ in StreamPacer(0).stream(source()):
+            pass
+
+    with pytest.raises(RuntimeError, match="model failed"):
+        asyncio.run(run())
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from functools import partial
+
+import pytest
+from autogen_core.models import UserMessage
+from autogen_core.tools import FunctionTool
+from pytest_mock import MockFixture
+
+from static.run_trace_collector import TraceCollector
+from static.run_trace_report import load_spans, slowest_turns, stage_stats
+from utils.bots.agent_pool import run_in_thread
+from utils.bots.model_client import SharedModelClient, create_model_client
+from utils.bots.workbench import ParallelWorkbench
+from utils.mock_llm import MockLLMServer
+from utils.tracing import JsonlExporter, MemoryExporter, OtlpExporter, Tracer, tracer
+
+
+@pytest.fixture
+def exporter(mocker: MockFixture) -> MemoryExporter:
+    exporter = MemoryExporter()
+    mocker.patch.object(tracer, "exporters", [exporter])
+    return exporter
+
+
+def lookup_pets(query: str) -> str:
+    """Look up pets."""
+    with tracer.span("lookup", kind="retrieval"):
+        return query
+
+
+def test_spans_nest_across_tasks_and_threads(exporter: MemoryExporter) -> None:
+    async def run() -> None:
+        with tracer.span("turn", kind="turn"):
+            await asyncio.gather(
+                asyncio.create_task(asyncio.sleep(0)),
+                asyncio.to_thread(lookup_pets, "cat"),
+            )
+            with tracer.span("model.create", kind="model") as model:
+                model.add_tokens(10, 5)
+
+    asyncio.run(run())
+
+    spans = {span.name: span for span in exporter.spans}
+    turn = spans["turn"]
+    assert turn.parent is None
+    assert spans["lookup"].parent_id == turn.span_id
+    assert spans["lookup"].trace_id == turn.trace_id
+    # Tokens of the model call are added up on the turn
+    assert turn.attributes["prompt_tokens"] == 10
+    assert turn.attributes["completion_tokens"] == 5
+    # Children finish and are exported before their parent
+    assert exporter.spans[-1] is turn
+
+
+def test_span_records_errors() -> None:
+    exporter = MemoryExporter()
+    with pytest.raises(ValueError), Tracer([exporter]).span("tool.broken"):
+        raise ValueError("broken")
+
+    assert exporter.spans[0].status == "error"
+    assert "broken" in exporter.spans[0].attributes["error"]
+
+
+def test_failing_exporter_is_isolated(mocker: MockFixture) -> None:
+    broken, exporter = MemoryExporter(), MemoryExporter()
+    mocker.patch.object(broken, "export", side_effect=OSError("disk full"))
+    tracer = Tracer([broken, exporter])
+
+    with tracer.span("retrieval"):
+        pass
+    # The error of the stage is raised, not the exporter's
+    with pytest.raises(ValueError), tracer.span("tool.broken"):
+        raise ValueError("broken")
+
+    assert [span.name for span in exporter.spans] == ["retrieval", "tool.broken"]
+
+
+def test_model_and_tool_spans(exporter: MemoryExporter) -> None:
+    workbench = ParallelWorkbench(
+        [FunctionTool(run_in_thread(lookup_pets), description="Look up pets.")]
+    )
+
+    async def run(server: MockLLMServer) -> None:
+        client = SharedModelClient(
+            partial(create_model_client, base_url=server.base_url, api_key="mock"),
+            scheduler=None,
+        )
+        with tracer.span("turn", kind="turn"):
+            await client.create([UserMessage(content="hi", source="user")])
+            async for _ in client.create_stream(
+                [UserMessage(content="hello", source="user")]
+            ):
+                pass
+            await workbench.call_tool("lookup_pets", {"query": "cat"})
+        await client.close()
+
+    with MockLLMServer() as server:
+        asyncio.run(run(server))
+
+    spans = {span.name: span for span in exporter.spans}
+    turn = spans["turn"]
+    assert spans["model.create"].parent_id == turn.span_id
+    assert spans["model.create"].attributes["prompt_tokens"] > 0
+    assert spans["model.stream"].attributes["estimated_tokens"] is True
+    assert "first_token_s" in spans["model.stream"].attributes
+    assert spans["tool.lookup_pets"].attributes["is_error"] is False
+    # The blocking tool runs on a worker thread and still nests under its call
+    assert spans["lookup"].parent_id == spans["tool.lookup_pets"].span_id
+    assert turn.attributes["prompt_tokens"] == sum(
+        spans[name].attributes["prompt_tokens"]
+        for name in ("model.create", "model.stream")
+    )
+
+
+def test_jsonl_report(tmp_path) -> None:
+    path = str(tmp_path / "traces.jsonl")
+    local_tracer = Tracer([JsonlExporter(path)])
+    for delay in (0.0, 0.05):
+        with local_tracer.span("turn", kind="turn") as turn:
+            turn.mark("first_text_s")
+            with local_tracer.span("tool.content_wordcloud", kind="tool"):
+                asyncio.run(asyncio.sleep(delay))
+
+    spans = load_spans(path)
+    assert len(spans) == 4
+    assert all(json.dumps(span) for span in spans)
+
+    turns = slowest_turns(spans, top=1)
+    assert len(turns) == 1
+    assert turns[0]["duration"] >= 0.05
+    assert turns[0]["slowest_stage"] == "tool.content_wordcloud"
+
+    (stage,) = stage_stats(spans)
+    assert stage["stage"] == "tool.content_wordcloud"
+    assert stage["count"] == 2
+    assert stage["max"] >= 0.05
+
+
+def test_otlp_export_to_collector(tmp_path) -> None:
+    path = str(tmp_path / "collected.jsonl")
+    with TraceCollector(path=path, port=0) as collector:
+        otlp = OtlpExporter(collector.endpoint, interval=0.05)
+        local_tracer = Tracer([otlp])
+        with local_tracer.span("turn", kind="turn") as turn:
+            with local_tracer.span("model.create", kind="model") as model:
+                model.add_tokens(12, 3)
+            turn.set(semantic_cache_hit=False)
+        local_tracer.flush()
+
+    assert otlp.dropped == 0
+    spans = {span["name"]: span for span in load_spans(path)}
+    assert spans["model.create"]["parent_id"] == spans["turn"]["span_id"]
+    assert spans["model.create"]["kind"] == "model"
+    assert spans["turn"]["attributes"]["prompt_tokens"] == 12
+    assert spans["turn"]["attributes"]["semantic_cache_hit"] is False
+    assert slowest_turns(list(spans.values()))[0]["completion_tokens"] == 3
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from pytest_mock import MockFixture
+from starlette.testclient import TestClient
+
+from api_app import app
+from utils.warmup import STEPS, WarmUp
+
+
+def test_stages_run_once_and_report_errors(mocker: MockFixture) -> None:
+    calls = []
+    mocker.patch.dict(
+        STEPS,
+        {
+            "translations": lambda: calls.append("translations"),
+            "retrieval": mocker.Mock(side_effect=FileNotFoundError("articles")),
+            "ckip": lambda: calls.append("ckip"),
+        },
+    )
+    warmup = WarmUp(steps=("translations", "retrieval", "ckip"))
+    assert not warmup.ready
+
+    assert warmup.run() is False
+    assert warmup.run() is False
+    assert not warmup.start()
+
+    # A failed stage does not stop the next ones
+    assert calls == ["translations", "ckip"]
+    status = warmup.status()
+    assert status["ready"]
+    assert set(status["steps"]) == {"translations", "ckip"}
+    assert "articles" in status["errors"]["retrieval"]
+
+
+def test_background_start(mocker: MockFixture) -> None:
+    release = threading.Event()
+    mocker.patch.dict(STEPS, {"ckip": release.wait})
+    warmup = WarmUp(steps=("ckip",))
+
+    assert warmup.start()
+    assert not warmup.wait(0.05)
+    release.set()
+    assert warmup.wait(5)
+    assert warmup.ready and warmup.status()["errors"] == {}
+
+
+def test_unknown_step() -> None:
+    with pytest.raises(ValueError):
+        WarmUp(steps=("translations", "nope"))
+
+
+def test_health_reports_readiness(mocker: MockFixture) -> None:
+    warmup = WarmUp(steps=())
+    mocker.patch("api_app.warmup", warmup)
+    # Requests served before the lifespan ran see the warm-up in progress
+    response = TestClient(app).get("/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+    with TestClient(app) as client:
+        response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["warmup"]["ready"]
@@ -0,0 +1,102 @@
+import base64
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from pytest_mock import MockFixture
+
+from utils.function_call import wordcloud
+from utils.function_call.render_cache import RenderCache, is_handle, resolve_handle
+
+WORD_FREQ = {"貓咪": 10, "領養": 8, "親人": 5, "結紮": 3, "台中": 2}
+
+
+@pytest.fixture
+def small_wordcloud(mocker: MockFixture) -> None:
+    # Use the bundled font and a small canvas to keep the tests fast
+    mocker.patch.dict(
+        wordcloud.WORDCLOUD_OPTIONS,
+        {"font_path": None, "width": 160, "height": 80, "scale": 1},
+    )
+
+
+@pytest.mark.parametrize("fmt", ["png", "webp"])
+def test_render_wordcloud_format(small_wordcloud: None, fmt: str) -> None:
+    img = wordcloud.render_wordcloud(WORD_FREQ, fmt=fmt, size=(100, 50))
+
+    with Image.open(BytesIO(img)) as image:
+        assert image.format == fmt.upper()
+        assert image.size == (100, 50)
+
+
+def test_render_wordcloud_concurrent(small_wordcloud: None) -> None:
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda _: wordcloud.render_wordcloud(WORD_FREQ, size=None), range(32)
+            )
+        )
+
+    for img in results:
+        with Image.open(BytesIO(img)) as image:
+            assert image.size == (160, 80)
+
+
+@pytest.mark.performance
+def test_render_wordcloud_memory_is_flat(small_wordcloud: None) -> None:
+    for _ in range(10):
+        wordcloud.render_wordcloud(WORD_FREQ)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for _ in range(100):
+        wordcloud.render_wordcloud(WORD_FREQ)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert current - baseline < 1024 * 1024
+
+
+def test_render_wordcloud_svg(small_wordcloud: None) -> None:
+    svg = wordcloud.render_wordcloud(WORD_FREQ, fmt="svg", size=(100, 50))
+
+    assert svg.startswith(b"<svg")
+    assert b'width="100" height="50" viewBox="0 0 160 80"' in svg
+
+
+@pytest.mark.parametrize(
+    ("display_width", "device_pixel_ratio", "profile"),
+    [(360, 1.0, "compact"), (360, 2.0, "standard"), (1200, 1.0, "retina")],
+)
+def test_profile_for_display_width(
+    display_width: int, device_pixel_ratio: float, profile: str
+) -> None:
+    assert (
+        wordcloud.profile_for_display_width(display_width, device_pixel_ratio)
+        == profile
+    )
+
+
+def test_draw_wordcloud_handle(small_wordcloud: None, mocker: MockFixture) -> None:
+    mocker.patch.object(wordcloud, "render_cache", RenderCache(disk_dir=None))
+    mocker.patch(
+        "utils.function_call.render_cache.render_cache", wordcloud.render_cache
+    )
+
+    handle = wordcloud.test_md_draw_wordcloud(
+        WORD_FREQ, profile="compact", output="handle"
+    )
+    inline = wordcloud.test_md_draw_wordcloud(
+        WORD_FREQ, profile="compact", output="inline"
+    )
+
+    assert is_handle(handle)
+    assert handle.endswith(".webp")
+    assert len(handle) < 100
+
+    img, mime = resolve_handle(handle)
+    assert mime == "image/webp"
+    assert inline.startswith('<img class="wordcloud" src="data:image/webp;base64,')
+    assert base64.b64encode(img).decode() in inline
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from autogen_core.tools import FunctionTool
+
+from utils.bots.workbench import ParallelWorkbench
+
+running = 0
+max_running = 0
+
+
+async def slow_tool(seconds: float) -> str:
+    """Sleep for a while."""
+    global running, max_running
+    running += 1
+    max_running = max(max_running, running)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        running -= 1
+    return "done"
+
+
+async def run_calls(workbench: ParallelWorkbench, seconds: list[float]) -> list:
+    return await asyncio.gather(
+        *[workbench.call_tool("slow_tool", {"seconds": s}) for s in seconds]
+    )
+
+
+def test_concurrency_cap() -> None:
+    global max_running
+    max_running = 0
+    workbench = ParallelWorkbench(
+        [FunctionTool(slow_tool, description="")], max_concurrency=2
+    )
+
+    start = time.perf_counter()
+    results = asyncio.run(run_calls(workbench, [0.1] * 4))
+    elapsed = time.perf_counter() - start
+
+    assert all(not result.is_error for result in results)
+    assert max_running == 2
+    assert 0.2 <= elapsed < 0.4
+
+    # The workbench is reused by the next turn, which runs on a new event loop
+    results = asyncio.run(run_calls(workbench, [0.01] * 2))
+    assert all(not result.is_error for result in results)
+
+
+def test_serial_mode() -> None:
+    global max_running
+    max_running = 0
+    workbench = ParallelWorkbench(
+        [FunctionTool(slow_tool, description="")], parallel=False
+    )
+
+    asyncio.run(run_calls(workbench, [0.01] * 3))
+
+    assert max_running == 1
+
+
+def test_per_tool_timeout() -> None:
+    workbench = ParallelWorkbench(
+        [FunctionTool(slow_tool, description="")], timeouts={"slow_tool": 0.05}
+    )
+
+    fast, slow = asyncio.run(run_calls(workbench, [0.01, 1]))
+
+    assert not fast.is_error
+    assert slow.is_error
+    assert "timed out" in slow.to_text()